@@ -1,5 +1,6 @@
 // deviceWS.cjs — attach by path (/device-ws)
 const { WebSocketServer } = require('ws');
+const { handleTripUpload } = require('./tripStore.cjs');
 
 function attachDeviceWS(server, { onAdminBroadcast } = {}) {
   const wss = new WebSocketServer({ server, path: '/device-ws' });
@@ -44,6 +45,12 @@ function attachDeviceWS(server, { onAdminBroadcast } = {}) {
 
       if (msg.msg_id) safeSend(ws, { type:'ack', ack_id: msg.msg_id, ts: now });
 
+      // 운행 궤적: 저장한 trip_id 만 trip_upload_ack 로 확인
+      if (msg.type === 'trip_upload') {
+        handleTripUpload(devId, msg, (obj) => safeSend(ws, obj));
+        return;
+      }
+
 
 
 
@@ -6,6 +6,7 @@ const cors = require('cors');
 const { WebSocketServer } = require('ws');
 require('dotenv').config();
 const { attachDeviceWS } = require('./deviceWS.cjs');
+const { handleTripUpload } = require('./tripStore.cjs');
 const { rideRequests } = require('./models/rideRequests.cjs');
 // const { pushToApp } = require('./mobile/appWs.cjs');
 // const { pushToApp } = require('../mobile/appWs.cjs');
@@ -189,6 +190,12 @@ function setupWS(wss, deviceType) {
         ws.send(JSON.stringify({ type: 'ack', ack_id: msg.msg_id, ts: now }));
       }
 
+      //  운행 궤적: 저장한 trip_id 만 trip_upload_ack 로 확인 (단말은 그것만 삭제)
+      if (msg.type === 'trip_upload') {
+        handleTripUpload(devId, msg, (obj) => { if (ws.readyState === 1) ws.send(JSON.stringify(obj)); });
+        return;
+      }
+
       //  관리자 브로드캐스트
       if (['hello', 'telemetry', 'event'].includes(msg.type)) {
         broadcast();
@@ -0,0 +1,40 @@
+// tripStore.cjs — 단말 운행 궤적(trip_upload) 저장
+// 단말은 trip_upload_ack 의 trip_ids 에 든 파일만 지운다 (일반 ack 는 저장 전에 가므로 저장 확인이 아님).
+// 저장: TRIP_DIR/<단말 id>/<trip_id>.trp (bustrip1 원본 그대로, 같은 trip_id 재업로드는 덮어씀)
+const fs = require('fs/promises');
+const path = require('path');
+
+const TRIP_DIR = process.env.TRIP_DIR || path.join(__dirname, 'data', 'trips');
+const SAFE_ID = /^[\w.-]{1,64}$/;   // 경로 문자 금지 (devicews.py TRIP_ID_RE 와 같음)
+
+async function storeTripUpload(devId, msg) {
+  const stored = [];
+  const trips = msg.payload?.trips;
+  if (!SAFE_ID.test(String(devId ?? '')) || !Array.isArray(trips)) return stored;
+  const dir = path.join(TRIP_DIR, String(devId));
+  await fs.mkdir(dir, { recursive: true });
+  for (const trip of trips) {
+    const id = String(trip?.trip_id ?? '');
+    if (!SAFE_ID.test(id) || typeof trip.data !== 'string') continue;
+    const file = path.join(dir, `${id}.trp`);
+    try {
+      await fs.writeFile(`${file}.tmp`, Buffer.from(trip.data, 'base64'));
+      await fs.rename(`${file}.tmp`, file);
+      stored.push(id);
+    } catch (err) {
+      console.error('[TRIP] 저장 실패', devId, id, err.message);
+    }
+  }
+  return stored;
+}
+
+// trip_upload 처리 + 저장한 trip_id 로 trip_upload_ack (send: obj → 단말)
+function handleTripUpload(devId, msg, send) {
+  storeTripUpload(devId, msg)
+    .catch((err) => { console.error('[TRIP] 저장 실패', devId, err.message); return []; })
+    .then((trip_ids) => {
+      if (msg.msg_id) send({ type: 'trip_upload_ack', ack_id: msg.msg_id, ts: Date.now(), payload: { trip_ids } });
+    });
+}
+
+module.exports = { storeTripUpload, handleTripUpload, TRIP_DIR };
@@ -0,0 +1,234 @@
+# aiows.py — asyncio 용 최소 WebSocket (RFC 6455) 클라이언트/서버
+#
+# 단말은 websocket-client(동기, 스레드 하나당 연결 하나)를 쓰지만 fleetsim 처럼 한 프로세스에서
+# 연결 수백 개를 돌리거나 PC 용 대역 서버(devicews)를 띄울 때는 asyncio 가 필요하다.
+# 외부 패키지 없이 텍스트/바이너리 프레임, 조각(continuation), ping/pong, close 만 지원 (확장/압축 없음).
+#
+#   ws = await aiows.connect("ws://127.0.0.1:3000/device-ws", headers=["User-Agent: buson-device"])
+#   ws.send(json.dumps(msg)); await ws.drain()
+#   text = await ws.recv()                    # 끊기면 aiows.ConnectionClosed
+#
+#   server = await aiows.serve(handler, "0.0.0.0", 3000, path="/device-ws")   # handler(ws) 코루틴
+import asyncio, base64, hashlib, os, struct
+from urllib.parse import urlsplit
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+MAX_MESSAGE = 4 * 1024 * 1024
+
+class ConnectionClosed(Exception):
+    def __init__(self, code=1006, reason=""):
+        super().__init__(f"{code} {reason}".strip())
+        self.code, self.reason = code, reason
+
+class HandshakeError(Exception):
+    pass
+
+def _accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + GUID).encode("ascii")).digest()).decode("ascii")
+
+def _mask(data, key):
+    # 큰 정수 XOR 한 번으로 (바이트 단위 파이썬 루프보다 훨씬 빠름)
+    n = len(data)
+    if not n:
+        return data
+    k = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(k, "big")).to_bytes(n, "big")
+
+class WebSocket:
+    def __init__(self, reader, writer, client, path="/", headers=None):
+        self.reader, self.writer = reader, writer
+        self.client = client              # 클라이언트 쪽이면 보내는 프레임을 마스킹
+        self.path = path
+        self.headers = headers or {}
+        self.closed = False
+        self.close_code = None
+        peer = writer.get_extra_info("peername")
+        self.remote = peer[0] if peer else None
+
+    @property
+    def connected(self):
+        """websocket-client 와 같은 이름 — BusAPI.send/send_reliable 이 그대로 쓸 수 있게"""
+        return not self.closed
+
+    # -------------------- 송신 --------------------
+    def _frame(self, op, payload):
+        head = bytearray([0x80 | op])
+        n = len(payload)
+        mbit = 0x80 if self.client else 0
+        if n < 126:
+            head.append(mbit | n)
+        elif n < 65536:
+            head.append(mbit | 126); head += struct.pack(">H", n)
+        else:
+            head.append(mbit | 127); head += struct.pack(">Q", n)
+        if self.client:
+            key = os.urandom(4)
+            head += key
+            payload = _mask(payload, key)
+        self.writer.write(bytes(head) + payload)
+
+    def send(self, data):
+        """str → 텍스트, bytes → 바이너리. 버퍼에 넣기만 함 (흐름 제어는 drain)"""
+        if self.closed:
+            raise ConnectionClosed(self.close_code or 1006)
+        if isinstance(data, str):
+            self._frame(OP_TEXT, data.encode("utf-8"))
+        else:
+            self._frame(OP_BINARY, bytes(data))
+
+    async def drain(self):
+        try:
+            await self.writer.drain()
+        except (ConnectionError, OSError) as e:
+            self.closed = True
+            raise ConnectionClosed(1006, str(e))
+
+    async def ping(self, data=b""):
+        self._frame(OP_PING, data)
+        await self.drain()
+
+    # -------------------- 수신 --------------------
+    async def _read_frame(self):
+        b1, b2 = await self.reader.readexactly(2)
+        fin, op = b1 & 0x80, b1 & 0x0F
+        n = b2 & 0x7F
+        if n == 126:
+            n = struct.unpack(">H", await self.reader.readexactly(2))[0]
+        elif n == 127:
+            n = struct.unpack(">Q", await self.reader.readexactly(8))[0]
+        if n > MAX_MESSAGE:
+            raise ConnectionClosed(1009, "message too big")
+        key = await self.reader.readexactly(4) if b2 & 0x80 else None
+        payload = await self.reader.readexactly(n) if n else b""
+        if key:
+            payload = _mask(payload, key)
+        return fin, op, payload
+
+    async def recv(self):
+        """다음 데이터 메시지 (str 또는 bytes). ping 은 자동 pong, close 면 ConnectionClosed"""
+        parts, kind = [], None
+        try:
+            while True:
+                fin, op, payload = await self._read_frame()
+                if op == OP_PING:
+                    self._frame(OP_PONG, payload)
+                    continue
+                if op == OP_PONG:
+                    continue
+                if op == OP_CLOSE:
+                    code = struct.unpack(">H", payload[:2])[0] if len(payload) >= 2 else 1005
+                    if not self.closed:
+                        self._frame(OP_CLOSE, payload[:2])
+                    self._shutdown(code)
+                    raise ConnectionClosed(code, payload[2:].decode("utf-8", "replace"))
+                if op in (OP_TEXT, OP_BINARY):
+                    kind, parts = op, [payload]
+                elif op == OP_CONT and kind is not None:
+                    parts.append(payload)
+                if fin and kind is not None:
+                    data = b"".join(parts)
+                    return data.decode("utf-8") if kind == OP_TEXT else data
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            self._shutdown(1006)
+            raise ConnectionClosed(1006, str(e))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.recv()
+        except ConnectionClosed:
+            raise StopAsyncIteration
+
+    # -------------------- 종료 --------------------
+    def _shutdown(self, code):
+        self.closed = True
+        self.close_code = self.close_code or code
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+    async def close(self, code=1000, reason=""):
+        if self.closed:
+            return
+        try:
+            self._frame(OP_CLOSE, struct.pack(">H", code) + reason.encode("utf-8"))
+            await self.writer.drain()
+        except Exception:
+            pass
+        self._shutdown(code)
+
+    def abort(self):
+        """close 프레임 없이 TCP 만 끊음 (장애 흉내)"""
+        self._shutdown(1006)
+        try:
+            self.writer.transport.abort()
+        except Exception:
+            pass
+
+# ====== 핸드셰이크 ======
+async def _read_head(reader):
+    raw = await reader.readuntil(b"\r\n\r\n")
+    lines = raw.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            headers[k.strip().lower()] = v.strip()
+    return lines[0], headers
+
+async def connect(url, headers=(), timeout=5.0):
+    u = urlsplit(url)
+    if u.scheme != "ws":
+        raise HandshakeError(f"ws:// 만 지원: {url}")
+    host, port = u.hostname, u.port or 80
+    path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    key = base64.b64encode(os.urandom(16)).decode("ascii")
+    req = [f"GET {path} HTTP/1.1", f"Host: {host}:{port}", "Upgrade: websocket", "Connection: Upgrade",
+           f"Sec-WebSocket-Key: {key}", "Sec-WebSocket-Version: 13", *headers, "", ""]
+    writer.write("\r\n".join(req).encode("latin-1"))
+    try:
+        status, h = await asyncio.wait_for(_read_head(reader), timeout)
+    except Exception:
+        writer.close()
+        raise
+    if " 101 " not in status + " " or h.get("sec-websocket-accept") != _accept_key(key):
+        writer.close()
+        raise HandshakeError(f"업그레이드 실패: {status}")
+    return WebSocket(reader, writer, client=True, path=path, headers=h)
+
+async def serve(handler, host, port, path=None, **kwargs):
+    """handler(ws) 코루틴을 연결마다 실행. path 가 주어지면 다른 경로는 404"""
+    async def on_conn(reader, writer):
+        try:
+            line, h = await _read_head(reader)
+            parts = line.split(" ")
+            req_path = parts[1] if len(parts) > 1 else "/"
+            if path is not None and req_path.split("?")[0] != path:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain(); writer.close()
+                return
+            key = h.get("sec-websocket-key")
+            if h.get("upgrade", "").lower() != "websocket" or not key:
+                writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain(); writer.close()
+                return
+            writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          f"Sec-WebSocket-Accept: {_accept_key(key)}\r\n\r\n").encode("latin-1"))
+            await writer.drain()
+        except Exception:
+            writer.close()
+            return
+        ws = WebSocket(reader, writer, client=False, path=req_path, headers=h)
+        try:
+            await handler(ws)
+        except ConnectionClosed:
+            pass
+        finally:
+            if not ws.closed:
+                await ws.close()
+    return await asyncio.start_server(on_conn, host, port, **kwargs)
@@ -0,0 +1,85 @@
+# alertanim.py — 상태 띠 경보 애니메이션 (미리 그린 프레임 + 시각표 기반 전환)
+#
+# 경보 상태(승차/하차 요청)가 바뀔 때 StatusBand 가 보일 모양을 모두 한 번 그려두고,
+# 이후에는 시각표(Timeline)가 가리키는 프레임 번호만 바꾼다. 프레임 전환 시각은 메인 루프
+# 주기와 무관하게 AnimationTimer 스레드가 정확히 그 시각에 깨어나서 띠 영역만 보낸다.
+#
+# 시각표는 BeepSys 패턴에서 만든다: 톤이 울리는 동안 = 반전 프레임, 무음 = 기본 프레임.
+# 같은 t0(time.monotonic) 와 같은 길이 목록을 쓰므로 소리와 화면이 같은 박자로 움직인다.
+#
+#   tl = timeline_for(BEEP)                    # (t0, ((프레임, 길이), ...)) — 스냅샷에 그대로 실림
+#   frame, next_t = Timeline(*tl).at(time.monotonic())
+#   ANIM = AnimationTimer(DASH).start(); ANIM.poke()   # 새 경보가 걸리면 다음 전환 시각 다시 계산
+import time, threading, logging
+
+BLINK = ((1, 0.5), (0, 0.5))     # 비프가 없을 때 기본 깜빡임 (0.5초 간격)
+
+log = logging.getLogger("alertanim")
+
+class Timeline:
+    """t0 부터 steps [(프레임 번호, 길이 초)] 를 반복"""
+    def __init__(self, t0, steps):
+        self.t0 = t0
+        self.steps = tuple(steps)
+        self.period = sum(d for _, d in self.steps)
+
+    def at(self, t):
+        """t 시각의 (프레임 번호, 다음 전환 시각)"""
+        if self.period <= 0:
+            return self.steps[0][0] if self.steps else 0, None
+        k, ph = divmod(t - self.t0, self.period)
+        base = self.t0 + k * self.period
+        acc = 0.0
+        for frame, dur in self.steps:
+            acc += dur
+            if ph < acc:
+                return frame, base + acc
+        return self.steps[-1][0], base + self.period
+
+def timeline_for(beep, t0=0.0):
+    """BeepSys 가 울리는 중이면 그 패턴에 맞춘 시각표, 아니면 기본 깜빡임"""
+    tl = beep.timeline() if beep is not None else None
+    if not tl or beep.t0 is None:
+        return t0, BLINK
+    return beep.t0, tuple((1 if on else 0, dur) for on, dur in tl)
+
+class AnimationTimer(threading.Thread):
+    """
+    screen.tick(now) → 다음 전환 시각(없으면 None) 을 불러 그 시각에 screen.present()
+    screen.lock 으로 메인 루프의 update/present 와 순서를 맞춤
+    """
+    def __init__(self, screen):
+        super().__init__(name="alert-anim", daemon=True)
+        self.screen = screen
+        self._wake = threading.Event()
+        self._stop = False
+        self.flips = 0
+
+    def start(self):
+        super().start()
+        return self
+
+    def poke(self):
+        """경보 상태가 바뀌었음 — 다음 전환 시각 다시 계산"""
+        self._wake.set()
+
+    def run(self):
+        nxt = None
+        while not self._stop:
+            self._wake.wait(None if nxt is None else max(0.0, nxt - time.monotonic()))
+            self._wake.clear()
+            if self._stop:
+                break
+            try:
+                with self.screen.lock:
+                    nxt = self.screen.tick(time.monotonic())
+                    if self.screen.dirty:
+                        self.screen.present()
+                        self.flips += 1
+            except Exception:
+                log.exception("경보 애니메이션 오류")
+                nxt = None
+
+    def stop(self):
+        self._stop = True
+        self._wake.set()
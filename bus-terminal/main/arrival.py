@@ -0,0 +1,250 @@
+# arrival.py — 단말 자체 정류장 도착/출발 감지 + 다음 정류장 ETA
+#
+# RouteGeometry: 노선 폴리라인을 평면 좌표(m)로 투영하고 꼭짓점별 누적거리(cum)를 미리 계산.
+#   - GPS 위치 → 노선 위 진행거리(along) 투영: 구간 격자로 후보 구간만 검사
+#   - 진행거리 → 다음 정류장: 정류장 진행거리 배열에 bisect (O(log n))
+# ArrivalEngine: 지오펜스 진입 + 저속 + 문 열림(DOOR_PIN) 이 겹치면 "arrival",
+#   그 뒤 지오펜스를 벗어나거나 문 닫힌 채 속도가 붙으면 "departure" 이벤트.
+#   ETA 는 정류장 간 학습된 구간 소요시간(EWMA), 없으면 최근 이동 속도로 계산.
+import os, math, time, struct, bisect, threading
+from collections import deque
+
+GRID_M      = 100.0    # 구간 격자 크기
+GEOFENCE_M  = 30.0     # 정류장 반경
+EXIT_M      = 45.0     # 지오펜스 이탈 판정 (히스테리시스)
+APPROACH_M  = 150.0    # 접근 상태로 보는 거리
+SLOW_KMH    = 5.0      # 정차로 보는 속도
+MOVING_KMH  = 10.0     # 출발로 보는 속도
+JUMP_M      = 500.0    # 직전 진행거리에서 이만큼 넘게 벗어난 후보는 감점 (왕복 노선 겹침 대비)
+SPEED_WINDOW = 120.0   # 최근 평균 속도 계산 구간 (초)
+MIN_SPEED_MS = 2.0     # ETA 계산 시 최저 속도 (정체 시 무한대 방지)
+EARTH_R = 6371008.8
+
+LINE_MAGIC = b"LIN1"
+
+class RouteGeometry:
+    def __init__(self, points, stops=()):
+        """
+        points: [(lat, lon)] 노선 순서 폴리라인
+        stops : [(seq, name, lat, lon)] 노선 순서 정류장 (폴리라인 위로 투영해 진행거리 부여)
+        """
+        n = len(points)
+        self.lat0 = sum(p[0] for p in points) / n
+        self.lon0 = sum(p[1] for p in points) / n
+        self._kx = math.radians(1) * EARTH_R * math.cos(math.radians(self.lat0))
+        self._ky = math.radians(1) * EARTH_R
+        self.x = []
+        self.y = []
+        for la, lo in points:
+            x, y = self.project(la, lo)
+            self.x.append(x); self.y.append(y)
+        self.cum = [0.0]
+        for i in range(1, n):
+            self.cum.append(self.cum[-1] + math.hypot(self.x[i] - self.x[i - 1], self.y[i] - self.y[i - 1]))
+        self.length = self.cum[-1]
+
+        # 구간(i→i+1)이 지나가는 격자 칸마다 구간 번호 등록
+        self.grid = {}
+        for i in range(n - 1):
+            x0, x1 = sorted((self.x[i], self.x[i + 1]))
+            y0, y1 = sorted((self.y[i], self.y[i + 1]))
+            for gx in range(int(x0 // GRID_M), int(x1 // GRID_M) + 1):
+                for gy in range(int(y0 // GRID_M), int(y1 // GRID_M) + 1):
+                    self.grid.setdefault((gx, gy), []).append(i)
+
+        # 정류장 진행거리 (순서 보장: 앞 정류장보다 뒤로 가지 않도록)
+        self.stop_seq, self.stop_name, self.stop_s = [], [], []
+        prev = 0.0
+        for seq, name, la, lo in stops:
+            s, _ = self.locate(la, lo, hint=prev)
+            s = max(s, prev)
+            self.stop_seq.append(seq); self.stop_name.append(name); self.stop_s.append(s)
+            prev = s
+
+    @classmethod
+    def from_stop_index(cls, idx, shape_path=None):
+        """StopIndex 로부터 생성. shape_path(.line) 가 있으면 실제 도로 형상 사용, 없으면 정류장 연결선"""
+        stops = [(idx.seq[k], idx.names[k], idx.lat[k], idx.lon[k]) for k in range(len(idx))]
+        points = read_line(shape_path) if shape_path and os.path.exists(shape_path) else \
+                 [(s[2], s[3]) for s in stops]
+        if len(points) < 2:
+            return None
+        return cls(points, stops)
+
+    def project(self, lat, lon):
+        return (lon - self.lon0) * self._kx, (lat - self.lat0) * self._ky
+
+    def locate(self, lat, lon, hint=None):
+        """위치 → (진행거리 m, 노선까지 수직거리 m). hint 는 직전 진행거리"""
+        px, py = self.project(lat, lon)
+        cx, cy = int(px // GRID_M), int(py // GRID_M)
+        cand = set()
+        ring = 0
+        while not cand and ring <= 20:
+            for gx in range(cx - ring, cx + ring + 1):
+                for gy in range(cy - ring, cy + ring + 1):
+                    cand.update(self.grid.get((gx, gy), ()))
+            ring += 1
+        if not cand:
+            cand = range(len(self.x) - 1)
+        best = None
+        for i in cand:
+            ax, ay = self.x[i], self.y[i]
+            vx, vy = self.x[i + 1] - ax, self.y[i + 1] - ay
+            L2 = vx * vx + vy * vy
+            t = 0.0 if L2 == 0 else max(0.0, min(1.0, ((px - ax) * vx + (py - ay) * vy) / L2))
+            qx, qy = ax + t * vx, ay + t * vy
+            d = math.hypot(px - qx, py - qy)
+            s = self.cum[i] + t * (self.cum[i + 1] - self.cum[i])
+            score = d
+            if hint is not None and abs(s - hint) > JUMP_M:
+                score += abs(s - hint) - JUMP_M
+            if best is None or score < best[0]:
+                best = (score, s, d)
+        return best[1], best[2]
+
+    def next_stop(self, s):
+        """진행거리 s 이후(포함, 지오펜스 안쪽 포함) 첫 정류장 인덱스 (없으면 None)"""
+        k = bisect.bisect_left(self.stop_s, s - GEOFENCE_M)
+        return k if k < len(self.stop_s) else None
+
+def write_line(path, points):
+    out = bytearray(LINE_MAGIC) + struct.pack("<I", len(points))
+    for la, lo in points:
+        out += struct.pack("<ii", round(la * 1e6), round(lo * 1e6))
+    with open(path, "wb") as f:
+        f.write(out)
+
+def read_line(path):
+    with open(path, "rb") as f:
+        buf = f.read()
+    if buf[:4] != LINE_MAGIC:
+        raise ValueError(f"노선 형상 파일 아님: {path}")
+    (n,) = struct.unpack_from("<I", buf, 4)
+    return [(la / 1e6, lo / 1e6) for la, lo in struct.iter_unpack("<ii", buf[8:8 + n * 8])]
+
+class ArrivalEngine:
+    def __init__(self, route, on_event=None):
+        self.route = route
+        self.on_event = on_event            # fn(kind, payload) — "arrival" / "departure"
+        self.lock = threading.Lock()
+        self.s = None                       # 현재 진행거리
+        self.off_route_m = None
+        self.speed_kmh = 0.0
+        self.door_open = False
+        self.state = "en_route"             # en_route / approaching / arrived
+        self.stop_k = None                  # 다음(또는 정차 중) 정류장 인덱스
+        self.min_k = 0                      # 출발한 정류장은 다시 대상으로 삼지 않음
+        self.arrived_at = None
+        self._track = deque()               # (t, s) 최근 위치
+        self._leg_start = {}                # 정류장 k 출발 시각
+        self.leg_time = {}                  # k → k+1 학습된 소요시간(초, EWMA)
+
+    # -------------------- 입력 --------------------
+    def update_fix(self, lat, lon, speed_kmh=None, t=None):
+        t = time.monotonic() if t is None else t
+        with self.lock:
+            s, off = self.route.locate(lat, lon, hint=self.s)
+            if speed_kmh is None and self._track:
+                t_prev, s_prev = self._track[-1]
+                if t > t_prev:
+                    speed_kmh = abs(s - s_prev) / (t - t_prev) * 3.6
+            self.s, self.off_route_m = s, off
+            self.speed_kmh = speed_kmh or 0.0
+            self._track.append((t, s))
+            while self._track and t - self._track[0][0] > SPEED_WINDOW:
+                self._track.popleft()
+            events = self._step(t)
+        self._fire(events)
+
+    def update_door(self, is_open, t=None):
+        t = time.monotonic() if t is None else t
+        with self.lock:
+            self.door_open = bool(is_open)
+            events = self._step(t)
+        self._fire(events)
+
+    # -------------------- 상태 전이 --------------------
+    def _step(self, t):
+        if self.s is None:
+            return []
+        r = self.route
+        events = []
+        if self.state == "arrived":
+            d = abs(self.s - r.stop_s[self.stop_k])
+            if d > EXIT_M or (not self.door_open and self.speed_kmh >= MOVING_KMH):
+                events.append(("departure", self._payload(self.stop_k, t)))
+                self._leg_start[self.stop_k] = t
+                self.min_k = self.stop_k + 1
+                self.stop_k = self.min_k if self.min_k < len(r.stop_s) else None
+                self.state = "en_route"
+            return events
+
+        k = r.next_stop(self.s)
+        if k is not None and k < self.min_k:
+            k = self.min_k if self.min_k < len(r.stop_s) else None
+        self.stop_k = k
+        if k is None:
+            return events
+        d = r.stop_s[k] - self.s
+        if abs(d) <= GEOFENCE_M and self.speed_kmh <= SLOW_KMH and self.door_open:
+            self.state = "arrived"
+            self.arrived_at = t
+            if k - 1 in self._leg_start:            # 직전 정류장 출발 → 이번 도착 소요시간 학습
+                dt = t - self._leg_start.pop(k - 1)
+                prev = self.leg_time.get(k - 1)
+                self.leg_time[k - 1] = dt if prev is None else prev + (dt - prev) * 0.3
+            events.append(("arrival", self._payload(k, t)))
+        else:
+            self.state = "approaching" if d <= APPROACH_M else "en_route"
+        return events
+
+    def _payload(self, k, t):
+        r = self.route
+        return {"stop_seq": r.stop_seq[k], "stop_name": r.stop_name[k],
+                "along_m": round(self.s), "speed_kmh": round(self.speed_kmh, 1),
+                "dwell_s": round(t - self.arrived_at, 1) if self.arrived_at else None,
+                "terminus": k == len(r.stop_s) - 1}
+
+    def _fire(self, events):
+        if not self.on_event:
+            return
+        for kind, payload in events:
+            self.on_event(kind, payload)
+
+    # -------------------- ETA --------------------
+    def recent_speed_ms(self):
+        if len(self._track) < 2:
+            return None
+        (t0, s0), (t1, s1) = self._track[0], self._track[-1]
+        return (s1 - s0) / (t1 - t0) if t1 > t0 else None
+
+    def etas(self, count=3):
+        """다음 정류장들 [{"seq","name","dist_m","eta_s"}]"""
+        with self.lock:
+            if self.s is None or self.stop_k is None:
+                return []
+            r = self.route
+            v = max(self.recent_speed_ms() or 0.0, MIN_SPEED_MS)
+            out = []
+            acc = 0.0
+            pos = self.s
+            for k in range(self.stop_k, min(self.stop_k + count, len(r.stop_s))):
+                gap = max(0.0, r.stop_s[k] - pos)
+                leg = self.leg_time.get(k - 1)
+                full = r.stop_s[k] - r.stop_s[k - 1] if k > 0 else 0.0
+                if leg and full > 0:
+                    acc += leg * (gap / full)       # 학습된 구간 시간 비례
+                else:
+                    acc += gap / v
+                out.append({"seq": r.stop_seq[k], "name": r.stop_name[k],
+                            "dist_m": round(r.stop_s[k] - self.s), "eta_s": round(acc)})
+                pos = r.stop_s[k]
+            return out
+
+    def snapshot(self):
+        """telemetry 용 요약"""
+        return {"state": self.state,
+                "along_m": None if self.s is None else round(self.s),
+                "off_route_m": None if self.off_route_m is None else round(self.off_route_m),
+                "eta": self.etas()}
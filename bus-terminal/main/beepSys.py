@@ -1,9 +1,13 @@
 ﻿# beepSys.py — PWM 기반 비프 제어 + 지속 알림 지원
+#
+# 패턴은 시작 시각(t0, monotonic) 기준 절대 시각표로 울린다 (sleep 누적 오차 없음).
+# 화면 경보 애니메이션(alertanim)은 같은 t0 / timeline() 으로 프레임을 바꿔 소리와 맞춘다.
 import RPi.GPIO as GPIO
 import time
 import threading
 
 BUZZER_PIN = 18  # BCM 기준
+BEEP_GAP = 0.1   # 톤 사이 무음
 GPIO.setmode(GPIO.BCM)
 GPIO.setup(BUZZER_PIN, GPIO.OUT)
 
@@ -14,18 +18,50 @@ class BeepSys:
         self.pwm = None
         self.active = False
         self.thread = None
+        self.pattern = None     # 지금 울리는 [(주파수, 길이)]
+        self.t0 = None          # 패턴 시작 시각 (time.monotonic)
+        self._gen = 0           # 패턴 세대: 새 패턴/중단 시 이전 스레드가 알아서 빠지게
+        self._wake = threading.Event()
 
-    def _beep_thread(self, freq, pattern):
-        """내부 반복 스레드"""
-        while self.active:
+    def _beep_thread(self, freq, pattern, t0, gen):
+        """내부 반복 스레드 — t0 기준 절대 시각으로 켜고 끔"""
+        t = t0
+        while self.active and self._gen == gen:
             for f, dur in pattern:
-                if not self.active:
-                    break
-                self.pwm.ChangeFrequency(f)
-                self.pwm.start(50)  # duty cycle 50%
-                time.sleep(dur)
-                self.pwm.stop()
-                time.sleep(0.1)
+                # 세대 확인과 PWM 조작을 같은 락 안에서 — 확인 직후 stop() 이 끈 부저를 다시 켜지 않게
+                with self.lock:
+                    if self._gen != gen:
+                        return
+                    self.pwm.ChangeFrequency(f)
+                    self.pwm.start(50)  # duty cycle 50%
+                t += dur
+                if not self._wait_until(t, gen):
+                    return          # 중단/새 패턴 — PWM 은 stop() 이 이미 끔
+                with self.lock:
+                    if self._gen != gen:
+                        return      # 그 사이 새 패턴이 켠 소리는 건드리지 않음
+                    self.pwm.stop()
+                t += BEEP_GAP
+                if not self._wait_until(t, gen):
+                    return
+
+    def _wait_until(self, t, gen):
+        """t 까지 대기. 그 사이 세대가 바뀌면 False"""
+        while self._gen == gen:
+            left = t - time.monotonic()
+            if left <= 0:
+                return True
+            self._wake.wait(left)
+        return False
+
+    def timeline(self):
+        """지금 패턴의 (울림 여부, 길이) 목록 — 한 주기. 울리는 중이 아니면 None"""
+        if not self.active or not self.pattern:
+            return None
+        out = []
+        for _, dur in self.pattern:
+            out += [(True, dur), (False, BEEP_GAP)]
+        return out
 
     def start_pattern(self, freq, pattern):
         with self.lock:
@@ -34,17 +70,27 @@ class BeepSys:
             else:
                 self.pwm.ChangeFrequency(freq)
 
-            self.stop()
+            self._stop_locked()
             self.active = True
+            self.pattern = list(pattern)
+            self.t0 = time.monotonic()
+            self._wake.clear()
             self.thread = threading.Thread(
-                target=self._beep_thread, args=(freq, pattern), daemon=True)
+                target=self._beep_thread, args=(freq, self.pattern, self.t0, self._gen), daemon=True)
             self.thread.start()
 
 
     def stop(self):
         """비프 중단"""
+        with self.lock:
+            self._stop_locked()
+
+    def _stop_locked(self):
         self.active = False
-        self.pwm.stop()
+        self._gen += 1
+        self._wake.set()
+        if self.pwm:
+            self.pwm.stop()
 
     # =====================
     # 알림 패턴 정의
@@ -1,29 +1,47 @@
 # busapi.py — Raspberry Pi ↔ Server WebSocket 통신 모듈
 import json, time, socket, random, threading
 import websocket
+import logging
+from metrics import METRICS
+import profiler
+from latency import LatencyTracker
+from replay import RECORDER
+import timesvc
+
+log = logging.getLogger("busapi")
+
+ACK_EXPIRE_S = 60.0     # send_reliable 콜백 보관 한도 — 재전송은 새 msg_id 라 이전 것은 늦은 응답만 기다림
 
 class BusAPI(threading.Thread):
     """
     버스 단말 ↔ 서버 간 WebSocket 통신 스레드
     - 500ms마다 telemetry 송신
     - 서버로부터 제어/명령 수신 처리
+    - transport: "ws" (기본, ws://<ip>:3000/device-ws) 또는 "mqtt" / "mqtt5" (mqttlink, 브로커 <ip>:1883)
     """
 
-    def __init__(self, device_id, bus_no, vehicle_no, direction="상행", server_ip="127.0.0.1", device_type=2):
-        super().__init__(daemon=True)
+    def __init__(self, device_id, bus_no, vehicle_no, direction="상행", server_ip="127.0.0.1", device_type=2,
+                 transport="ws", port=None):
+        super().__init__(daemon=True, name="busapi")
         self.device_id   = device_id
         self.bus_no      = bus_no
         self.vehicle_no  = vehicle_no
         self.direction   = direction      # '상행' 또는 '하행'
         self.server_ip   = server_ip
         self.device_type = device_type    # 1=휴대폰, 2=버스, 3=정류장
+        self.transport   = transport
+        self.port        = port           # None 이면 transport 기본 포트
         self.stop_flag   = threading.Event()
         self.ws          = None
         self.rtt_ms      = None
         self.current_stop_name = None
-        self.last_send   = 0
+        self.last_send   = 0              # 마지막 telemetry 송신 (monotonic — GPS 시계 보정으로 벽시계가 뒤로 가도 안 멈춤)
+        self.telem_interval = 0.5         # telemetry 주기 (유휴 절전 중에는 bussys 가 늘림)
         self.listeners   = {}             # event:callback
         self.connected   = False
+        self.latency     = LatencyTracker()  # ping/ack 기반 RTT·시계 오프셋
+        self.ack_callbacks = {}           # msg_id:(기다리는 응답 type, callback, 보낸 시각) (send_reliable)
+        self.last_tick   = None           # 수신 루프가 마지막으로 제대로 돈 시각 (수신 또는 대기 초과, monotonic, 멈춤 감시용)
 
     # -------------------- 유틸 --------------------
     def local_ip(self):
@@ -46,7 +64,7 @@ class BusAPI(threading.Thread):
         cb = self.listeners.get(event)
         if cb:
             try: cb(data)
-            except Exception as e: print(f"[BusAPI] 콜백 오류: {e}")
+            except Exception: log.exception("콜백 오류 (%s)", event)
 
     # -------------------- 송신 --------------------
     def send(self, obj):
@@ -57,11 +75,32 @@ class BusAPI(threading.Thread):
             else:
                 # 연결 끊김 상태 로그
                 if not getattr(self.ws, "connected", False):
-                    print("[BusAPI] 송신 실패: WebSocket 연결 끊김")
+                    log.warning("송신 실패: WebSocket 연결 끊김")
         except Exception as e:
-            print(f"[BusAPI] send 실패: {e}")
+            log.warning("send 실패: %s", e)
         
 
+    def send_reliable(self, obj, on_ack, wire=None, ack_type="ack"):
+        """msg_id 가 있는 메시지 송신 + 서버 응답(ack_type, ack_id=msg_id) 수신 시 on_ack(응답) 호출 (재전송은 호출자가)
+        ack_type: 서버는 msg_id 가 있는 메시지마다 처리 전에 "ack" 를 보내므로, 처리 결과가 필요하면
+                  그 결과 메시지 type 을 (예: trip_upload → "trip_upload_ack")"""
+        now = time.monotonic()
+        for mid in [m for m, e in self.ack_callbacks.items() if now - e[2] > ACK_EXPIRE_S]:
+            del self.ack_callbacks[mid]     # 응답이 끝내 안 온 것 (늦은 응답은 ACK_EXPIRE_S 안에서만 반영)
+        self.ack_callbacks[obj["msg_id"]] = (ack_type, on_ack, now)
+        try:
+            if self.ws and getattr(self.ws, "connected", False):
+                self.ws.send(wire or json.dumps(obj))
+            else:
+                log.warning("송신 실패: WebSocket 연결 끊김")
+        except Exception as e:
+            log.warning("send 실패: %s", e)
+
+    def out_backlog(self):
+        """송신 대기: 서버 응답을 기다리는 send_reliable 메시지 + 전송 계층 큐 (MQTT 끊긴 동안 쌓인 것)"""
+        queued = getattr(self.ws, "queued", None)
+        return len(self.ack_callbacks) + (queued() if queued else 0)
+
     def send_hello(self):
         msg = {
             "type": "hello",
@@ -79,18 +118,23 @@ class BusAPI(threading.Thread):
         self.send(msg)
 
     def send_telem(self):
-        """500 ms마다 GPS, 상태 등 송신"""
-        now = time.time()
-        if now - self.last_send < 0.5:  # TPS=2
+        """telem_interval(기본 500 ms)마다 GPS, 상태 등 송신"""
+        mono = time.monotonic()
+        if mono - self.last_send < self.telem_interval:  # 기본 TPS=2
             return
-        self.last_send = now
+        self.last_send = mono
+        now = timesvc.now()                               # ts / msg_id 는 보정된 벽시계
         msg_id = f"t-{int(now*1000)}-{random.randint(0,999)}"
+        arrival = getattr(self, "arrival", None)
         payload = {
             "gps": getattr(self, "gps_data", None) or {},
+            "stop": getattr(self, "stop_info", None),   # 단말 정류장 인덱스 결과 (없으면 null)
+            "arrival": arrival.snapshot() if arrival else None,  # 도착 상태 + 다음 정류장 ETA
             "status": getattr(self, "status", "idle"),
             "bus_number": self.bus_no,
             "vehicle_number": self.vehicle_no,
-            "direction": self.direction
+            "direction": self.direction,
+            "clock": timesvc.CLOCK.status()["source"]   # ts 기준 시계 (gps / pps / system)
         }
         msg = {
             "type": "telemetry",
@@ -103,11 +147,37 @@ class BusAPI(threading.Thread):
             },
             "payload": payload
         }
+        self.latency.mark_sent(msg_id, msg["ts"])
         self.send(msg)
+        METRICS.telemetry_sent.inc()
+
+    def send_event(self, event, payload):
+        """단말 이벤트 (문 열림/닫힘 등) — 서버가 장치별로 받도록 device 블록 포함"""
+        self.send({
+            "type": "event",
+            "event": event,
+            "device": {
+                "id": self.device_id,
+                "ip": self.local_ip(),
+                "device_type": self.device_type
+            },
+            "payload": payload
+        })
+
+    def send_probe(self):
+        """RTT/시계 오프셋 측정용 ping (PROBE_INTERVAL 마다)"""
+        if not self.latency.probe_due():
+            return
+        self.send(self.latency.make_probe({
+            "id": self.device_id,
+            "ip": self.local_ip(),
+            "device_type": self.device_type
+        }))
 
     # -------------------- 수신 처리 --------------------
-    def handle_message(self, obj):
-        print("[BusAPI] RAW 수신됨:", obj)
+    def handle_message(self, obj, rx_ms=None):
+        """rx_ms: 프레임 수신 직후 벽시계(ms) — 편도 지연 계산용"""
+        log.debug("RAW 수신됨: %s", obj)
         t = obj.get("type")
 
         # -------------------------
@@ -116,15 +186,27 @@ class BusAPI(threading.Thread):
         if t in ("command", "event", "info"):
             payload = obj.get("payload", {})
             cmd = obj.get("cmd") or payload.get("command")
-            print(f"[BusAPI] 명령 수신: {cmd}")
+            log.info("명령 수신: %s", cmd)
             self.emit(cmd, payload)
             return
 
         # -------------------------
         # 2) ack
         # -------------------------
-        if t == "ack" and "ts" in obj:
-            self.rtt_ms = int((time.time() * 1000) - obj["ts"])
+        if t == "ack":
+            self._fire_ack(t, obj)
+            # ts 는 서버 시계 → RTT 는 단말 monotonic 송수신 시각으로만 계산
+            if self.latency.on_ack(obj) is not None:
+                self.rtt_ms = int(self.latency.rtt_ms)
+                METRICS.ws_rtt_ms.set(self.rtt_ms)
+                METRICS.clock_offset_ms.set(self.latency.offset_ms)
+            return
+
+        # -------------------------
+        # 2-1) 처리 결과 응답 (trip_upload_ack: 서버가 저장한 trip_id 목록)
+        # -------------------------
+        if t == "trip_upload_ack":
+            self._fire_ack(t, obj)
             return
 
         # -------------------------
@@ -133,14 +215,11 @@ class BusAPI(threading.Thread):
         if t == "ride_request":
             payload = obj.get("payload", {})
             
-            # lineName 저장
-            from bussys import load_conf, CONF_PATH
-            cfg = load_conf()
-            cfg["line_name"] = payload.get("lineName")
-            with open(CONF_PATH, "w") as f:
-                json.dump(cfg, f)
+            self.save_line_name(payload.get("lineName"))
 
+            t_h = time.perf_counter()
             self.emit("ride_request", payload)
+            self._record_request_latency("ride", obj, rx_ms, t_h, METRICS.ride_oneway_ms)
             return
 
         # -------------------------
@@ -148,47 +227,102 @@ class BusAPI(threading.Thread):
         # -------------------------
         if t == "alight_request":
             payload = obj.get("payload", {})
-            print("[BusAPI] 하차 요청 수신됨")
+            log.info("하차 요청 수신됨")
+            t_h = time.perf_counter()
             self.emit("drop_request", payload)
+            self._record_request_latency("alight", obj, rx_ms, t_h, METRICS.alight_oneway_ms)
             return
 
 
 
 
 
+    def _fire_ack(self, t, obj):
+        """send_reliable 이 이 type 의 응답을 기다리는 msg_id 면 콜백 (다른 type 이면 그대로 둠)"""
+        entry = self.ack_callbacks.get(obj.get("ack_id"))
+        if not entry or entry[0] != t:
+            return
+        del self.ack_callbacks[obj["ack_id"]]
+        try: entry[1](obj)
+        except Exception: log.exception("ack 콜백 오류")
+
+    def save_line_name(self, line_name):
+        """승차 요청에 실린 노선명을 config.json 에 저장 (fleetsim 가상 단말은 메모리에만)"""
+        from bussys import load_conf, CONF_PATH
+        cfg = load_conf()
+        cfg["line_name"] = line_name
+        with open(CONF_PATH, "w") as f:
+            json.dump(cfg, f)
+
+    def _record_request_latency(self, kind, obj, rx_ms, t_h, timing):
+        """요청 메시지 편도 지연(서버 ts → 수신) + 단말 처리(알림 시작까지) 시간 기록"""
+        handle_ms = (time.perf_counter() - t_h) * 1000.0
+        one_way = self.latency.one_way_ms(obj.get("ts"), rx_ms)
+        if one_way is not None:
+            timing.observe(one_way)
+        log.info("%s 요청 지연: 편도 %s ms, 처리 %.1f ms", kind,
+                 "-" if one_way is None else f"{one_way:.0f}", handle_ms)
+
     # -------------------- 스레드 실행 --------------------
+    def open_link(self):
+        """transport 에 맞는 연결 — 둘 다 connected / send / recv / settimeout / close (수신 대기 초과는 예외)"""
+        if self.transport in ("mqtt", "mqtt5"):
+            from mqttlink import MqttLink, MQTT_PORT
+            port = self.port or MQTT_PORT
+            log.info("연결 시도: mqtt://%s:%d", self.server_ip, port)
+            return MqttLink.connect(self, self.server_ip, port, v5=self.transport == "mqtt5")
+        url = f"ws://{self.server_ip}:{self.port or 3000}/device-ws"
+        log.info("연결 시도: %s", url)
+        return websocket.create_connection(url, timeout=3, header=["User-Agent: buson-device"])
+
     def run(self):
-        url = f"ws://{self.server_ip}:3000/device-ws"
-        print(f"[BusAPI] 연결 시도: {url}")
         try:
-            self.ws = websocket.create_connection(url, timeout=3, header=["User-Agent: buson-device"])
+            self.ws = self.open_link()
             self.connected = True
-            print("[BusAPI] 연결 성공")
+            log.info("연결 성공")
             self.send_hello()
-            self.ws.settimeout(0.2)
+            recv_timeout = 0.2
+            self.ws.settimeout(recv_timeout)
         except Exception as e:
-            print(f"[BusAPI] 연결 실패: {e}")
+            log.warning("연결 실패: %s", e)
             return
 
         try:
             while not self.stop_flag.is_set():
                 # 주기적 송신
-                self.send_telem()
+                with profiler.span("busapi.send_telem"):
+                    self.send_telem()
+                    self.send_probe()
 
-                # 서버 수신
+                # 서버 수신 — 수신은 도착 즉시 깨므로 타임아웃은 송신 주기만 좌우 (유휴 중엔 길게)
+                want = 0.2 if self.telem_interval <= 0.5 else 1.0
+                if want != recv_timeout:
+                    recv_timeout = want
+                    self.ws.settimeout(recv_timeout)
                 try:
                     raw = self.ws.recv()
                     if not raw: continue
-                    obj = json.loads(raw)
-                    print("[BusAPI] RAW 수신됨:", obj)
-                    self.handle_message(obj)
-                except websocket.WebSocketTimeoutException:
+                    rx_ms = timesvc.now() * 1000.0
+                    if RECORDER.active:
+                        RECORDER.ws_in(raw)
+                    with profiler.span("busapi.handle_message"):
+                        obj = json.loads(raw)
+                        METRICS.ws_rx.inc()
+                        self.handle_message(obj, rx_ms)
+                except (websocket.WebSocketTimeoutException, TimeoutError):
                     pass
+                except websocket.WebSocketConnectionClosedException as e:
+                    log.warning("연결 끊김: %s", e)
+                    break                   # 스레드 종료 → WSClient 가 새 BusAPI 로 다시 연결
                 except Exception as e:
-                    print(f"[BusAPI] 수신 오류: {e}")
+                    log.warning("수신 오류: %s", e)
+                    if not getattr(self.ws, "connected", False):
+                        break
+                    continue
+                self.last_tick = time.monotonic()
 
             # 종료 시점
-            print("[BusAPI] 종료 요청됨")
+            log.info("종료 요청됨")
         finally:
             try: self.ws.close()
             except: pass
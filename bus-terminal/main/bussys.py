@@ -3,10 +3,30 @@ from luma.core.interface.serial import spi
 from luma.lcd.device import ili9341
 from PIL import Image, ImageDraw, ImageFont
 import RPi.GPIO as GPIO
-import time, json, os, socket, threading, random
+import time, json, os, sys, socket, signal, threading, random
+import logging
+import logsys
+import metrics
+import profiler
+import splash
+from replay import RECORDER, start_recording
+from stopindex import StopIndex, StopTracker, STOPS_DIR
+from arrival import RouteGeometry, ArrivalEngine
+from triplog import TRIPS, TripUploader, UPLOAD_IDLE_S
+from eventstore import EVENTS
+from statejournal import JOURNAL
+from supervisor import Heartbeats, Watchdog, sd_notify, STATUS_CONNECTED
+from gpioevents import GpioEvents
+import timesvc
+from timesvc import CLOCK
+from metrics import METRICS, process_age_s
 from datetime import datetime, timezone, timedelta
 from busapi import BusAPI
-from lcdsystem import device, touch, draw_status, FONT_BIG, FONT_MED, FONT_SMALL, FONT_MONO
+from lcdsystem import device, DISPLAY, set_backlight, touch, draw_status, FONT_BIG, FONT_MED, FONT_SMALL, FONT_MONO
+from console import RingLog, ConsoleView
+from dashboard import DashboardScreen, UI_BG
+from alertanim import AnimationTimer, timeline_for
+from powermgr import PowerManager, hwmon_current, MOVE_KMH
 from soundsys import SoundSystem
 SOUND = SoundSystem()
 from beepSys import BeepSys
@@ -49,9 +69,8 @@ GPIO.setmode(GPIO.BCM)
 GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 DOOR_PIN = 27 
 GPIO.setup(DOOR_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+TOUCH_IRQ_PIN = 23         # XPT2046 PENIRQ — 유휴 중 터치로 바로 깨우기용 (좌표는 poll_touch 가 읽음)
 
-
-UI_BG = "black"
 KST = timezone(timedelta(hours=9))
 
 # ====== 설정 파일 (서버 IP/ID 등) ======
@@ -70,80 +89,135 @@ def load_conf():
 
 # ====== 상태 ======
 is_disabled_mode = False        # False: “노약자 탑승 요청 없음”, True: “시각장애인 탑승”
-blink_state = False
-last_blink = 0.0
-blink_interval = 0.5
 
-# 버튼 디바운스/엣지 검출
-_last_btn = 1  # 풀업이므로 평소 1(HIGH)
-_last_btn_ts = 0.0
+# 버튼/문 디바운스 (gpioevents 엣지 인터럽트)
 BTN_DEBOUNCE = 0.12
+DOOR_DEBOUNCE = 0.05
+
+# 유휴 절전: 요청/이동/터치 없이 이만큼 지나면 (config.json "idle_after_min", "idle_backlight")
+IDLE_AFTER_MIN = 5
+
+# 부팅 화면(splash.565): 서버 연결 + 요청 없음 화면을 시작 직후 한 번, 이후 이 주기로 다시 저장
+SPLASH_FIRST_S = 10
+SPLASH_SAVE_S  = 30 * 60
 
-# 미니 콘솔(최근 8줄)
-class RingLog:
-    def __init__(self, cap=8):
-        self.cap = cap
-        self.buf = []
-        self.lock = threading.Lock()
-    def add(self, line):
-        with self.lock:
-            ts = datetime.now(KST).strftime("%H:%M:%S")
-            self.buf.insert(0, f"{ts} · {line}")
-            if len(self.buf) > self.cap:
-                self.buf.pop()
-    def lines(self):
-        with self.lock:
-            return list(reversed(self.buf))
-        
 def on_ride_request(d):
     api.status = "ride_pending"        # <- self가 아니라 api
     api.current_stop_name = d.get("stopName") or d.get("stopNo")
-    LOG.add(f"승차 요청 수신: {api.current_stop_name}")
+    log.info("승차 요청 수신: %s", api.current_stop_name)
     BEEP.alert_ride_request()
 
-LOG = RingLog()
+# 미니 콘솔: 최근 500줄 보관, 화면에는 3줄 (콘솔 박스 위/아래 탭으로 스크롤백)
+LOG = RingLog(cap=8, history=500, font=FONT_MONO, width=296, line_h=16)
+CONSOLE = ConsoleView(LOG, rows=3, fg="#ddd", bg=UI_BG)
+DASH = DashboardScreen(CONSOLE)
+ANIM = None     # alertanim.AnimationTimer — 경보 띠 깜빡임을 메인 루프 주기와 무관하게 정시에
+PM = PowerManager(idle_after=IDLE_AFTER_MIN * 60)   # 유휴 절전 (main() 에서 설정/전환 처리 연결)
+RENDER = None   # renderproc.RenderProcess — config.json "render_process": true 이면 main() 에서 시작
+HB = Heartbeats()   # 작업 스레드 생존 (UI 루프 / WS / BusAPI / GPS) — 멈추면 supervisor 가 재시작
+log = logging.getLogger("bussys")
+
+def trip_event(kind, t_ms=None, **data):
+    """운행 기록(.trp, 업로드용) + 이벤트 DB(events.db, 단말 조회용)에 같이"""
+    TRIPS.event(kind, t_ms=t_ms, **data)
+    EVENTS.record(kind, t_ms=t_ms, **data)
+
+def set_status(api, status):
+    """단말 상태 전환 (idle / ride_pending / drop_pending / resetting) — 바뀔 때만 이벤트 DB + 상태 저널에"""
+    prev = getattr(api, "status", None)
+    api.status = status
+    if prev != status:
+        stop = getattr(api, "current_stop_name", None)
+        EVENTS.record("status", state=status, stop=stop, prev=prev)
+        JOURNAL.write(status=status, stop=stop)
+
+def restore_state(api):
+    """새 BusAPI 의 상태: 저널에 최근 요청 대기가 있으면 그대로 (재시작/재연결로 기사 화면 경보를 잃지 않게)
+    연결이 새로 생긴 것일 뿐 상태 전환이 아니므로 set_status 를 거치지 않음 (이벤트 DB/저널에 안 씀)"""
+    saved = JOURNAL.load()
+    status = saved.get("status") if saved else None
+    if status not in ("ride_pending", "drop_pending"):
+        api.status = "idle"
+        return
+    api.current_stop_name = saved.get("stop")
+    api.status = status
+    if not BEEP.active:
+        (BEEP.alert_ride_request if status == "ride_pending" else BEEP.alert_drop_request)()
+    log.info("상태 복원: %s (%s)", status, api.current_stop_name)
 
 def force_idle(api):
     """버튼 눌러서 강제 대기(요청 없음)로 복귀"""
     if not api:
         return
-    api.status = "idle"
     api.current_stop_name = None
+    set_status(api, "idle")
     BEEP.stop()
-    LOG.add("버튼으로 상태 초기화 → 요청 없음")
+    trip_event("request_cleared", by="button")
+    log.info("버튼으로 상태 초기화 → 요청 없음")
+
+# ====== 서버 명령 핸들러 (WSClient / 리플레이 공용) ======
+def bind_api_handlers(api):
+    def on_ride_request(d):
+        PM.activity("ride_request")
+        api.current_stop_name = d.get("stopName") or d.get("stopNo")
+        set_status(api, "ride_pending")
+        log.info("승차 요청 수신: %s", api.current_stop_name)
+        BEEP.alert_ride_request()
+        trip_event("ride_request", stop=api.current_stop_name)
+
+    def on_drop_request(d):
+        PM.activity("drop_request")
+        api.current_stop_name = d.get("stopName") or d.get("stopNo")
+        set_status(api, "drop_pending")
+        log.info("하차 요청: %s", api.current_stop_name)
+        BEEP.alert_drop_request()
+        trip_event("drop_request", stop=api.current_stop_name)
+
+    api.on("ride_request", on_ride_request)
+    api.on("drop_request", on_drop_request)
+
+    api.on("cancel_request", lambda d: (
+        set_status(api, "idle"),
+        log.info("요청 취소 수신 (대기 상태로 전환)"),
+        BEEP.stop(),
+        trip_event("cancel_request")
+    ))
+
+    api.on("reset", lambda _: (
+        set_status(api, "resetting"),
+        log.info("강제 리셋 명령 수신 — 상태 초기화 중"),
+        BEEP.stop(),
+        trip_event("reset")
+    ))
 
 # ====== WS 클라이언트 스레드 ======
 class WSClient(threading.Thread):
     def __init__(self, device_type=2):  # 1=휴대폰, 2=버스, 3=정류장
-        super().__init__(daemon=True)
+        super().__init__(daemon=True, name="ws")
         self.device_type = device_type
-        self.state = "DISCONNECTED"
+        self._state = None
         self.last_err = ""
-        self.rtt_ms = None
+        self.state = "DISCONNECTED"
         self.stop_flag = threading.Event()
         self.ws = None
         self.api = None  # BusAPI 인스턴스를 외부에서도 접근 가능하게 저장
 
+    @property
+    def rtt_ms(self):
+        """BusAPI ping/ack 로 측정한 최소 필터 RTT (측정 전이면 None)"""
+        if self.api is None or self.api.latency.rtt_ms is None:
+            return None
+        return int(self.api.latency.rtt_ms)
     
     def run(self):
         import websocket, json
         last_send = 0
         send_interval = 0.5  # 500ms마다 전송
 
-        def on_ride_request(d):
-            api.status = "ride_pending"        # <- self가 아니라 api
-            api.current_stop_name = d.get("stopName") or d.get("stopNo")
-            LOG.add(f"승차 요청 수신: {api.current_stop_name}")
-            BEEP.alert_ride_request()
-
-        def on_drop_request(d):
-            api.status = "drop_pending"
-            api.current_stop_name = d.get("stopName") or d.get("stopNo")
-            LOG.add(f"하차 요청: {api.current_stop_name}")
-            BEEP.alert_drop_request()
-
-
         while not self.stop_flag.is_set():
+            HB.beat("ws")
+            if self.api is not None:
+                self.api.stop()     # 이전 연결 (끊겼거나 재연결 중) — 새 BusAPI 와 둘이 돌지 않게
             cfg = load_conf()
             ip    = (cfg.get("server_ip") or "").strip()
             devid = (cfg.get("device_id") or "").strip()
@@ -156,38 +230,17 @@ class WSClient(threading.Thread):
                 bus_no=cfg["bus_no"],
                 vehicle_no=cfg["vehicle_no"],
                 direction="상행",
-                server_ip=cfg["server_ip"]
+                server_ip=cfg["server_ip"],
+                transport=cfg.get("transport", "ws")      # "mqtt" / "mqtt5" 이면 브로커 경유 (mqttlink)
             )
-            api = self.api  # alias
 
-            # 상태 기본값 보장
-            self.api.status = "idle"
+            # 상태: 저널에 남은 요청 대기가 있으면 복원, 아니면 idle
+            restore_state(self.api)
+            self.api.telem_interval = PM.telem_interval
+            self.api.mqtt_password = cfg.get("mqtt_password")
 
             # 서버 명령 이벤트 등록
-            self.api.on("ride_request", on_ride_request)
-            self.api.on("drop_request", on_drop_request)
-            
-            '''
-            self.api.on("drop_request", lambda d: (
-                setattr(self.api, "status", "drop_pending"),
-                LOG.add("시각장애인 하차 요청 수신"),
-                BEEP.alert_drop_request()
-            ))
-            '''
-
-            
-            self.api.on("cancel_request", lambda d: (
-                setattr(self.api, "status", "idle"),
-                LOG.add("요청 취소 수신 (대기 상태로 전환)"),
-                BEEP.stop()
-            ))
-
-            self.api.on("reset", lambda _: (
-                setattr(self.api, "status", "resetting"),
-                LOG.add("강제 리셋 명령 수신 — 상태 초기화 중"),
-                BEEP.stop()
-
-            ))
+            bind_api_handlers(self.api)
 
             # BusAPI 스레드 시작
             self.api.start()
@@ -198,17 +251,31 @@ class WSClient(threading.Thread):
                 time.sleep(0.5)
                 continue
 
+            if self.api.transport != "ws":
+                # MQTT 는 BusAPI 가 연결/재연결까지 맡으므로 상태만 따라감 (별도 확인용 WS 없음)
+                self.state = "CONNECTING"
+                while not self.stop_flag.is_set() and self.api.is_alive():
+                    HB.beat("ws")
+                    link = self.api.ws
+                    self.state = "CONNECTED" if getattr(link, "online", False) else "CONNECTING"
+                    time.sleep(0.5)
+                if not self.stop_flag.is_set():
+                    self.last_err = "MQTT 브로커 연결 실패"
+                    self.state = "ERROR"
+                    time.sleep(1.2)
+                continue
+
             url = f"ws://{ip}:3000/device-ws"
             try:
                 self.state = "CONNECTING"
-                LOG.add(f"WS 연결 시도: {url}")
-            #    LOG.add(f"WS 연결 시도: 링크 검열")
+                log.info("WS 연결 시도: %s", url)
+            #    log.info("WS 연결 시도: 링크 검열")
                 self.ws = websocket.create_connection(
                     url, timeout=3, header=["User-Agent: buson-device"]
                 )
                 self.state = "CONNECTED"
                 self.last_err = ""
-                LOG.add("WS 연결됨")
+                log.info("WS 연결됨")
 
                 # hello 패킷에 device_type 추가
                 '''
@@ -225,11 +292,9 @@ class WSClient(threading.Thread):
                     }
                 }
                 self.ws.send(json.dumps(hello))
-                LOG.add("hello 전송")
+                log.info("hello 전송")
 '''
                 self.ws.settimeout(0.2)
-                pending_ack = None
-                sent_ts = 0
 
                 while not self.stop_flag.is_set():
                     now = time.time()
@@ -250,34 +315,50 @@ class WSClient(threading.Thread):
                         }
                         self.ws.send(json.dumps(telem))
                         last_send = now
-                        pending_ack = msg_id
-                        sent_ts = now
                 '''
-                    # 수신 처리
+                    # 수신 처리 (연결 유지 확인용, RTT 는 BusAPI.latency 가 측정)
+                    # 서버가 닫으면 recv 가 바로 예외 → 여기서 돌지 말고 나가서 다시 연결 (beat 는 제대로 돈 바퀴만)
                     try:
-                        raw = self.ws.recv()
-                        if not raw:
-                            continue
-                        obj = json.loads(raw)
-                        if obj.get("type") == "ack" and obj.get("ack_id") == pending_ack:
-                            self.rtt_ms = int((time.time() - sent_ts) * 1000.0)
-                            pending_ack = None
-                            LOG.add(f"ACK {obj.get('ack_id')} ({self.rtt_ms} ms)")
-                    except Exception:
+                        self.ws.recv()
+                    except websocket.WebSocketTimeoutException:
                         pass
+                    except Exception as e:
+                        self.last_err = str(e) or type(e).__name__
+                        log.warning("WS 끊김: %s", self.last_err)
+                        break
+                    if not self.api.is_alive():
+                        self.last_err = "BusAPI 연결 끊김"
+                        log.warning("BusAPI 연결 끊김 — 다시 연결")
+                        break
+                    HB.beat("ws")
 
                 try:
                     self.ws.close()
                 except:
                     pass
                 self.ws = None
+                if not self.stop_flag.is_set():
+                    self.state = "ERROR"
+                    time.sleep(1.2)
 
             except Exception as e:
-                self.state = "ERROR"
                 self.last_err = str(e)
-                LOG.add(f"WS 오류: {self.last_err}")
+                self.state = "ERROR"
+                log.warning("WS 오류: %s", self.last_err)
                 time.sleep(1.2)
 
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        # 바뀔 때만 이벤트 DB 에 (ERROR 는 last_err 를 먼저 채우고 바꿀 것)
+        if state != self._state:
+            self._state = state
+            EVENTS.record("conn", state=state, err=self.last_err if state == "ERROR" else None)
+            sd_notify(f"STATUS={STATUS_CONNECTED}" if state == "CONNECTED" else f"STATUS=서버 {state}")
+
     def stop(self):
         self.stop_flag.set()
 
@@ -291,239 +372,415 @@ def local_ip():
 
 # ====== GPS 폴링 스레드 ======
 class GPSPoller(threading.Thread):
-    def __init__(self):
-        super().__init__(daemon=True)
+    def __init__(self, stops=None, arrival=None):
+        super().__init__(daemon=True, name="gps")
         self.status = "NO_MODULE"
         self.info = {}
+        self.stops = StopTracker(stops) if stops else None   # StopIndex 를 진행 방향으로 (없으면 정류장 계산 생략)
+        self.arrival = arrival      # ArrivalEngine (없으면 도착 감지 생략)
+        self.stop_info = None       # {"current", "next", "next_seq", "dist_next_m"}
         self.stop_flag = threading.Event()
 
     def run(self):
         if not HAS_GPS:
             self.status = "NO_MODULE"; return
-        last = 0
         while not self.stop_flag.is_set():
-            if time.time() - last < 1.0:
-                time.sleep(0.05); continue
-            last = time.time()
-            try:
+            HB.beat("gps")
+            self.poll_once()
+            self.stop_flag.wait(PM.gps_interval)   # 1초, 유휴 중에는 길게
+
+    def poll_once(self):
+        try:
+            with profiler.span("gps.read"):
                 st, info = read_gps()
-                self.status = st
-                self.info = info or {}
-            except Exception:
-                self.status = "NO_MODULE"
-                self.info = {}
+            self.status = st
+            self.info = info or {}
+            if st == "FIX":
+                METRICS.gps_fix_at.set(time.monotonic())
+                lat, lon = self.info.get("lat"), self.info.get("lon")
+                if self.stops and lat is not None and lon is not None:
+                    self.stop_info = self.stops.locate(lat, lon)
+                if self.arrival and lat is not None and lon is not None:
+                    self.arrival.update_fix(lat, lon, self.info.get("speed"))
+                if lat is not None and lon is not None:
+                    TRIPS.add_fix(lat, lon, self.info.get("speed"))
+                if (self.info.get("speed") or 0) >= MOVE_KMH:
+                    PM.activity("gps")
+        except Exception:
+            self.status = "NO_MODULE"
+            self.info = {}
 
     def stop(self):
         self.stop_flag.set()
 
 # ====== UI 그리기 ======
-def draw_dashboard(wscli: WSClient, gps: GPSPoller, api=None):
-    global blink_state, last_blink, is_disabled_mode
+def start_render_process():
+    """config.json "render_process": true — 합성/LCD 전송을 별도 프로세스로"""
+    global RENDER
+    from renderproc import RenderProcess
+    RENDER = RenderProcess(device.size, CONSOLE, on_exit=_render_exited).start()
+    DISPLAY.redirect = RENDER.show_image
+
+def _render_exited():
+    """렌더 프로세스가 죽음 (리더 스레드) — 화면 출력은 바로 이 프로세스로, 정리는 다음 draw_dashboard 에서"""
+    DISPLAY.redirect = None
+
+def save_splash():
+    """지금 화면을 다음 부팅 첫 화면으로 (변환/저장은 splash 가 별도 스레드에서)"""
+    if RENDER is not None:
+        frame = RENDER.frame()
+    else:
+        frame = DISPLAY.fb.prev if DISPLAY.fb is not None else None   # 마지막으로 패널에 나간 프레임
+    splash.save_async(frame)
+
+def mark_dashboard_ready():
+    age = process_age_s()
+    if age is not None:
+        METRICS.dashboard_ready_ms.set(round(age * 1000.0, 1))
+        log.info("대시보드 첫 화면: 시작 후 %.0fms", age * 1000.0)
+    sd_notify("READY=1")
+
+def stop_render_process():
+    global RENDER
+    if RENDER is None:
+        return
+    DISPLAY.redirect = None
+    RENDER.stop()
+    RENDER = None
 
-    # 깜빡임
+def dashboard_state(wscli: WSClient, gps: GPSPoller, api=None):
+    """대시보드 한 프레임에 필요한 값만 모은 스냅샷 (렌더 프로세스로 보낼 수 있게 기본 타입만)"""
+    cfg = load_conf()
+    si = gps.stop_info
+    return {
+        "device_id": cfg.get("device_id", ""),
+        "stop_info": {k: si.get(k) for k in ("current", "next", "dist_next_m")} if si else None,
+        "has_gps": HAS_GPS,
+        "gps_status": gps.status,
+        "lat": gps.info.get("lat", "-"),
+        "lon": gps.info.get("lon", "-"),
+        "ws_state": wscli.state,
+        "ws_rtt": wscli.rtt_ms,
+        "ws_err": wscli.last_err or "",
+        "status": getattr(api, "status", "idle") if api else None,
+        "stop_name": getattr(api, "current_stop_name", None) if api else None,
+        "alert": timeline_for(BEEP),          # 경보 띠 깜빡임 시각표 (비프 패턴과 같은 박자)
+        "now": time.monotonic(),
+        "clock": datetime.fromtimestamp(timesvc.now(), KST).strftime("%H:%M:%S"),
+        "overlay": METRICS.overlay_lines() if METRICS.overlay else None,
+    }
+
+@profiler.hot_path("draw_dashboard")
+def draw_dashboard(wscli: WSClient, gps: GPSPoller, api=None, on_flushed=None, clock_only=False):
+    """clock_only: 유휴 절전 중 — 시계만 갱신 (나머지 위젯은 깨어날 때 한 번에)"""
+    t_frame = time.perf_counter()
+    if clock_only and RENDER is None:
+        with DASH.lock:
+            DASH.clock.set(text=datetime.fromtimestamp(timesvc.now(), KST).strftime("%H:%M:%S"))
+            DASH.present()
+        return
+    snap = dashboard_state(wscli, gps, api)
+
+    if RENDER is not None:
+        # 렌더 프로세스: 스냅샷 + 새 콘솔 줄만 보내고 바로 반환 (합성/SPI 는 다른 코어에서)
+        if RENDER.submit(snap, on_flushed):
+            return
+        log.error("렌더 프로세스가 죽어 이 프로세스에서 직접 그리기로 전환")
+        stop_render_process()
+
+    # 바뀐 위젯만 다시 그림. 전송은 flush 스레드가 (spi_flush_ms 는 거기서 측정) — frame_ms 는 합성 시간만
+    with DASH.lock:
+        alert = DASH.alert
+        DASH.update(snap)
+        sent = DASH.present(on_flushed)
+    METRICS.frame_ms.observe_since(t_frame)
+    if ANIM is not None and DASH.alert is not alert:
+        ANIM.poke()     # 경보 시각표가 바뀜 → 다음 깜빡임 시각 다시 계산
+    if not sent and on_flushed:
+        # 화면에 바뀐 게 없음 → 이미 반영된 상태
+        on_flushed()
+
+
+EXIT_LONG_PRESS = 1.5   # [X] 를 이만큼 누르고 있으면 프로파일 시작
+
+# ====== 입력 처리 (메인 루프 / 리플레이 공용) ======
+class InputState:
+    def __init__(self):
+        self.door_state = "close"
+        self.was_touched = False
+        self.touch_t0 = None       # 터치 지연 측정: 눌림 감지 시각
+        self.exit_press_t = None   # [X] 눌린 시각 (길게 누르기 감지)
+        self.swallow_touch = False # 유휴 화면을 깨운 터치 (탭으로 처리하지 않음)
+        self.arrival = None        # ArrivalEngine 이 있으면 안내 방송은 도착 이벤트에서
+        self.prof_hz = profiler.DEFAULT_HZ
+        self.prof_sec = profiler.DEFAULT_DURATION
+
+def apply_power_mode(idle, wscli, backlight_level=0):
+    """유휴 절전 전환: 백라이트 + telemetry 주기 (GPS/화면 주기는 PM 을 직접 읽음)"""
+    # 0 = 끔, 1~100 = PWM 백라이트 밝기 (config.json "lcd_backlight_gpio" 가 없으면 직결이라 그대로)
+    set_backlight(backlight_level if idle else 100)
+    if wscli.api is not None:
+        wscli.api.telem_interval = PM.telem_interval
+
+def send_door_event(api, state):
+    # BusAPI에 door 상태 송신
+    if api and api.connected:
+        api.send_event("door", {"state": state})
+
+def announce_bus_async():
+    # 음성 합성/재생이 수 초 걸리므로 입력/GPS 스레드를 막지 않도록 별도 스레드에서
+    cfg = load_conf()
+    bus_no = cfg.get("bus_no", "미등록")
+    threading.Thread(target=SOUND.announce_bus, args=(bus_no,), daemon=True).start()
+
+def on_arrival_event(wscli, kind, payload, uploader=None):
+    """ArrivalEngine 이벤트 → 서버 전송 + 도착 시 버스 번호 안내 (종점이면 운행 기록 마감)"""
+    trip_event(kind, stop=payload["stop_name"], seq=payload["stop_seq"])
+    if kind == "arrival":
+        log.info("정류장 도착: %s", payload['stop_name'])
+        announce_bus_async()
+        if payload.get("terminus"):
+            TRIPS.end_trip("terminus")
+            if uploader:
+                uploader.request_now()
+    else:
+        log.info("정류장 출발: %s", payload['stop_name'])
+    api = wscli.api
+    if api and api.connected:
+        api.send_event(kind, payload)
+
+def door_stop(st):
+    """문 이벤트에 붙일 정류장 — 도착 판정 엔진이 보고 있는 (다음 또는 정차 중) 정류장"""
+    eng = st.arrival
+    k = eng.stop_k if eng else None
+    return eng.route.stop_name[k] if k is not None else None
+
+def handle_gpio_event(st, api, ev):
+    """
+    디바운스된 GPIO 엣지 1건 처리 (gpioevents 디스패치 스레드 — UI 루프/화면 그리기와 무관하게 즉시)
+    ev: GpioEvent(name, pin, level, t_mono, t_wall)
+    """
+    woke = PM.activity(ev.name)
+    if ev.name == "touch":
+        # 터치 IRQ 는 깨우기만 (좌표/버튼 처리는 poll_touch). 꺼진 화면을 깨운 터치는 탭으로 치지 않음
+        if woke and ev.level == GPIO.LOW:
+            st.swallow_touch = True
+        return
+    if RECORDER.active:
+        RECORDER.gpio(ev.pin, ev.level)
+    t_ms = int(ev.t_wall * 1000)
+
+    # ----- 문 열림/닫힘 -----
+    if ev.name == "door":
+        if ev.level == GPIO.LOW:
+            st.door_state = "open"
+            send_door_event(api, "open")
+            log.info("문 열림 감지됨")
+            trip_event("door", t_ms=t_ms, stop=door_stop(st), state="open", status=getattr(api, "status", None))
+            if st.arrival:
+                # 정류장 도착(지오펜스+저속+문열림) 판정 시에만 안내
+                st.arrival.update_door(True)
+            else:
+                # 노선 형상 없으면 기존처럼 문 열릴 때마다 버스 번호 음성 안내
+                announce_bus_async()
+        else:
+            st.door_state = "close"
+            send_door_event(api, "close")
+            log.info("문 닫힘 감지됨")
+            trip_event("door", t_ms=t_ms, stop=door_stop(st), state="close", status=getattr(api, "status", None))
+            if st.arrival:
+                st.arrival.update_door(False)
+
+    # ----- 버튼: 누르면 즉시 idle로 (눌림 HIGH->LOW 순간만) -----
+    elif ev.name == "button" and ev.level == GPIO.LOW:
+        force_idle(api)
+
+def start_gpio_events(st, get_api, backend="rpi", threaded=True, debounce=True):
+    """문/버튼 엣지 감지 시작. get_api: 호출 시점의 BusAPI (재연결로 바뀔 수 있음)"""
+    ev = GpioEvents(GPIO, on_event=lambda e: handle_gpio_event(st, get_api(), e),
+                    backend=backend, threaded=threaded)
+    ev.add("door", DOOR_PIN, DOOR_DEBOUNCE if debounce else 0.0)
+    ev.add("button", BUTTON_PIN, BTN_DEBOUNCE if debounce else 0.0)
+    ev.add("touch", TOUCH_IRQ_PIN, 0.0)
+    return ev.start()
+
+def poll_touch(st):
+    # ----- 터치: 눌리는 순간만 처리 -----
     now = time.time()
-    if now - last_blink >= blink_interval:
-        blink_state = not blink_state
-        last_blink = now
+    touched = touch.touched()
+    if touched and not st.was_touched:
+        st.touch_t0 = time.perf_counter()
+        pos = touch.read()
+        if RECORDER.active:
+            RECORDER.touch(pos)
+        woke = PM.activity("touch") or st.swallow_touch
+        st.swallow_touch = False
+        w = DASH.hit(*pos) if pos and not woke else None
+        if w is None:
+            pass
+        elif w.name == "exit":
+            st.exit_press_t = now
+        elif w.name == "overlay_toggle":
+            METRICS.overlay = not METRICS.overlay
+        elif w.name == "console":
+            w.scroll_tap(pos[1])
+    elif not touched:
+        if st.was_touched and RECORDER.active:
+            RECORDER.touch(None)
+        st.exit_press_t = None
+    if st.exit_press_t is not None and now - st.exit_press_t >= EXIT_LONG_PRESS:
+        st.exit_press_t = None
+        if profiler.start(hz=st.prof_hz, duration=st.prof_sec):
+            log.info("프로파일 %.0f초 수집 중…", st.prof_sec)
+    st.was_touched = touched
+
+# ====== 메인 루프 ======
+def main():
+    global ANIM
+    # 화면 합성/전송 프로세스 분리 (config.json "render_process": true)
+    # fork 라서 스레드가 생기기 전 (로깅 writer, metrics 서버보다 먼저) 시작
+    render_err = None
+    if load_conf().get("render_process"):
+        try:
+            start_render_process()
+        except Exception as e:
+            render_err = e
 
-    img = Image.new("RGB", device.size, UI_BG)
-    draw = ImageDraw.Draw(img)
+    # 로깅 (파일 + 화면 콘솔)
+    logsys.setup("bussys", ring=LOG)
+    if render_err:
+        log.warning("렌더 프로세스 시작 실패, 직접 그리기 사용: %s", render_err)
 
-    # 상단 바 + [X]
-    draw.rectangle((0, 0, 320, 30), fill="#111")
-    draw.rectangle((282, 4, 312, 26), outline="#f66", width=2)
-    #tw, th = draw.textsize("X", font=FONT_MED)
-    bbox = draw.textbbox((0, 0), "X", font=FONT_MED)
-    tw, th = bbox[2] - bbox[0], bbox[3] - bbox[1]
-    draw.text((297 - tw//2, 15 - th//2), "X", font=FONT_MED, fill="#f66")
+    try:
+        metrics.serve()
+    except OSError as e:
+        log.warning("metrics 엔드포인트 시작 실패: %s", e)
 
+    # 입력 기록 (config.json "record_inputs": true) → recordings/*.brec, replay.py 로 재생
     cfg = load_conf()
-    draw.text((10, 6), f"ID:{cfg.get('device_id','')}", font=FONT_SMALL, fill="#9ad0ff")
+    if cfg.get("record_inputs"):
+        log.info("입력 기록 시작: %s", os.path.basename(start_recording(cfg)))
 
-    y = 34
+    # 시계: GPS RMC 로 보정 (gpsrx), config.json "pps_pin" 이 있으면 PPS 엣지로 정밀 보정
+    METRICS.time_error_ms.fn = lambda: CLOCK.status()["error_ms"]
+    if cfg.get("pps_pin") is not None:
+        try:
+            CLOCK.attach_pps(GPIO, int(cfg["pps_pin"]))
+        except Exception as e:
+            log.warning("PPS 입력 설정 실패: %s", e)
 
-    # GPS 상태
-    if HAS_GPS:
-        if gps.status == "NO_MODULE":
-            gps_line = "GPS 모듈 없음"
-            gps_col = "#bbb"
-        elif gps.status == "NO_FIX":
-            gps_line = "GPS 연결 되었음"
-            gps_col = "#ff7070"
-        else:
-            lat = gps.info.get("lat", "-")
-            lon = gps.info.get("lon", "-")
-            gps_line = f"GPS 연결됨 ({lat}, {lon})"
-            gps_col = "white"
-    else:
-        gps_line = "GPS 미사용"
-        gps_col = "#bbb"
-    draw.text((10, y), gps_line, font=FONT_SMALL, fill=gps_col)
-    y += 18
-
-    # WS 상태
-    if wscli.state == "CONNECTED":
-        ws_line = f"WS 연결됨 ({wscli.rtt_ms or '-'} ms)"
-        ws_col = "#6effa1"
-    elif wscli.state == "CONNECTING":
-        ws_line = "WS 연결 중…"
-        ws_col = "#9ad0ff"
-    elif wscli.state == "ERROR":
-        ws_line = f"WS 오류: {wscli.last_err[:30]}..."
-        ws_col = "#ff9f43"
-    else:
-        ws_line = "WS 끊김"
-        ws_col = "#ff7070"
-    draw.text((10, y), ws_line, font=FONT_SMALL, fill=ws_col)
-    y += 20
-    draw.line((10, y + 10, 310, y + 10), fill="#333", width=1)
-    y += 20
-
-    # 콘솔 박스
-    draw.text((10, y - 6), "Console", font=FONT_SMALL, fill="#9ad0ff")
-    box_y0 = y + 12
-    draw.rectangle((10, box_y0, 310, 155), outline="#555", width=1)
-    lines = LOG.lines()
-    py = 152
-    for line in reversed(lines):
-        draw.text((14, py), line, font=FONT_MONO, fill="#ddd")
-        py -= 16
-        if py < box_y0 + 2:
-            break
-
-
-
-    # ------------------------------
-    # 하단 상태 (버스 단말 상태 표시)
-    # ------------------------------
-    status_text = "대기 중"
-    stop_line = ""         # <- 정류장 이름용
-    color_fg = "black"
-    color_bg = "white"
-
-    if api:
-        st = getattr(api, "status", "idle")
-        stop_name = getattr(api, "current_stop_name", None)
-
-        if st == "idle":
-            status_text = "요청 없음"
-
-        elif st == "ride_pending":
-            status_text = "시각장애인 승차 요청"
-            color_fg = "red" if blink_state else "white"
-            color_bg = "white" if blink_state else "red"
-            if stop_name:
-                stop_line = stop_name
-
-        elif st == "ride_active":
-            status_text = "탑승 중"
-            color_fg = "white"
-            color_bg = "green"
-            if stop_name:
-                stop_line = stop_name
-
-        elif st == "drop_pending":
-            status_text = "하차 요청"
-            color_fg = "yellow" if blink_state else "black"
-            color_bg = "black" if blink_state else "yellow"
-            if stop_name:
-                stop_line = stop_name
-
-        elif st == "resetting":
-            status_text = "상태 초기화 중…"
-            color_fg = "white"
-            color_bg = "#444"
-
-    # 실제 그리기
-    draw.rectangle((0, 160, 320, 240), fill=color_bg)
-    bbox = draw.textbbox((0, 0), status_text, font=FONT_BIG)
-    tw, th = bbox[2] - bbox[0], bbox[3] - bbox[1]
-    draw.text(((320 - tw)//2, 170), status_text, font=FONT_BIG, fill=color_fg)
-
-    # 정류장 이름 한 줄 더
-    if stop_line:
-        bbox2 = draw.textbbox((0, 0), stop_line, font=FONT_SMALL)
-        tw2, th2 = bbox2[2] - bbox2[0], bbox2[3] - bbox2[1]
-        draw.text(((320 - tw2)//2, 170 + th + 6), stop_line, font=FONT_SMALL, fill=color_fg)
-
-
-    # 하단 시각
-    now_str = datetime.now(KST).strftime("%H:%M:%S")
-    #tw, th = draw.textsize(now_str, font=FONT_SMALL)
-    bbox = draw.textbbox((0, 0), now_str, font=FONT_SMALL)
-    tw, th = bbox[2] - bbox[0], bbox[3] - bbox[1]
-    draw.text((320 - tw - 8, 240 - th - 4), now_str, font=FONT_SMALL, fill="#888")
-
-    device.display(img)
-
-
-def point_in_exit(px, py):
-    # [X] hit-test (282,4)-(312,26)
-    return 282 <= px <= 312 and 4 <= py <= 26
+    # 노선 정류장 인덱스 (stops/<bus_no>.stx 또는 stops/<line_name>.stx)
+    stops = StopIndex.for_route(cfg.get("bus_no"), cfg.get("line_name"))
+    if stops:
+        log.info("정류장 인덱스 로드: %d개", len(stops))
 
-# ====== 메인 루프 ======
-def main():
-    global is_disabled_mode, _last_btn, _last_btn_ts
+    # 운행 궤적 기록 (trips/*.trp) — 지난번 비정상 종료로 남은 기록은 업로드 대기로
+    TRIPS.set_meta(device_id=cfg.get("device_id"), bus_no=cfg.get("bus_no"), vehicle_no=cfg.get("vehicle_no"))
+    if TRIPS.recover():
+        log.info("이전 운행 기록 복구 → 업로드 대기")
+    uploader = TripUploader()
+
+    # 운영 이벤트 DB (events.db) — 요청/상태/문/연결/도착 기록, 쓰기는 writer 스레드가 묶어서
+    EVENTS.open()
 
     # 백그라운드
     wscli = WSClient(); wscli.start()
-    gps = GPSPoller(); gps.start()
-    last_door = GPIO.input(DOOR_PIN)  # 초기값
-    door_state = "close"
+    # 계측: 송신 대기 큐 = 현재 BusAPI 의 응답 대기(send_reliable) + MQTT 송신 큐
+    METRICS.out_queue_depth.fn = lambda: wscli.api.out_backlog() if wscli.api is not None else 0
+
+    # 도착/출발 감지 (노선 형상 stops/<이름>.line 이 있으면 사용, 없으면 정류장 연결선)
+    arrival = None
+    if stops:
+        line_name = cfg.get("bus_no") or cfg.get("line_name")
+        route = RouteGeometry.from_stop_index(stops, os.path.join(STOPS_DIR, f"{line_name}.line"))
+        if route:
+            arrival = ArrivalEngine(route, on_event=lambda kind, p: on_arrival_event(wscli, kind, p, uploader))
+
+    gps = GPSPoller(stops, arrival); gps.start()
+    st = InputState()
+    st.arrival = arrival
+
+    # 프로파일러: kill -USR1 <pid> 또는 [X] 길게 누르기
+    st.prof_hz = int(cfg.get("profile_hz", profiler.DEFAULT_HZ))
+    st.prof_sec = float(cfg.get("profile_sec", profiler.DEFAULT_DURATION))
+    profiler.install_signal(hz=st.prof_hz, duration=st.prof_sec)
+
+    # 문/버튼: 엣지 인터럽트 → 디바운스 → 바로 서버 송신 (config.json "gpio_backend": "rpi" | "gpiod")
+    gpio_ev = start_gpio_events(st, lambda: wscli.api, backend=cfg.get("gpio_backend", "rpi"))
+
+    # 유휴 절전 (config.json "idle_after_min", "idle_backlight", "current_sensor": hwmon curr*_input 경로)
+    PM.idle_after = float(cfg.get("idle_after_min", IDLE_AFTER_MIN)) * 60
+    idle_bl = int(cfg.get("idle_backlight", 0))
+    PM.on_change = lambda idle: apply_power_mode(idle, wscli, idle_bl)
+    if cfg.get("current_sensor"):
+        PM.current_fn = hwmon_current(cfg["current_sensor"])
+
+    # 경보 띠 애니메이션 (렌더 프로세스를 쓰면 그쪽이 자체 타이머로 전환)
+    if RENDER is None:
+        ANIM = AnimationTimer(DASH).start()
+
+    # 작업 스레드 생존 감시 → 감독(main.py Supervisor 또는 systemd)에 WATCHDOG=1, 멈추면 trigger
+    HB.expect("ui", 15)
+    HB.expect("ws", 20, thread=lambda: wscli)
+    HB.expect("busapi", 20, thread=lambda: wscli.api,
+              probe=lambda: wscli.api.last_tick if wscli.api is not None and wscli.api.is_alive() else None)
+    if HAS_GPS:
+        HB.expect("gps", 20, thread=lambda: gps)
+    watchdog = Watchdog(HB); watchdog.start()
+    # 감독이 SIGTERM 으로 끝낼 때도 finally 정리(운행 기록 마감, 이벤트 DB 비우기)를 거치게
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # 부팅 시간: main.py 가 잰 "시작 → 설정 화면" 은 환경변수로 넘어옴, 이 프로세스는 첫 대시보드 프레임까지
+    if os.environ.get("BUS_BOOT_MS"):
+        METRICS.boot_interactive_ms.set(float(os.environ["BUS_BOOT_MS"]))
+    draw_dashboard(wscli, gps, wscli.api, on_flushed=mark_dashboard_ready)
+    next_splash = time.monotonic() + SPLASH_FIRST_S
 
     try:
         while True:
-            now = time.time()
-            val = GPIO.input(BUTTON_PIN)
-            door_val = GPIO.input(DOOR_PIN)
-
-            # ----- 문 열림 감지 -----
-            if door_val != last_door:
-                last_door = door_val
-                if door_val == GPIO.LOW:
-                    door_state = "open"
-                    LOG.add("문 열림 감지됨")
-                    # BusAPI에 door 상태 송신
-                    if wscli.api and wscli.api.connected:
-                        wscli.api.send({
-                            "type": "event",
-                            "event": "door",
-                            "payload": {"state": "open"}
-                        })
-                    # 버스 번호 음성 안내
-                    cfg = load_conf()
-                    bus_no = cfg.get("bus_no", "미등록")
-                    SOUND.announce_bus(bus_no)
-                else:
-                    door_state = "close"
-                    LOG.add("문 닫힘 감지됨")
-                    if wscli.api and wscli.api.connected:
-                        wscli.api.send({
-                            "type": "event",
-                            "event": "door",
-                            "payload": {"state": "close"}
-                        })
-
-            # ----- 버튼: 누르면 즉시 idle로 -----
-            if val != _last_btn:
-                # 눌림(HIGH->LOW) 순간만 처리
-                if val == GPIO.LOW and (now - _last_btn_ts) > BTN_DEBOUNCE:
-                    force_idle(wscli.api)
-
-                _last_btn = val
-                _last_btn_ts = now
-
+            HB.beat("ui")
+            poll_touch(st)
+
+            # ----- telemetry 에 실을 위치/정류장 정보 -----
+            if wscli.api:
+                wscli.api.gps_data = gps.info
+                wscli.api.stop_info = gps.stop_info
+                wscli.api.arrival = arrival
+                # 끝난 운행 기록: 요청 없이 정차 중이거나 종점 도착 시 업로드
+                uploader.poll(wscli.api, idle=getattr(wscli.api, "status", None) == "idle" and TRIPS.stationary_s() >= UPLOAD_IDLE_S)
+
+            # ----- 유휴 절전: 요청 처리 중이면 활동으로 간주 -----
+            PM.check(busy=getattr(wscli.api, "status", "idle") not in ("idle", None))
+
+            # ----- 부팅 화면 저장: 평상시(연결됨 + 요청 없음 + 화면 켜짐) 모습만 -----
+            if time.monotonic() >= next_splash and not PM.idle and wscli.state == "CONNECTED" \
+                    and getattr(wscli.api, "status", None) == "idle":
+                save_splash()
+                next_splash = time.monotonic() + SPLASH_SAVE_S
 
             # ----- UI 업데이트 -----
-            draw_dashboard(wscli, gps, wscli.api)
-            time.sleep(0.05)
+            # 터치 지연은 그 터치가 반영된 프레임이 실제로 전송된 시점까지
+            t_touch, st.touch_t0 = st.touch_t0, None
+            draw_dashboard(wscli, gps, wscli.api, clock_only=PM.idle,
+                           on_flushed=None if t_touch is None else lambda: METRICS.touch_latency_ms.observe_since(t_touch))
+            PM.wait(PM.frame_interval)   # 50ms, 유휴 중 1초 — 깨우기 신호가 오면 바로
 
 
     except KeyboardInterrupt:
         pass
     finally:
-        wscli.stop(); gps.stop()
+        gpio_ev.stop(); wscli.stop(); gps.stop(); watchdog.stop()
+        if ANIM is not None:
+            ANIM.stop()
+        log.info("절전 통계: %s", PM.stats())
+        stop_render_process()
+        DISPLAY.stop()
+        TRIPS.end_trip("shutdown")
+        EVENTS.close()
+        RECORDER.stop()
+        metrics.shutdown()
         GPIO.cleanup()
+        logsys.shutdown()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,108 @@
+# console.py — 화면 미니 콘솔 (고정 용량 링버퍼 + 줄 단위 래스터 캐시 + 증분 스크롤 렌더)
+#
+# - RingLog: 최근 history 줄을 보관. 줄은 추가될 때 한 번만 8bit 마스크로 래스터화되고
+#            미리 할당된 이미지를 재사용하므로 add() 에서 리스트 insert/pop 이 없다.
+# - ConsoleView: 콘솔 영역 픽셀을 들고 있다가 새 줄이 생기면 기존 픽셀 행을 위로
+#                밀어 올리고 새 줄만 그린다. 스크롤백(offset>0) 중에는 페이지 단위로 다시 그림.
+import threading
+import timesvc
+from datetime import datetime, timezone, timedelta
+from PIL import Image, ImageDraw
+
+KST = timezone(timedelta(hours=9))
+
+class RingLog:
+    def __init__(self, cap=8, history=500, font=None, width=296, line_h=16):
+        self.cap = cap              # 화면 콘솔에서 기본으로 보여줄 줄 수 (lines() 기본값)
+        self.history = history      # 메모리에 보관하는 전체 줄 수 (스크롤백)
+        self.font = font
+        self.width = width
+        self.line_h = line_h
+        self.lock = threading.Lock()
+        self.seq = 0                # 지금까지 추가된 총 줄 수 (렌더러가 변경 감지용으로 사용)
+        self._text = [""] * history
+        self._mask = [Image.new("L", (width, line_h), 0) for _ in range(history)] if font else None
+        self._draw = [ImageDraw.Draw(m) for m in self._mask] if font else None
+
+    def add(self, line, ts=None):
+        """ts: epoch 초 (로그 레코드 시각). 없으면 timesvc.now()"""
+        ts = datetime.fromtimestamp(timesvc.now() if ts is None else ts, KST).strftime("%H:%M:%S")
+        self.add_text(f"{ts} · {line}")
+
+    def add_text(self, text):
+        """시각까지 붙은 완성된 줄 추가 (렌더 프로세스 쪽 사본이 원본 줄을 그대로 받을 때)"""
+        with self.lock:
+            i = self.seq % self.history
+            self._text[i] = text
+            if self._draw is not None:
+                d = self._draw[i]
+                d.rectangle((0, 0, self.width, self.line_h), fill=0)
+                d.text((2, 0), text, font=self.font, fill=255)
+            self.seq += 1
+
+    def __len__(self):
+        return min(self.seq, self.history)
+
+    def lines(self, n=None, offset=0):
+        """오래된 → 최신 순서로 최근 n줄 (offset 만큼 과거로 스크롤)"""
+        n = self.cap if n is None else n
+        with self.lock:
+            end = self.seq - offset
+            start = max(end - n, self.seq - self.history, 0)
+            return [self._text[k % self.history] for k in range(start, end)]
+
+    def since(self, seq):
+        """seq 번째 이후 추가된 줄 (seq, [줄...]) — 보관 범위 밖으로 밀려난 줄은 빠짐"""
+        with self.lock:
+            start = max(seq, self.seq - self.history)
+            return self.seq, [self._text[k % self.history] for k in range(start, self.seq)]
+
+    def paste_rows(self, region, seq_from, seq_to, row0, fg):
+        """seq_from~seq_to-1 번째 줄 마스크를 region 의 row0 행부터 fg 색으로 찍음"""
+        with self.lock:
+            lo = max(seq_from, self.seq - self.history, 0)
+            for k in range(lo, seq_to):
+                y = (row0 + k - seq_from) * self.line_h
+                region.paste(fg, (0, y), self._mask[k % self.history])
+
+class ConsoleView:
+    """RingLog 를 고정 영역(rows 줄)에 그려두고 변경분만 갱신"""
+    def __init__(self, ring, rows=3, fg="#ddd", bg="black"):
+        self.ring = ring
+        self.rows = rows
+        self.fg = fg
+        self.bg = bg
+        self.offset = 0             # 0 = 최신, >0 = 그 줄 수만큼 과거
+        self.image = Image.new("RGB", (ring.width, rows * ring.line_h), bg)
+        self._seq = 0               # 화면에 반영된 마지막 seq
+        self._shown_offset = 0
+        self.dirty = True
+
+    def scroll(self, delta):
+        """delta>0 이면 과거로, <0 이면 최신 쪽으로 (줄 단위)"""
+        limit = max(0, len(self.ring) - self.rows)
+        self.offset = max(0, min(limit, self.offset + delta))
+
+    def update(self):
+        """변경이 있으면 self.image 를 갱신하고 True 반환"""
+        seq = self.ring.seq
+        if seq == self._seq and self.offset == self._shown_offset:
+            return False
+        lh = self.ring.line_h
+        new = seq - self._seq
+        if self.offset == 0 and self._shown_offset == 0 and new < self.rows:
+            # 기존 픽셀 행을 위로 밀고 새 줄만 아래에 그림
+            keep = (self.rows - new) * lh
+            self.image.paste(self.image.crop((0, new * lh, self.ring.width, self.rows * lh)), (0, 0))
+            self.image.paste(self.bg, (0, keep, self.ring.width, self.rows * lh))
+            self.ring.paste_rows(self.image, self._seq, seq, self.rows - new, self.fg)
+        else:
+            # 스크롤백 이동/대량 추가: 페이지 전체 다시 그림
+            end = seq - self.offset
+            start = end - self.rows
+            self.image.paste(self.bg, (0, 0, self.ring.width, self.rows * lh))
+            self.ring.paste_rows(self.image, start, end, 0, self.fg)
+        self._seq = seq
+        self._shown_offset = self.offset
+        self.dirty = True
+        return True
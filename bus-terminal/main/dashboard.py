@@ -0,0 +1,130 @@
+# dashboard.py — 운행 대시보드 화면 (widgets 위젯 구성 + 상태 스냅샷 반영)
+#
+# bussys 의 상태(WS/GPS/BusAPI/콘솔)를 직접 읽지 않고 snapshot dict 만 보고 위젯 속성을 바꾼다.
+# 바뀐 위젯만 다시 그려지므로 대부분의 프레임은 시계/콘솔 영역만 갱신된다.
+# 같은 코드가 bussys 메인 프로세스(기본)와 렌더 프로세스(renderproc) 양쪽에서 돈다.
+#
+#   DASH = DashboardScreen(CONSOLE)
+#   DASH.update(bussys.dashboard_state(wscli, gps, api))
+#   DASH.present(on_flushed)                 # 바뀐 게 있을 때만 lcdsystem.DISPLAY 로
+#   w = DASH.hit(x, y)                       # w.name: "exit" / "overlay_toggle" / "console"
+#   DASH.tick(time.monotonic())              # 경보 띠 프레임 전환 (alertanim.AnimationTimer 가 정시에 호출)
+from lcdsystem import FONT_BIG, FONT_MED, FONT_SMALL, FONT_MONO
+from widgets import Screen, Box, Label, Button, ConsoleBox, TextPanel, StatusBand, HitArea
+from alertanim import Timeline
+
+UI_BG = "black"
+OVERLAY_BOX = (4, 34, 317, 105)
+
+# api.status → (문구, 글자색, 배경색, 깜빡일 때 글자색, 깜빡일 때 배경색)
+_STATUS = {
+    "idle":         ("요청 없음", "black", "white", None, None),
+    "ride_pending": ("시각장애인 승차 요청", "white", "red", "red", "white"),
+    "ride_active":  ("탑승 중", "white", "green", None, None),
+    "drop_pending": ("하차 요청", "black", "yellow", "yellow", "black"),
+    "resetting":    ("상태 초기화 중…", "white", "#444", None, None),
+}
+
+class DashboardScreen(Screen):
+    def __init__(self, console):
+        """console: ConsoleView (bussys 는 원본, 렌더 프로세스는 사본)"""
+        super().__init__((320, 240), UI_BG)
+        # 상단 바: ID / 다음 정류장 / [X]
+        self.add(Box((0, 0, 320, 31), fill="#111"))
+        self.add(HitArea((0, 0, 141, 31), name="overlay_toggle"))
+        self.id_label = self.add(Label((10, 6, 90, 30), font=FONT_SMALL, fg="#9ad0ff"))
+        self.stop_label = self.add(Label((90, 6, 282, 30), font=FONT_SMALL, fg="#ffd166"))
+        self.add(Button((282, 4, 313, 27), "X", FONT_MED, fg="#f66", name="exit"))
+        # GPS / WS 상태
+        self.gps_label = self.add(Label((10, 34, 320, 52), font=FONT_SMALL))
+        self.ws_label = self.add(Label((10, 52, 320, 72), font=FONT_SMALL))
+        self.add(Box((10, 82, 311, 83), fill="#333"))
+        # 콘솔
+        self.add(Label((10, 86, 120, 104), "Console", FONT_SMALL, fg="#9ad0ff"))
+        self.console_ofs = self.add(Label((250, 86, 320, 104), font=FONT_SMALL, fg="#ff9f43"))
+        self.console = self.add(ConsoleBox((10, 104, 311, 156), console, name="console"))
+        # 하단 상태 띠 + 시각
+        self.band = self.add(StatusBand((0, 160, 320, 240), FONT_BIG, FONT_SMALL))
+        self.clock = self.add(Label((200, 216, 320, 240), font=FONT_SMALL, fg="#888",
+                                    align="right", valign="bottom", pad=(8, 4)))
+        # 계측 오버레이 (상단 ID 영역 탭으로 토글)
+        self.overlay = self.add(TextPanel(OVERLAY_BOX, font=FONT_MONO, fg="#ff9f43", bg="#000", outline="#ff9f43"))
+        self.overlay.show(False)
+        self.alert = None                        # 경보 띠 Timeline (깜빡이는 상태일 때만)
+
+    def update(self, s):
+        """s: bussys.dashboard_state() 스냅샷 → 위젯 속성 (바뀐 것만 무효화)"""
+        self.id_label.set(text=f"ID:{s['device_id']}")
+
+        # 다음 정류장 (단말 정류장 인덱스 기준, 서버 연결 없어도 표시)
+        si = s["stop_info"]
+        stop_txt = ""
+        if si and si.get("current"):
+            stop_txt = f"● {si['current']}"[:11]
+        elif si and si.get("next"):
+            stop_txt = f"▶ {si['next']} {si['dist_next_m']}m"[:11]
+        self.stop_label.set(text=stop_txt)
+
+        # GPS 상태
+        if s["has_gps"]:
+            if s["gps_status"] == "NO_MODULE":
+                gps_line, gps_col = "GPS 모듈 없음", "#bbb"
+            elif s["gps_status"] == "NO_FIX":
+                gps_line, gps_col = "GPS 연결 되었음", "#ff7070"
+            else:
+                gps_line, gps_col = f"GPS 연결됨 ({s['lat']}, {s['lon']})", "white"
+        else:
+            gps_line, gps_col = "GPS 미사용", "#bbb"
+        self.gps_label.set(text=gps_line, fg=gps_col)
+
+        # WS 상태
+        ws = s["ws_state"]
+        if ws == "CONNECTED":
+            ws_line, ws_col = f"WS 연결됨 ({s['ws_rtt'] or '-'} ms)", "#6effa1"
+        elif ws == "CONNECTING":
+            ws_line, ws_col = "WS 연결 중…", "#9ad0ff"
+        elif ws == "ERROR":
+            ws_line, ws_col = f"WS 오류: {s['ws_err'][:30]}...", "#ff9f43"
+        else:
+            ws_line, ws_col = "WS 끊김", "#ff7070"
+        self.ws_label.set(text=ws_line, fg=ws_col)
+
+        # 콘솔 — 새 줄/스크롤이 있을 때만 콘솔 상자 갱신
+        self.console.poll()
+        off = self.console.view.offset
+        self.console_ofs.set(text=f"-{off}줄" if off else "")
+
+        # 하단 상태 띠 — 깜빡이는 상태는 두 프레임을 미리 그려두고 시각표로 전환
+        text, fg, bg = "대기 중", "black", "white"
+        sub = ""
+        blink_fg = blink_bg = None
+        if s["status"] is not None:
+            text, fg, bg, blink_fg, blink_bg = _STATUS.get(s["status"], (text, fg, bg, None, None))
+            if s["status"] in ("ride_pending", "ride_active", "drop_pending") and s["stop_name"]:
+                sub = s["stop_name"]
+        frames = [(text, sub, fg, bg)]
+        if blink_fg and s["alert"]:
+            frames.append((text, sub, blink_fg, blink_bg))
+            t0, steps = s["alert"]
+            if self.alert is None or (self.alert.t0, self.alert.steps) != (t0, tuple(steps)):
+                self.alert = Timeline(t0, steps)
+        else:
+            self.alert = None
+        self.band.set_frames(frames)
+        self.tick(s["now"])
+        self.clock.set(text=s["clock"])
+
+        # 오버레이
+        if s["overlay"]:
+            self.overlay.set(lines=tuple(s["overlay"]))
+            self.overlay.show(True)
+        else:
+            self.overlay.show(False)
+
+    def tick(self, now):
+        if self.alert is None:
+            self.band.show_frame(0)
+            return None
+        frame, nxt = self.alert.at(now)
+        self.band.show_frame(frame)
+        return nxt
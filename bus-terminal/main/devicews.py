@@ -0,0 +1,535 @@
+# devicews.py — device-ws 프로토콜 대역 서버 (Node 백엔드 없이 단말/ fleetsim 시험용)
+#
+# ws://<ip>:3000/device-ws 에서 단말이 쓰는 프로토콜을 그대로 흉내 낸다 (backend deviceWS.cjs / appApi.cjs 기준).
+#   단말 → 서버: hello / telemetry / ping / event / trip_upload … — type 과 device 가 없으면 무시 (백엔드와 동일),
+#                msg_id 가 있으면 {type:"ack", ack_id, ts:<서버 수신 ms>}
+#                trip_upload 는 저장(메모리) 후 {type:"trip_upload_ack", ack_id, payload:{trip_ids:[저장한 것]}} (tripStore.cjs 와 같은 규칙)
+#   서버 → 단말: ride_request / alight_request (msg_id, ts, payload), command (cancel_request / reset / 임의 cmd),
+#                event / info
+# 장애 주입 (seed 고정 → 같은 시나리오면 같은 결과):
+#   latency_ms / jitter_ms  서버 → 단말 메시지(ack 포함) 지연 (연결별 순서는 유지, TCP 처럼)
+#   drop                    서버 → 단말 메시지를 이 확률로 버림 (ack 유실 → 재전송 경로)
+#   disconnect_every        연결마다 평균 이 초마다 close 없이 끊음 (재연결 경로)
+#   storm(...)              초당 rate 개 메시지 폭주
+# 받은/보낸 메시지와 연결/끊김은 JSONL 로 기록 → summary 로 처리량, 재연결, 지연을 오프라인에서 다시 계산.
+# --mqtt 를 주면 브로커 경유 단말(mqttlink 주제)도 같은 규칙으로 받는다 (장애 주입 중 강제 끊기만 WS 전용).
+#
+#   python3 devicews.py serve --port 3000 --record /tmp/dws.jsonl --latency 80 --jitter 30 --drop 0.02
+#   python3 devicews.py serve --mqtt 127.0.0.1:1883           # WS + MQTT 동시
+#   python3 devicews.py serve --script scenario.json          # [{"at": 2, "ride_request": {"device": "*"}}, ...]
+#   python3 devicews.py summary /tmp/dws.jsonl
+#
+#   srv = StandInServer(port=3999, record="/tmp/dws.jsonl"); await srv.start()
+#   srv.ride_request("sim-0001", stopName="시청"); srv.faults.update(latency_ms=200)
+import os, re, sys, json, time, uuid, base64, random, asyncio, argparse, logging
+from collections import Counter
+import aiows
+from metrics import percentile
+
+PATH = "/device-ws"
+CHAOS_TICK_S = 0.1
+TRIP_ID_RE = re.compile(r"^[\w.-]{1,64}$")     # backend tripStore.cjs 와 같은 규칙 (경로 문자 금지)
+
+log = logging.getLogger("devicews")
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+# ====== 장애 주입 ======
+class Faults:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, drop=0.0, disconnect_every=0.0, seed=1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.drop = drop
+        self.disconnect_every = disconnect_every
+        self.rng = random.Random(seed)
+
+    def update(self, **kw):
+        for k, v in kw.items():
+            if not hasattr(self, k) or k == "rng":
+                raise KeyError(f"알 수 없는 장애 항목: {k}")
+            setattr(self, k, float(v))
+
+    def delay(self):
+        """이번 메시지 지연 (초)"""
+        ms = self.latency_ms
+        if self.jitter_ms:
+            ms += self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, ms) / 1000.0
+
+    def dropped(self):
+        return self.drop > 0 and self.rng.random() < self.drop
+
+    def snapshot(self):
+        return {k: getattr(self, k) for k in ("latency_ms", "jitter_ms", "drop", "disconnect_every")}
+
+# ====== 기록 ======
+class Capture:
+    """JSONL 한 줄 = {"ts": 서버 ms, "ev": in|out|drop|reject|connect|close, "dev", "msg"}"""
+    def __init__(self, path=None):
+        self.path = path
+        self._f = open(path, "w", encoding="utf-8") if path else None
+        self.counts = Counter()
+
+    def write(self, ev, dev=None, msg=None, **extra):
+        self.counts[ev] += 1
+        if self._f is None:
+            return
+        rec = {"ts": _now_ms(), "ev": ev, "dev": dev}
+        if msg is not None:
+            rec["msg"] = msg
+        rec.update(extra)
+        self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def close(self):
+        if self._f:
+            self._f.close()
+            self._f = None
+
+# ====== 연결 ======
+class Peer:
+    """단말 연결 하나: 장치 정보 + 지연/유실을 거치는 송신 큐 (연결별 순서 유지)"""
+    def __init__(self, server, ws):
+        self.server, self.ws = server, ws
+        self.dev = None
+        self.meta = {"ip": ws.remote}
+        self.last_seen = None
+        self.connected_at = time.monotonic()
+        self._q = asyncio.Queue()
+        self._due = 0.0
+        self._pump = asyncio.get_running_loop().create_task(self._run_pump())
+
+    def send(self, obj):
+        faults, cap = self.server.faults, self.server.capture
+        if faults.dropped():
+            cap.write("drop", self.dev, obj)
+            return
+        loop = asyncio.get_running_loop()
+        self._due = max(self._due, loop.time() + faults.delay())
+        self._q.put_nowait((self._due, obj))
+
+    async def _run_pump(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                due, obj = await self._q.get()
+                wait = due - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self.ws.send(json.dumps(obj, ensure_ascii=False))
+                self.server.capture.write("out", self.dev, obj)
+                if self._q.empty():
+                    await self.ws.drain()
+        except (aiows.ConnectionClosed, asyncio.CancelledError):
+            pass
+
+    def close(self):
+        self._pump.cancel()
+
+# ====== MQTT 경유 단말 ======
+class _MqttConn:
+    """Peer 가 쓰는 ws 자리: 보내기 = 장치 down 주제로 publish"""
+    remote = None
+    close_code = None
+
+    def __init__(self, bridge, dev):
+        self.bridge, self.dev = bridge, dev
+        self.closed = False
+
+    def send(self, text):
+        from mqttlink import down_topic, message_type, qos_for
+        kind = message_type(text)
+        self.bridge.client.publish(down_topic(self.dev, kind), text, qos=qos_for(kind))
+
+    async def drain(self):
+        pass
+
+    def abort(self):
+        log.info("장애 주입: %s 는 MQTT 경유라 서버에서 끊을 수 없음 (무시)", self.dev)
+
+    async def close(self, code=1000, reason=""):
+        self.closed = True
+
+class MqttBridge:
+    """브로커의 단말 주제를 구독해서 StandInServer.on_message 로 — 장치마다 Peer 하나 (status 로 접속 여부 기록)"""
+    def __init__(self, server, host, port=None, v5=False, password=None):
+        self.server, self.host, self.port, self.v5 = server, host, port, v5
+        self.password = password
+        self.peers = {}
+        self.client = None
+
+    async def start(self):
+        from mqttlink import make_client, TOPIC_ROOT, MQTT_PORT, KEEPALIVE_S
+        self.loop = asyncio.get_running_loop()
+        mqtt, self.client = make_client(f"buson-standin-{os.getpid()}", v5=self.v5, clean=True)
+        self.client.username_pw_set("standin", self.password)
+        up = asyncio.Event()
+
+        def on_connect(client, userdata, flags, rc, *rest):
+            client.subscribe([(f"{TOPIC_ROOT}/vehicle/+/telemetry", 0), (f"{TOPIC_ROOT}/device/+/up/#", 1),
+                              (f"{TOPIC_ROOT}/device/+/status", 1)])
+            self.loop.call_soon_threadsafe(up.set)
+
+        self.client.on_connect = on_connect
+        self.client.on_message = lambda c, u, msg: self.loop.call_soon_threadsafe(self._on_message, msg.topic, msg.payload)
+        self.client.connect(self.host, self.port or MQTT_PORT, KEEPALIVE_S)
+        self.client.loop_start()
+        await asyncio.wait_for(up.wait(), 5.0)
+        log.info("MQTT 브리지: %s:%d", self.host, self.port or MQTT_PORT)
+
+    def _on_message(self, topic, payload):
+        parts = topic.split("/")
+        if parts[-1] == "status":
+            # 영속 세션이라 끊겨도 장치는 그대로 두고 (보낸 요청은 브로커가 보관 → 재연결 때 전달) 기록만
+            peer = self.peers.get(parts[-2])
+            online = payload == b"online"
+            if peer is not None and peer.meta.get("online", True) != online:
+                peer.meta["online"] = online
+                self.server.capture.write("connect" if online else "close", peer.dev, transport="mqtt")
+            return
+        try:
+            obj = json.loads(payload)
+        except ValueError:
+            self.server.capture.write("reject", None, None, why="json", topic=topic)
+            return
+        dev = parts[-3] if parts[-2] == "up" else ((obj.get("device") or {}).get("id") if isinstance(obj, dict) else None)
+        if not dev:
+            self.server.capture.write("reject", None, obj, why="no device", topic=topic)
+            return
+        peer = self.peers.get(dev)
+        if peer is None:
+            peer = self.peers[dev] = Peer(self.server, _MqttConn(self, dev))
+            self.server.peers.add(peer)
+            self.server.capture.write("connect", dev, transport="mqtt")
+        self.server.on_message(peer, obj)
+
+    async def stop(self):
+        for peer in list(self.peers.values()):
+            self.server._drop(peer)
+        self.peers.clear()
+        if self.client:
+            self.client.disconnect()
+            self.client.loop_stop()
+
+# ====== 서버 ======
+class StandInServer:
+    def __init__(self, host="0.0.0.0", port=3000, faults=None, record=None, mqtt=None):
+        """mqtt: (브로커 host, port) — 주면 WS 와 함께 MQTT 경유 단말도 받음"""
+        self.host, self.port = host, port
+        self.mqtt = MqttBridge(self, *mqtt) if mqtt else None
+        self.faults = faults or Faults()
+        self.capture = Capture(record)
+        self.devices = {}                # 장치 id → Peer (최근 연결)
+        self.peers = set()
+        self.rx = Counter()
+        self.tx = Counter()
+        self.trips = {}                  # (장치 id, trip_id) → 받은 .trp 바이트
+        self._server = None
+        self._chaos = None
+
+    async def start(self):
+        self._server = await aiows.serve(self._handle, self.host, self.port, path=PATH)
+        self._chaos = asyncio.get_running_loop().create_task(self._run_chaos())
+        if self.mqtt:
+            await self.mqtt.start()
+        log.info("device-ws 대역 서버: ws://%s:%d%s", self.host, self.port, PATH)
+        return self
+
+    async def stop(self):
+        if self._chaos:
+            self._chaos.cancel()
+        if self.mqtt:
+            await self.mqtt.stop()
+        if self._server:
+            self._server.close()
+        for p in list(self.peers):
+            await p.ws.close(1001)
+        # 연결 처리 작업이 close 를 기록하고 끝날 때까지 (안 끝나면 끊고 한 번 더)
+        for _ in range(2):
+            t_end = time.monotonic() + 1.0
+            while self.peers and time.monotonic() < t_end:
+                await asyncio.sleep(0.01)
+            for p in list(self.peers):
+                p.ws.abort()
+        if self._server:
+            await self._server.wait_closed()
+        self.capture.close()
+
+    async def _handle(self, ws):
+        peer = Peer(self, ws)
+        self.peers.add(peer)
+        self.capture.write("connect", remote=ws.remote)
+        try:
+            async for raw in ws:
+                try:
+                    obj = json.loads(raw)
+                except ValueError:
+                    self.capture.write("reject", peer.dev, raw if isinstance(raw, str) else None, why="json")
+                    continue
+                self.on_message(peer, obj)
+        finally:
+            self._drop(peer)
+
+    def _drop(self, peer):
+        peer.close()
+        self.peers.discard(peer)
+        if peer.dev and self.devices.get(peer.dev) is peer:
+            del self.devices[peer.dev]
+        self.capture.write("close", peer.dev, code=peer.ws.close_code)
+
+    def on_message(self, peer, obj):
+        """deviceWS.cjs 와 같은 규칙: type/device 필수, 첫 id 로 장치 등록, msg_id 면 ack"""
+        now = _now_ms()
+        dev = obj.get("device") if isinstance(obj, dict) else None
+        if not isinstance(dev, dict) or not obj.get("type"):
+            self.capture.write("reject", peer.dev, obj, why="no type/device")
+            return
+        if peer.dev is None and dev.get("id"):
+            peer.dev = str(dev["id"])
+            self.devices[peer.dev] = peer
+        if peer.dev is None:
+            return
+        t = obj["type"]
+        self.rx[t] += 1
+        self.capture.write("in", peer.dev, obj)
+        peer.last_seen = now
+        p = obj.get("payload") or {}
+        peer.meta.update({
+            "device_type": dev.get("device_type", peer.meta.get("device_type")),
+            "bus_number": p.get("bus_number", peer.meta.get("bus_number")),
+            "vehicle_number": p.get("vehicle_number", peer.meta.get("vehicle_number")),
+        })
+        if t == "telemetry" and isinstance(p.get("gps"), dict):
+            peer.meta["lat"] = p["gps"].get("lat", peer.meta.get("lat"))
+            peer.meta["lon"] = p["gps"].get("lon", peer.meta.get("lon"))
+            peer.meta["status"] = p.get("status")
+        if obj.get("msg_id"):
+            self._send(peer, {"type": "ack", "ack_id": obj["msg_id"], "ts": now})
+        if t == "trip_upload":
+            self.store_trips(peer, obj)
+
+    def store_trips(self, peer, obj):
+        """저장한 trip_id 만 trip_upload_ack 로 확인 (단말은 확인받은 파일만 지움)"""
+        stored = []
+        for trip in (obj.get("payload") or {}).get("trips") or ():
+            tid = str(trip.get("trip_id") or "")
+            if not TRIP_ID_RE.match(tid):
+                continue
+            try:
+                self.trips[(peer.dev, tid)] = base64.b64decode(trip.get("data") or "", validate=True)
+            except ValueError:
+                continue
+            stored.append(tid)
+        if obj.get("msg_id"):
+            self._send(peer, {"type": "trip_upload_ack", "ack_id": obj["msg_id"], "ts": _now_ms(),
+                              "payload": {"trip_ids": stored}})
+
+    def _send(self, peer, obj):
+        self.tx[obj.get("type")] += 1
+        peer.send(obj)
+
+    async def _run_chaos(self):
+        while True:
+            await asyncio.sleep(CHAOS_TICK_S)
+            every = self.faults.disconnect_every
+            if every <= 0:
+                continue
+            for p in list(self.peers):
+                if self.faults.rng.random() < CHAOS_TICK_S / every:
+                    log.info("장애 주입: %s 연결 끊음", p.dev)
+                    p.ws.abort()
+
+    # -------------------- 서버 → 단말 --------------------
+    def targets(self, device="*"):
+        """"*" = 연결된 장치 전부, 문자열 = 장치 id, 목록 = 여러 장치"""
+        if device in (None, "*"):
+            return list(self.devices.values())
+        ids = [device] if isinstance(device, str) else device
+        return [self.devices[d] for d in ids if d in self.devices]
+
+    def ride_request(self, device="*", **payload):
+        """appApi.cjs /ride/request 와 같은 모양 (지연 측정을 위해 ts 포함)"""
+        n = 0
+        for peer in self.targets(device):
+            rid = payload.get("requestId") or str(uuid.uuid4())
+            body = {"requestId": rid, "fromDeviceId": "standin", "lineName": peer.meta.get("bus_number"),
+                    "plateNumber": peer.meta.get("vehicle_number"), "stopNo": "1", "stopName": "대역 정류장",
+                    "direction": None, "userLocation": None}
+            body.update(payload)
+            self._send(peer, {"type": "ride_request", "msg_id": rid, "ts": _now_ms(), "payload": body})
+            n += 1
+        return n
+
+    def alight_request(self, device="*", **payload):
+        n = 0
+        for peer in self.targets(device):
+            body = {"deviceId": "standin", "lineName": peer.meta.get("bus_number"),
+                    "plateNumber": peer.meta.get("vehicle_number"), "stopNo": "대역 정류장",
+                    "stopName": "대역 정류장", "position": None}
+            body.update(payload)
+            self._send(peer, {"type": "alight_request", "msg_id": str(uuid.uuid4()), "ts": _now_ms(), "payload": body})
+            n += 1
+        return n
+
+    def command(self, cmd, device="*", type="command", **payload):
+        """cancel_request / reset / 임의 명령 (type 은 command / event / info)"""
+        n = 0
+        for peer in self.targets(device):
+            self._send(peer, {"type": type, "cmd": cmd, "ts": _now_ms(), "payload": payload})
+            n += 1
+        return n
+
+    def cancel_request(self, device="*", **payload):
+        return self.command("cancel_request", device, **{"reason": "user_cancel", **payload})
+
+    def reset(self, device="*"):
+        return self.command("reset", device)
+
+    def disconnect(self, device="*", abort=True):
+        """abort=True 면 close 프레임 없이 TCP 만 끊음"""
+        peers = self.targets(device)
+        for peer in peers:
+            if abort:
+                peer.ws.abort()
+            else:
+                asyncio.get_running_loop().create_task(peer.ws.close(1001, "standin"))
+        return len(peers)
+
+    async def storm(self, type="info", rate=100.0, seconds=1.0, device="*", cmd="storm"):
+        """초당 rate 개 (장치마다) 를 seconds 동안 — ride_request 면 실제 요청 폭주"""
+        gap = 1.0 / rate
+        t_end = time.monotonic() + seconds
+        k = 0
+        while time.monotonic() < t_end:
+            if type == "ride_request":
+                self.ride_request(device)
+            elif type == "alight_request":
+                self.alight_request(device)
+            else:
+                self.command(cmd, device, type=type, seq=k)
+            k += 1
+            await asyncio.sleep(gap)
+        return k
+
+    # -------------------- 시나리오 --------------------
+    async def run_script(self, steps):
+        """[{"at": 초, <동작>: 인자}, ...] — 동작: ride_request / alight_request / cancel_request / reset /
+        command / disconnect / storm / faults / wait_devices / stop"""
+        t0 = time.monotonic()
+        for step in sorted(steps, key=lambda s: s.get("at", 0)):
+            await asyncio.sleep(max(0.0, t0 + step.get("at", 0) - time.monotonic()))
+            for action, arg in step.items():
+                if action == "at":
+                    continue
+                arg = dict(arg) if isinstance(arg, dict) else ({"device": arg} if arg is not True else {})
+                log.info("시나리오 %.1fs: %s %s", time.monotonic() - t0, action, arg)
+                if action == "faults":
+                    self.faults.update(**arg)
+                elif action == "stop":
+                    return
+                elif action == "wait_devices":
+                    n = int(arg.get("device", arg.get("n", 1)))
+                    while len(self.devices) < n:
+                        await asyncio.sleep(0.05)
+                elif action == "storm":
+                    asyncio.get_running_loop().create_task(self.storm(**arg))
+                elif action == "command":
+                    self.command(arg.pop("cmd"), **arg)
+                elif action in ("ride_request", "alight_request", "cancel_request", "reset", "disconnect"):
+                    getattr(self, action)(**arg)
+                else:
+                    raise ValueError(f"알 수 없는 시나리오 동작: {action}")
+
+    def stats(self):
+        return {"devices": len(self.devices), "connections": len(self.peers),
+                "rx": dict(self.rx), "tx": dict(self.tx), "capture": dict(self.capture.counts),
+                "faults": self.faults.snapshot()}
+
+# ====== 기록 분석 ======
+def summary(path):
+    """Capture JSONL → 처리량, 장치별 재연결 횟수, telemetry 간격 분포, 상향 지연 (단말 ts → 서버 수신)"""
+    recs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                recs.append(json.loads(line))
+    if not recs:
+        return {"records": 0}
+    span = max(1e-3, (recs[-1]["ts"] - recs[0]["ts"]) / 1000.0)
+    kinds = Counter(r["ev"] for r in recs)
+    rx_types = Counter(r["msg"].get("type") for r in recs if r["ev"] == "in")
+    tx_types = Counter(r["msg"].get("type") for r in recs if r["ev"] == "out")
+    hellos = Counter(r["dev"] for r in recs if r["ev"] == "in" and r["msg"].get("type") == "hello")
+    last_telem, gaps, uplink = {}, [], []
+    for r in recs:
+        if r["ev"] != "in" or r["msg"].get("type") != "telemetry":
+            continue
+        dev, ts = r["dev"], r["ts"]
+        if dev in last_telem:
+            gaps.append(ts - last_telem[dev])
+        last_telem[dev] = ts
+        if isinstance(r["msg"].get("ts"), (int, float)):
+            uplink.append(ts - r["msg"]["ts"])      # 단말 ts → 서버 수신 (단말 시계가 맞을 때만 의미)
+    dist = lambda xs: {"n": len(xs), "p50": percentile(xs, 0.5), "p95": percentile(xs, 0.95), "p99": percentile(xs, 0.99),
+                       "max": max(xs) if xs else 0}
+    return {
+        "records": len(recs), "seconds": round(span, 1), "events": dict(kinds),
+        "rx_per_s": round(kinds["in"] / span, 1), "tx_per_s": round(kinds["out"] / span, 1),
+        "rx": dict(rx_types), "tx": dict(tx_types),
+        "devices": len(hellos),
+        "reconnects": sum(n - 1 for n in hellos.values()),
+        "telemetry_gap_ms": dist(gaps),
+        "uplink_ms": dist(uplink),
+    }
+
+# ====== 실행 ======
+async def serve(args):
+    faults = Faults(args.latency, args.jitter, args.drop, args.disconnect_every, args.seed)
+    mqtt = None
+    if args.mqtt:
+        host, _, port = args.mqtt.partition(":")
+        mqtt = (host, int(port) if port else None)
+    srv = await StandInServer(args.host, args.port, faults, args.record, mqtt).start()
+    try:
+        if args.script:
+            with open(args.script, encoding="utf-8") as f:
+                await srv.run_script(json.load(f))
+        elif args.duration:
+            await asyncio.sleep(args.duration)
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await srv.stop()
+    return srv.stats()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="device-ws 대역 서버")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve", help="대역 서버 실행")
+    s.add_argument("--host", default="0.0.0.0"); s.add_argument("--port", type=int, default=3000)
+    s.add_argument("--record", help="받은/보낸 메시지 JSONL")
+    s.add_argument("--script", help="시나리오 JSON (끝나면 종료)")
+    s.add_argument("--duration", type=float, help="이 시간 뒤 종료 (없으면 Ctrl+C 까지)")
+    s.add_argument("--latency", type=float, default=0.0, help="서버→단말 지연 ms")
+    s.add_argument("--jitter", type=float, default=0.0, help="지연 ± ms")
+    s.add_argument("--drop", type=float, default=0.0, help="서버→단말 유실 확률")
+    s.add_argument("--disconnect-every", type=float, default=0.0, help="연결마다 평균 이 초마다 끊기")
+    s.add_argument("--seed", type=int, default=1)
+    s.add_argument("--mqtt", help="브로커 host[:port] — MQTT 경유 단말도 받기")
+    m = sub.add_parser("summary", help="기록 JSONL 분석")
+    m.add_argument("record")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "summary":
+        print(json.dumps(summary(args.record), ensure_ascii=False, indent=2))
+        return 0
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    try:
+        stats = asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        return 0
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+# eventstore.py — 운행 이벤트 로컬 DB (SQLite WAL) + 조회 CLI
+#
+# 기록: 승하차 요청/취소/리셋, 상태 전환(idle → ride_pending …), 문 열림/닫힘, 서버 연결 상태,
+#       GPS 정류장 도착/출발. 운행 기록(.trp, 업로드용)과 달리 단말에 남겨 두고 현장에서 바로 조회하는 용도.
+# 쓰기: EVENTS.record() 는 큐에 넣기만 한다 (가득 차면 버리고 셈 — UI/WS/GPIO 스레드는 절대 대기하지 않음).
+#       writer 스레드 하나가 첫 건을 받은 뒤 FLUSH_S 동안(최대 BATCH 건) 모아서 한 트랜잭션으로 executemany.
+# 저장: events.db — WAL + synchronous=NORMAL (커밋마다 fsync 안 함, CLI 가 읽는 중에도 쓰기 안 막힘)
+#       인덱스: 시각 / (종류, 시각) / (정류장, 시각). RETAIN_DAYS 일 지난 행은 열 때와 PRUNE_S 마다 삭제.
+#
+#   EVENTS.open()                      # bussys.main() — 열지 않으면 record() 는 아무것도 안 함 (리플레이 등)
+#   EVENTS.record("door", t_ms=t_ms, stop="시청", state="open", status="ride_pending")
+#   EVENTS.record("conn", state="ERROR", err="timed out")      # stop/state/status 외 인자는 data(JSON) 열로
+#
+#   python3 eventstore.py tail -n 30 --kind door
+#   python3 eventstore.py counts --since 24h
+#   python3 eventstore.py ride-door --since 7d      # 승차 요청 → 문 열림 지연 (정류장별 p50/p90)
+#   python3 eventstore.py sql "SELECT state, COUNT(*) FROM events WHERE kind='conn' GROUP BY state"
+import os, sys, json, time, queue, sqlite3, threading, argparse
+from datetime import datetime
+import timesvc
+from metrics import percentile
+import logging
+
+log = logging.getLogger("eventstore")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH  = os.path.join(BASE_DIR, "events.db")
+
+QUEUE_SIZE  = 5000          # 가득 차면 버림 (디스크가 멈춰도 호출 스레드는 그대로)
+FLUSH_S     = 1.0           # 첫 건을 받은 뒤 이만큼 모아서 한 번에 커밋
+BATCH       = 500           # 한 트랜잭션 최대 행 수
+RETAIN_DAYS = 90
+PRUNE_S     = 6 * 3600
+MATCH_S     = 30 * 60       # ride-door: 요청 뒤 이 안에 문이 안 열리면 미처리로
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id     INTEGER PRIMARY KEY,
+    t_ms   INTEGER NOT NULL,        -- timesvc 기준 epoch ms
+    kind   TEXT    NOT NULL,        -- ride_request / drop_request / cancel_request / reset / request_cleared
+                                    -- status / door / conn / arrival / departure
+    stop   TEXT,                    -- 정류장 이름 (요청 정류장 또는 도착/정차 중 정류장)
+    state  TEXT,                    -- 바뀐 뒤 값: 문 open/close, 연결 CONNECTED/ERROR …, 상태 전환의 새 상태
+    status TEXT,                    -- 그때의 단말 상태 (idle / ride_pending / drop_pending / resetting)
+    data   TEXT                     -- 나머지 필드 JSON (없으면 NULL)
+);
+CREATE INDEX IF NOT EXISTS events_t    ON events(t_ms);
+CREATE INDEX IF NOT EXISTS events_kind ON events(kind, t_ms);
+CREATE INDEX IF NOT EXISTS events_stop ON events(stop, t_ms);
+"""
+
+def connect(path=DB_PATH, readonly=False):
+    if readonly:
+        db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    else:
+        db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+    db.execute("PRAGMA busy_timeout=2000")
+    return db
+
+# ====== 기록 ======
+class EventStore:
+    def __init__(self, path=DB_PATH, flush_s=FLUSH_S, batch=BATCH, queue_size=QUEUE_SIZE):
+        self.path = path
+        self.flush_s, self.batch, self.queue_size = flush_s, batch, queue_size
+        self._q = None
+        self._th = None
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def active(self):
+        return self._q is not None
+
+    def open(self, path=None):
+        """DB 열고 writer 스레드 시작 (열기 실패는 경고만 — 단말 동작에는 영향 없음)"""
+        if self._q is not None:
+            return True
+        self.path = path or self.path
+        try:
+            db = connect(self.path)
+        except sqlite3.Error as e:
+            log.warning("이벤트 DB 열기 실패: %s", e)
+            return False
+        self._q = queue.Queue(self.queue_size)
+        self._th = threading.Thread(target=self._run, args=(db, self._q), name="eventstore", daemon=True)
+        self._th.start()
+        return True
+
+    def record(self, kind, t_ms=None, stop=None, state=None, status=None, **data):
+        """이벤트 1건 — 큐에만 넣음 (JSON 직렬화/디스크는 writer 스레드)"""
+        q = self._q
+        if q is None:
+            return
+        t_ms = timesvc.now_ms() if t_ms is None else int(t_ms)
+        try:
+            q.put_nowait((t_ms, kind, stop, state, status, data or None))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=3.0):
+        """남은 큐를 다 쓰고 종료"""
+        q, th = self._q, self._th
+        if q is None:
+            return
+        self._q = None
+        try:
+            q.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        th.join(timeout)
+
+    def stats(self):
+        return {"written": self.written, "dropped": self.dropped, "batches": self.batches,
+                "errors": self.errors, "last_flush_ms": round(self.last_flush_ms, 2)}
+
+    # -------------------- writer 스레드 --------------------
+    def _run(self, db, q):
+        self._prune(db)
+        next_prune = time.monotonic() + PRUNE_S
+        done = False
+        while not done:
+            item = q.get()
+            if item is None:
+                break
+            rows = [item]
+            deadline = time.monotonic() + self.flush_s
+            while len(rows) < self.batch:
+                try:
+                    item = q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    done = True
+                    break
+                rows.append(item)
+            self._write(db, rows)
+            if time.monotonic() >= next_prune:
+                self._prune(db)
+                next_prune = time.monotonic() + PRUNE_S
+        db.close()
+
+    def _write(self, db, rows):
+        t0 = time.perf_counter()
+        try:
+            db.execute("BEGIN")
+            db.executemany(
+                "INSERT INTO events (t_ms, kind, stop, state, status, data) VALUES (?, ?, ?, ?, ?, ?)",
+                [(t, k, s, st, su, None if d is None else json.dumps(d, ensure_ascii=False, default=str))
+                 for t, k, s, st, su, d in rows])
+            db.execute("COMMIT")
+        except sqlite3.Error as e:
+            self.errors += 1
+            log.warning("이벤트 DB 쓰기 실패 (%d건 버림): %s", len(rows), e)
+            try:
+                db.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            return
+        self.written += len(rows)
+        self.batches += 1
+        self.last_flush_ms = (time.perf_counter() - t0) * 1000
+
+    def _prune(self, db):
+        cutoff = timesvc.now_ms() - RETAIN_DAYS * 86400 * 1000
+        try:
+            n = db.execute("DELETE FROM events WHERE t_ms < ?", (cutoff,)).rowcount
+        except sqlite3.Error as e:
+            log.warning("이벤트 DB 정리 실패: %s", e)
+            return
+        if n:
+            log.info("이벤트 DB: %s일 지난 %d건 삭제", RETAIN_DAYS, n)
+
+EVENTS = EventStore()
+
+# ====== 조회 ======
+def parse_since(s):
+    """'90m' / '24h' / '7d' → 그 이전 시각 epoch ms (None 이면 0)"""
+    if not s:
+        return 0
+    unit = {"s": 1, "m": 60, "h": 3600, "d": 86400}.get(s[-1])
+    sec = float(s[:-1]) * unit if unit else float(s)
+    return int((time.time() - sec) * 1000)
+
+def _fmt_t(t_ms):
+    return datetime.fromtimestamp(t_ms / 1000).strftime("%m-%d %H:%M:%S.%f")[:-3]
+
+def tail(db, n=30, kind=None, stop=None, since_ms=0):
+    sql = "SELECT t_ms, kind, stop, state, status, data FROM events WHERE t_ms >= ?"
+    args = [since_ms]
+    if kind:
+        sql += " AND kind = ?"; args.append(kind)
+    if stop:
+        sql += " AND stop = ?"; args.append(stop)
+    sql += " ORDER BY t_ms DESC, id DESC LIMIT ?"
+    args.append(n)
+    return list(reversed(db.execute(sql, args).fetchall()))
+
+def counts(db, since_ms=0):
+    rows = db.execute("SELECT kind, COUNT(*) FROM events WHERE t_ms >= ? GROUP BY kind ORDER BY 2 DESC",
+                      (since_ms,)).fetchall()
+    return dict(rows)
+
+def ride_door(db, since_ms=0, match_s=MATCH_S):
+    """
+    승차 요청 → 그 정류장에서 문이 열릴 때까지 (초), 요청 정류장별 집계
+    요청이 취소/리셋/버튼 초기화되거나 match_s 안에 문이 안 열리면 미처리(unserved)로 센다
+    """
+    rows = db.execute(
+        "SELECT t_ms, kind, stop, state FROM events WHERE t_ms >= ? AND kind IN "
+        "('ride_request', 'door', 'cancel_request', 'reset', 'request_cleared') ORDER BY t_ms, id",
+        (since_ms,)).fetchall()
+    per = {}
+    pending = None                      # (t_ms, stop) — 아직 문이 안 열린 요청
+    def close(served_ms):
+        t0, stop = pending
+        s = per.setdefault(stop or "?", {"requests": 0, "served": [], "unserved": 0})
+        s["requests"] += 1
+        if served_ms is None or served_ms - t0 > match_s * 1000:
+            s["unserved"] += 1
+        else:
+            s["served"].append((served_ms - t0) / 1000)
+    for t_ms, kind, stop, state in rows:
+        if kind == "ride_request":
+            if pending:
+                close(None)
+            pending = (t_ms, stop)
+        elif pending and kind == "door":
+            # 요청 정류장의 문 열림만 (앞 정류장에서 연 문은 이 요청과 무관) — 정류장을 모르는 행만 아무 곳이나
+            if state == "open" and (stop is None or pending[1] is None or stop == pending[1]):
+                close(t_ms)
+                pending = None
+        elif pending:
+            close(None)
+            pending = None
+    if pending:
+        close(None)
+    out = {}
+    for stop, s in sorted(per.items(), key=lambda kv: -kv[1]["requests"]):
+        xs = s["served"]
+        out[stop] = {"requests": s["requests"], "unserved": s["unserved"],
+                     "p50_s": round(percentile(xs, 0.5), 1), "p90_s": round(percentile(xs, 0.9), 1),
+                     "max_s": round(max(xs), 1) if xs else 0.0}
+    return out
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="운행 이벤트 DB 조회")
+    ap.add_argument("--db", default=DB_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    t = sub.add_parser("tail", help="최근 이벤트")
+    t.add_argument("-n", type=int, default=30); t.add_argument("--kind"); t.add_argument("--stop")
+    t.add_argument("--since")
+    c = sub.add_parser("counts", help="종류별 건수")
+    c.add_argument("--since")
+    r = sub.add_parser("ride-door", help="승차 요청 → 문 열림 지연 (정류장별)")
+    r.add_argument("--since"); r.add_argument("--match-s", type=float, default=MATCH_S)
+    q = sub.add_parser("sql", help="임의 SELECT (읽기 전용)")
+    q.add_argument("query")
+    args = ap.parse_args(argv)
+
+    db = connect(args.db, readonly=True)
+    if args.cmd == "tail":
+        for t_ms, kind, stop, state, status, data in tail(db, args.n, args.kind, args.stop, parse_since(args.since)):
+            print(_fmt_t(t_ms), f"{kind:<16}", stop or "-", state or "-", status or "-", data or "", sep="  ")
+    elif args.cmd == "counts":
+        print(json.dumps(counts(db, parse_since(args.since)), ensure_ascii=False, indent=2))
+    elif args.cmd == "ride-door":
+        print(json.dumps(ride_door(db, parse_since(args.since), args.match_s), ensure_ascii=False, indent=2))
+    else:
+        for row in db.execute(args.query):
+            print(*row, sep="\t")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# fb565.py — ILI9341 RGB565 프레임버퍼 (NumPy 변환 + 타일 단위 변경분만 전송)
+#
+# luma 의 device.display(img) 는 매 프레임 전체 화면을 RGB 3바이트/픽셀로 보낸다.
+# 여기서는 패널을 16비트(RGB565) 모드로 두고, 직전에 보낸 프레임과 타일(32x16) 단위로 비교해
+# 달라진 타일만 창(CASET/PASET) 을 잡아 보낸다. 누가 무엇을 그렸든 픽셀 비교라서 자동으로 잡힘.
+#
+#   fb = Framebuffer565(device)
+#   fb.flush(img)           # PIL RGB 이미지 (device.size)
+#   fb.invalidate()         # 다음 flush 는 전체 전송 (패널 리셋/백라이트 복귀 후 등)
+import time
+import numpy as np
+from metrics import METRICS
+
+TILE_W, TILE_H = 32, 16
+FULL_RATIO = 0.7          # 바뀐 타일 비율이 이보다 크면 창 여러 개 대신 전체 한 번에
+
+# ILI9341 명령
+CASET, PASET, RAMWR, COLMOD = 0x2A, 0x2B, 0x2C, 0x3A
+
+def to_rgb565(a):
+    """(h, w, 3) uint8 → 패널 순서(빅엔디언) RGB565 바이트"""
+    r = a[..., 0].astype(np.uint16)
+    g = a[..., 1].astype(np.uint16)
+    b = a[..., 2].astype(np.uint16)
+    px = ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
+    return px.astype(">u2").tobytes()
+
+class Framebuffer565:
+    def __init__(self, device):
+        self.device = device
+        self.w, self.h = device.size
+        if self.w % TILE_W or self.h % TILE_H:
+            raise ValueError(f"화면 크기 {device.size} 가 타일 {TILE_W}x{TILE_H} 로 나누어떨어지지 않음")
+        self.tx, self.ty = self.w // TILE_W, self.h // TILE_H
+        self.prev = None              # 마지막으로 보낸 프레임 (h, w, 3) uint8
+        # 통계
+        self.frames = 0
+        self.skipped = 0              # 바뀐 타일이 하나도 없어 전송 생략
+        self.last_bytes = 0
+        self.last_tiles = 0
+        self.last_convert_ms = 0.0
+        # 패널 픽셀 형식을 16비트로 (luma ili9341 초기화는 18비트 RGB666)
+        self._cmd(COLMOD, 0x55)
+
+    def invalidate(self):
+        self.prev = None
+
+    def push_raw(self, payload):
+        """이미 RGB565 로 된 전체 화면을 그대로 (부팅 화면 복원) — 다음 flush 는 전체 전송"""
+        self._window(0, 0, self.w, self.h, payload)
+        self.prev = None
+
+    def dirty_tiles(self, a):
+        """(ty, tx) bool — 직전 프레임과 다른 타일"""
+        if self.prev is None:
+            return np.ones((self.ty, self.tx), bool)
+        ne = (a != self.prev).reshape(self.ty, TILE_H, self.tx, TILE_W * 3)
+        return ne.any(axis=(1, 3))
+
+    @staticmethod
+    def rects(dirty):
+        """바뀐 타일 → 직사각형 창 목록 (타일 좌표 x0, y0, x1, y1; 끝은 미포함)
+        같은 행의 연속 타일은 가로로 묶고, 바로 윗행과 가로 범위가 같으면 세로로 늘림"""
+        out = []
+        open_rects = {}               # (x0, x1) -> out 인덱스 (윗행에서 이어지는 창)
+        for y, row in enumerate(dirty):
+            runs = []
+            x = 0
+            n = len(row)
+            while x < n:
+                if row[x]:
+                    x0 = x
+                    while x < n and row[x]:
+                        x += 1
+                    runs.append((x0, x))
+                else:
+                    x += 1
+            nxt = {}
+            for span in runs:
+                i = open_rects.get(span)
+                if i is not None:
+                    x0, y0, x1, _ = out[i]
+                    out[i] = (x0, y0, x1, y + 1)
+                else:
+                    i = len(out)
+                    out.append((span[0], y, span[1], y + 1))
+                nxt[span] = i
+            open_rects = nxt
+        return out
+
+    def _cmd(self, cmd, *params):
+        # 파라미터는 D/C=1 로 가야 하므로 명령 바이트와 나눠서 보냄
+        self.device.command(cmd)
+        if params:
+            self.device.data(list(params))
+
+    def _window(self, x0, y0, x1, y1, payload):
+        self._cmd(CASET, x0 >> 8, x0 & 0xFF, (x1 - 1) >> 8, (x1 - 1) & 0xFF)
+        self._cmd(PASET, y0 >> 8, y0 & 0xFF, (y1 - 1) >> 8, (y1 - 1) & 0xFF)
+        self._cmd(RAMWR)
+        self.device.data(payload)
+
+    def flush(self, img):
+        t0 = time.perf_counter()
+        a = np.asarray(img.convert("RGB") if img.mode != "RGB" else img)
+        dirty = self.dirty_tiles(a)
+        ntiles = int(dirty.sum())
+        if ntiles == 0:
+            self.skipped += 1
+            self.last_bytes = self.last_tiles = 0
+            self.last_convert_ms = (time.perf_counter() - t0) * 1000.0
+            METRICS.lcd_convert_ms.observe(self.last_convert_ms)
+            METRICS.lcd_frame_bytes.set(0)
+            return 0
+
+        if ntiles > FULL_RATIO * dirty.size:
+            windows = [(0, 0, self.w, self.h)]
+        else:
+            windows = [(x0 * TILE_W, y0 * TILE_H, x1 * TILE_W, y1 * TILE_H)
+                       for x0, y0, x1, y1 in self.rects(dirty)]
+        payloads = [to_rgb565(a[y0:y1, x0:x1]) for x0, y0, x1, y1 in windows]
+        self.last_convert_ms = (time.perf_counter() - t0) * 1000.0
+
+        sent = 0
+        for (x0, y0, x1, y1), p in zip(windows, payloads):
+            self._window(x0, y0, x1, y1, p)
+            sent += len(p)
+        # np.asarray(PIL) 는 사본이므로 그대로 보관해도 다음 합성에 영향 없음
+        self.prev = a
+        self.frames += 1
+        self.last_bytes, self.last_tiles = sent, ntiles
+        METRICS.lcd_convert_ms.observe(self.last_convert_ms)
+        METRICS.lcd_frame_bytes.set(sent)
+        METRICS.lcd_bytes.inc(sent)
+        return sent
+
+    def stats(self):
+        return {"frames": self.frames, "skipped": self.skipped, "last_bytes": self.last_bytes,
+                "last_tiles": self.last_tiles, "tiles": self.tx * self.ty,
+                "convert_ms": round(self.last_convert_ms, 3)}
@@ -0,0 +1,297 @@
+# fleetsim.py — 가상 버스 단말 N대 부하 시뮬레이터 (asyncio, BusAPI 프로토콜 그대로)
+#
+# 백엔드/네트워크가 버스 수백 대를 받을 때를 보려고 한 프로세스 안에서 단말 N대를 돌린다.
+# 각 가상 단말은 BusAPI 를 상속해서 hello / telemetry / ping / handle_message 를 그대로 쓰고,
+# 스레드와 websocket-client 대신 asyncio 작업 2개(송신 tick + 수신)와 aiows 연결만 바꿔 끼운다.
+#   - GPS: NMEA 텍스트 / .brec 궤적을 버스마다 다른 위치에서 시작해 반복 재생 (없으면 합성 노선)
+#   - 문: 궤적에서 정차하면 문 열림 → 체류 → 닫힘 이벤트
+#   - 승하차 요청: 경보 시작까지 지연 기록 후, 잠시 뒤 승객 응답 (문 열림 → 탑승 → 닫힘 → idle)
+#   - 끊기면 다시 연결 (연결 실패/끊김 횟수 집계)
+# 결과: 송수신 메시지율, ack RTT 분포, 요청→경보 지연 분포 (서버 ts 기준, 시계 오프셋 보정)
+#
+#   python3 fleetsim.py -n 200 --duration 60                          # ws://127.0.0.1:3000/device-ws
+#   python3 fleetsim.py --url ws://10.0.0.5:3000/device-ws -n 500 --trace recordings/shift.brec
+import sys, json, math, time, random, bisect, asyncio, argparse, logging
+from collections import Counter
+import aiows
+import timesvc
+from busapi import BusAPI
+from metrics import percentile
+
+DEFAULT_URL = "ws://127.0.0.1:3000/device-ws"
+TICK_S      = 0.1              # 송신 tick (send_telem 이 telem_interval 로 알아서 거름)
+RECONNECT_S = 1.0
+STOP_KMH    = 1.0              # 이보다 느리면 정차 (문 열림 후보)
+DWELL_S     = (4.0, 12.0)      # 정차 중 문 열려 있는 시간
+RESPOND_S   = (2.0, 6.0)       # 요청 경보 → 승객 도착(문 열림) 까지
+BOARD_S     = 3.0              # 승하차에 걸리는 시간 (문 닫힘까지)
+
+log = logging.getLogger("fleetsim")
+
+# ====== GPS 궤적 ======
+def load_trace(path):
+    """NMEA 텍스트 / .brec → [(t_ms, fix)] (FIX 만, t_ms 는 0 부터)"""
+    import simhw
+    simhw.install()                     # gpsrx 가 pyserial 을 import 하므로 PC 에서도 돌도록
+    from gpsrx import parse_nmea
+    from triplog import _nmea_lines
+    out = []
+    for t_ms, line in _nmea_lines(path):
+        st, info = parse_nmea(line)
+        if st == "FIX" and info.get("lat") is not None:
+            out.append((t_ms, info))
+    if not out:
+        raise ValueError(f"GPS FIX 없음: {path}")
+    t0 = out[0][0]
+    return [(t - t0, fix) for t, fix in out]
+
+def synthetic_trace(lat0=37.5665, lon0=126.9780, side_m=600.0, kmh=30.0, stop_s=20.0):
+    """정사각형 노선 (꼭짓점마다 정류장에서 stop_s 정차), 1초 간격"""
+    ky = 1.0 / 111320.0
+    kx = ky / math.cos(math.radians(lat0))
+    corners = [(0, 0), (side_m, 0), (side_m, side_m), (0, side_m)]
+    v = kmh / 3.6
+    out, t = [], 0
+    for i, (x0, y0) in enumerate(corners):
+        x1, y1 = corners[(i + 1) % 4]
+        for _ in range(int(stop_s)):
+            out.append((t, {"lat": round(lat0 + y0 * ky, 6), "lon": round(lon0 + x0 * kx, 6), "speed": 0.0}))
+            t += 1000
+        steps = int(side_m / v)
+        for k in range(steps):
+            f = k / steps
+            out.append((t, {"lat": round(lat0 + (y0 + (y1 - y0) * f) * ky, 6),
+                            "lon": round(lon0 + (x0 + (x1 - x0) * f) * kx, 6), "speed": kmh}))
+            t += 1000
+    return out
+
+# ====== 집계 ======
+class FleetStats:
+    def __init__(self):
+        self.tx = Counter()              # 메시지 type → 개수
+        self.rx = Counter()
+        self.tx_bytes = self.rx_bytes = 0
+        self.rtt = []                    # ack RTT (ms)
+        self.alert = []                  # 요청 서버 ts → 단말 경보 시작 (ms)
+        self.connects = self.connect_fail = self.disconnects = 0
+        self.online = 0
+        self.doors = 0
+        self.responses = 0
+        self.t0 = time.monotonic()
+
+    def report(self):
+        wall = max(1e-9, time.monotonic() - self.t0)
+        dist = lambda xs: {"n": len(xs), "p50": round(percentile(xs, 0.50), 1), "p95": round(percentile(xs, 0.95), 1),
+                           "p99": round(percentile(xs, 0.99), 1), "max": round(max(xs), 1) if xs else 0.0}
+        return {
+            "seconds": round(wall, 1),
+            "online": self.online,
+            "connects": self.connects, "connect_fail": self.connect_fail, "disconnects": self.disconnects,
+            "tx_per_s": round(sum(self.tx.values()) / wall, 1),
+            "rx_per_s": round(sum(self.rx.values()) / wall, 1),
+            "tx_kbps": round(self.tx_bytes * 8 / 1000 / wall, 1),
+            "rx_kbps": round(self.rx_bytes * 8 / 1000 / wall, 1),
+            "tx": dict(self.tx), "rx": dict(self.rx),
+            "rtt_ms": dist(self.rtt),
+            "request_to_alert_ms": dist(self.alert),
+            "door_events": self.doors, "responses": self.responses,
+        }
+
+# ====== 가상 단말 ======
+class VirtualBus(BusAPI):
+    """BusAPI 프로토콜 로직 + asyncio 연결. Thread.start() 는 쓰지 않고 run_async() 를 돌린다"""
+    def __init__(self, idx, url, stats, trace, rng):
+        super().__init__(device_id=f"sim-{idx:04d}", bus_no=str(100 + idx % 50),
+                         vehicle_no=f"SIM{idx:04d}", direction="상행" if idx % 2 == 0 else "하행")
+        self.idx, self.url, self.stats, self.rng = idx, url, stats, rng
+        self.status = "idle"
+        self.gps_data = {}
+        self.line_name = None
+        self.trace = trace
+        self._ofs = rng.randrange(len(trace))             # 버스마다 노선 위 다른 위치에서 출발
+        self._span = trace[-1][0] + 1000
+        self._t_start = time.monotonic() - trace[self._ofs][0] / 1000.0
+        self._times = [t for t, _ in trace]
+        self._stopped = False
+        self._ip = f"10.{100 + idx // 65536}.{idx // 256 % 256}.{idx % 256}"
+        self._tasks = set()
+        self.stop_flag = asyncio.Event()
+
+        track = self.latency.on_ack
+        def on_ack(obj):
+            rtt = track(obj)
+            if rtt is not None:
+                stats.rtt.append(rtt)
+            return rtt
+        self.latency.on_ack = on_ack
+
+        self.on("ride_request", lambda d: self._alert("ride_pending", "ride_active"))
+        self.on("drop_request", lambda d: self._alert("drop_pending", "idle"))
+        self.on("cancel_request", lambda d: setattr(self, "status", "idle"))
+        self.on("reset", lambda d: setattr(self, "status", "idle"))
+
+    # -------------------- BusAPI 재정의 --------------------
+    def local_ip(self):
+        return self._ip                  # 실제 인터페이스 조회(UDP 소켓) 없이 고정
+
+    def save_line_name(self, line_name):
+        self.line_name = line_name       # config.json 대신 메모리에만
+
+    def send(self, obj):
+        if self.ws is None or self.ws.closed:
+            return
+        wire = json.dumps(obj)
+        self.ws.send(wire)
+        self.stats.tx[obj.get("type")] += 1
+        self.stats.tx_bytes += len(wire)
+
+    def _record_request_latency(self, kind, obj, rx_ms, t_h, timing):
+        # 경보 시작(emit 반환) 시각 - 서버 ts. 오프셋 추정 전이면 같은 호스트 시계로 간주
+        now_ms = timesvc.now() * 1000.0
+        ts = obj.get("ts")
+        if isinstance(ts, (int, float)):
+            ms = self.latency.one_way_ms(ts, now_ms)
+            self.stats.alert.append(now_ms - ts if ms is None else ms)
+
+    # -------------------- 시나리오 --------------------
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _alert(self, pending, after):
+        self.status = pending
+        self._spawn(self._respond(after))
+
+    async def _respond(self, after):
+        """승객 응답: 잠시 뒤 문 열림 → 승하차 → 문 닫힘 → after 상태"""
+        await asyncio.sleep(self.rng.uniform(*RESPOND_S))
+        self._door("open")
+        await asyncio.sleep(BOARD_S)
+        self.status = after
+        self._door("close")
+        self.stats.responses += 1
+        if after != "idle":
+            await asyncio.sleep(self.rng.uniform(*DWELL_S))
+            self.status = "idle"
+
+    def _door(self, state):
+        self.send_event("door", {"state": state})
+        self.stats.doors += 1
+
+    async def _dwell(self):
+        self._door("open")
+        await asyncio.sleep(self.rng.uniform(*DWELL_S))
+        self._door("close")
+
+    def _advance_gps(self):
+        """궤적 재생 위치 갱신, 정차 진입이면 문 열림/닫힘 예약"""
+        t_ms = ((time.monotonic() - self._t_start) * 1000.0) % self._span
+        i = max(0, bisect.bisect_right(self._times, t_ms) - 1)
+        fix = self.trace[i][1]
+        self.gps_data = fix
+        stopped = (fix.get("speed") or 0.0) < STOP_KMH
+        if stopped and not self._stopped and self.status == "idle":
+            self._spawn(self._dwell())
+        self._stopped = stopped
+
+    # -------------------- 연결 --------------------
+    async def _reader(self, ws):
+        async for raw in ws:
+            rx_ms = timesvc.now() * 1000.0
+            self.stats.rx_bytes += len(raw)
+            try:
+                obj = json.loads(raw)
+            except ValueError:
+                continue
+            self.stats.rx[obj.get("type")] += 1
+            self.handle_message(obj, rx_ms)
+
+    async def run_async(self, delay=0.0):
+        await asyncio.sleep(delay)
+        while not self.stop_flag.is_set():
+            try:
+                self.ws = await aiows.connect(self.url, headers=["User-Agent: buson-device"], timeout=3)
+            except (OSError, asyncio.TimeoutError, aiows.HandshakeError) as e:
+                self.stats.connect_fail += 1
+                log.debug("%s 연결 실패: %s", self.device_id, e)
+                await self._pause(RECONNECT_S)
+                continue
+            self.connected = True
+            self.stats.connects += 1
+            self.stats.online += 1
+            self.send_hello()
+            reader = asyncio.get_running_loop().create_task(self._reader(self.ws))
+            try:
+                while not self.stop_flag.is_set() and not reader.done():
+                    self._advance_gps()
+                    self.send_telem()
+                    self.send_probe()
+                    await self.ws.drain()
+                    await self._pause(TICK_S)
+            except aiows.ConnectionClosed:
+                pass
+            finally:
+                self.connected = False
+                self.stats.online -= 1
+                if not self.stop_flag.is_set():
+                    self.stats.disconnects += 1
+                await self.ws.close()
+                reader.cancel()
+            if not self.stop_flag.is_set():
+                await self._pause(RECONNECT_S)
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def _pause(self, s):
+        try:
+            await asyncio.wait_for(self.stop_flag.wait(), s)
+        except asyncio.TimeoutError:
+            pass
+
+    def stop(self):
+        self.stop_flag.set()
+
+# ====== 실행 ======
+async def run_fleet(url=DEFAULT_URL, n=100, duration=60.0, trace=None, ramp=5.0, seed=1, progress=None):
+    """단말 n 대를 ramp 초에 걸쳐 순차 연결, duration 초 뒤 집계 반환. progress(report) 는 5초마다"""
+    stats = FleetStats()
+    rng = random.Random(seed)
+    points = trace or synthetic_trace()
+    buses = [VirtualBus(i, url, stats, points, random.Random(rng.random())) for i in range(n)]
+    tasks = [asyncio.get_running_loop().create_task(b.run_async(ramp * i / max(1, n))) for i, b in enumerate(buses)]
+    t_end = time.monotonic() + duration
+    while time.monotonic() < t_end:
+        await asyncio.sleep(min(5.0, max(0.0, t_end - time.monotonic())))
+        if progress:
+            progress(stats.report())
+    for b in buses:
+        b.stop()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return stats.report()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="가상 버스 단말 부하 시뮬레이터")
+    ap.add_argument("--url", default=DEFAULT_URL)
+    ap.add_argument("-n", type=int, default=100, help="가상 단말 수")
+    ap.add_argument("--duration", type=float, default=60.0, help="실행 시간 (초)")
+    ap.add_argument("--ramp", type=float, default=5.0, help="전체 연결을 이 시간에 걸쳐 나눠서")
+    ap.add_argument("--trace", help="NMEA 텍스트 또는 .brec (없으면 합성 노선)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("-q", "--quiet", action="store_true", help="5초마다 진행 상황 출력 안 함")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("busapi").setLevel(logging.ERROR)     # 단말마다 명령/요청 INFO 로그는 끔
+    trace = load_trace(args.trace) if args.trace else None
+
+    def progress(r):
+        print(f"[{r['seconds']:6.1f}s] online {r['online']}/{args.n}  tx {r['tx_per_s']}/s  rx {r['rx_per_s']}/s"
+              f"  rtt p50 {r['rtt_ms']['p50']} p99 {r['rtt_ms']['p99']} ms", file=sys.stderr)
+
+    report = asyncio.run(run_fleet(args.url, args.n, args.duration, trace, args.ramp, args.seed,
+                                   None if args.quiet else progress))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# gpioevents.py — 문/버튼 GPIO 엣지 인터럽트 → 디바운스 → 이벤트 디스패치 (UI 루프와 분리)
+#
+# 기존에는 UI 루프(50ms + 화면 그리기)마다 GPIO.input 으로 샘플링해서, 느린 프레임이나
+# 음성 안내 중에는 짧은 눌림/문 바운스를 놓치거나 늦게 처리했다.
+#
+#   ev = GpioEvents(GPIO, on_event=handler)          # handler(GpioEvent) — 디스패치 스레드에서 호출
+#   ev.add("door", DOOR_PIN, debounce=0.05)
+#   ev.add("button", BUTTON_PIN, debounce=0.12)
+#   ev.start()
+#
+# 백엔드
+#   "rpi"  : RPi.GPIO add_event_detect(BOTH). 콜백은 엣지 시각(monotonic_ns)만 찍어 큐에 넣고
+#            디스패치 스레드가 디바운스 후 handler 호출.
+#   "gpiod": libgpiod v2 라인 이벤트. 커널이 찍은 엣지 타임스탬프 + 커널 디바운스 사용.
+# 디바운스: 첫 엣지에서 바로 레벨을 읽어 확정(지연 없음) → debounce 동안 잠금 →
+#           잠금이 풀릴 때 레벨을 다시 읽어 달라졌으면 그 변화도 확정 (놓침 없음).
+import time, queue, threading, logging
+from collections import namedtuple
+import timesvc
+from metrics import METRICS
+
+log = logging.getLogger("gpioevents")
+
+# level: 0/1 (풀업이라 0=눌림/문열림), t_mono: 엣지 monotonic 초, t_wall: timesvc 기준 epoch 초
+GpioEvent = namedtuple("GpioEvent", "name pin level t_mono t_wall")
+
+class _Pin:
+    __slots__ = ("name", "pin", "debounce_ns", "level", "lock_until", "last_edge", "edges", "bounces")
+    def __init__(self, name, pin, debounce, level):
+        self.name, self.pin = name, pin
+        self.debounce_ns = int(debounce * 1e9)
+        self.level = level
+        self.lock_until = 0        # 이 시각(ns)까지 추가 엣지는 바운스로 봄
+        self.last_edge = 0
+        self.edges = 0             # 들어온 원시 엣지 수
+        self.bounces = 0           # 디바운스로 버린 엣지 수
+
+class GpioEvents:
+    def __init__(self, gpio, on_event, backend="rpi", threaded=True):
+        """
+        threaded=False: 엣지 콜백 안에서 바로 디바운스/디스패치 (리플레이처럼 결정적 순서가 필요할 때)
+        """
+        self.gpio = gpio
+        self.on_event = on_event
+        self.backend = backend
+        self.threaded = threaded
+        self.pins = {}                          # pin -> _Pin
+        self._raw = queue.SimpleQueue()         # (pin, t_ns)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._req = None                        # gpiod 라인 요청
+
+    def add(self, name, pin, debounce=0.05):
+        self.pins[pin] = _Pin(name, pin, debounce, self.gpio.input(pin))
+
+    # -------------------- 시작/종료 --------------------
+    def start(self):
+        if self.backend == "gpiod":
+            try:
+                self._start_gpiod()
+                return self
+            except Exception as e:
+                log.warning("gpiod 사용 불가 (%s) → RPi.GPIO 엣지 감지로 대체", e)
+                self.backend = "rpi"
+        for pin in self.pins:
+            self.gpio.add_event_detect(pin, self.gpio.BOTH, callback=self._edge)
+        if self.threaded:
+            self._thread = threading.Thread(target=self._run, name="gpio-events", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._raw.put((None, 0))
+        if self.backend == "rpi":
+            for pin in self.pins:
+                try: self.gpio.remove_event_detect(pin)
+                except Exception: pass
+        if self._req is not None:
+            try: self._req.release()
+            except Exception: pass
+        if self._thread:
+            self._thread.join(timeout=1.0)
+
+    # -------------------- RPi.GPIO 경로 --------------------
+    def _edge(self, pin):
+        """RPi.GPIO 콜백 스레드: 시각만 찍고 바로 반환"""
+        t = time.monotonic_ns()
+        if self.threaded:
+            self._raw.put((pin, t))
+        else:
+            with self._lock:
+                self._process(pin, t)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # 잠금 중인 핀이 있으면 가장 먼저 풀리는 시각까지만 대기
+            now = time.monotonic_ns()
+            wake = [p.lock_until for p in self.pins.values() if p.lock_until]
+            timeout = max(0.0, (min(wake) - now) / 1e9) if wake else None
+            try:
+                pin, t = self._raw.get(timeout=timeout)
+            except queue.Empty:
+                pin = None
+            if pin is not None:
+                self._process(pin, t)
+            self._settle(time.monotonic_ns())
+
+    def _process(self, pin, t):
+        p = self.pins.get(pin)
+        if p is None:
+            return
+        p.edges += 1
+        p.last_edge = t
+        if t < p.lock_until:
+            p.bounces += 1
+            return
+        level = self.gpio.input(pin)
+        if level == p.level:
+            p.bounces += 1                      # 읽기 전에 되돌아간 짧은 글리치
+            return
+        p.level = level
+        p.lock_until = t + p.debounce_ns
+        self._emit(p, level, t)
+
+    def _settle(self, now):
+        """잠금이 끝난 핀 레벨을 다시 확인 — 잠금 중에 바뀐 최종 상태를 놓치지 않도록"""
+        for p in self.pins.values():
+            if p.lock_until and now >= p.lock_until:
+                p.lock_until = 0
+                level = self.gpio.input(p.pin)
+                if level != p.level:
+                    p.level = level
+                    p.lock_until = now + p.debounce_ns
+                    self._emit(p, level, p.last_edge or now)
+
+    # -------------------- gpiod 경로 --------------------
+    def _start_gpiod(self):
+        import gpiod
+        from datetime import timedelta
+        from gpiod.line import Bias, Edge, Value
+        config = {}
+        for pin, p in self.pins.items():
+            config[pin] = gpiod.LineSettings(edge_detection=Edge.BOTH, bias=Bias.PULL_UP,
+                                             debounce_period=timedelta(microseconds=p.debounce_ns // 1000))
+        self._req = gpiod.request_lines("/dev/gpiochip0", consumer="bus-onda", config=config)
+        for pin, p in self.pins.items():
+            p.level = 1 if self._req.get_value(pin) == Value.ACTIVE else 0
+        self._thread = threading.Thread(target=self._run_gpiod, name="gpio-events", daemon=True)
+        self._thread.start()
+        log.info("gpiod 라인 이벤트 사용: %s", sorted(self.pins))
+
+    def _run_gpiod(self):
+        from gpiod.edge_event import EdgeEvent
+        while not self._stop.is_set():
+            if not self._req.wait_edge_events(0.5):
+                continue
+            for e in self._req.read_edge_events():
+                p = self.pins.get(e.line_offset)
+                if p is None:
+                    continue
+                p.edges += 1
+                level = 1 if e.event_type == EdgeEvent.Type.RISING_EDGE else 0
+                if level == p.level:
+                    p.bounces += 1
+                    continue
+                p.level = level
+                # 커널 타임스탬프는 CLOCK_MONOTONIC (time.monotonic_ns 와 같은 기준)
+                self._emit(p, level, e.timestamp_ns)
+
+    # -------------------- 공통 --------------------
+    def _emit(self, p, level, t_ns):
+        t_mono = t_ns / 1e9
+        t_wall = timesvc.now() - (time.monotonic() - t_mono)
+        ev = GpioEvent(p.name, p.pin, level, t_mono, t_wall)
+        try:
+            self.on_event(ev)
+        except Exception:
+            log.exception("GPIO 이벤트 처리 오류 (%s)", p.name)
+        METRICS.gpio_event_ms.observe((time.monotonic() - t_mono) * 1000.0)
+
+    def stats(self):
+        return {p.name: {"level": p.level, "edges": p.edges, "bounces": p.bounces} for p in self.pins.values()}
@@ -1,18 +1,89 @@
 import serial
+import time
+import logging
 from datetime import datetime, timezone, timedelta
+from replay import RECORDER
+from timesvc import CLOCK
+
+log = logging.getLogger("gpsrx")
+_port_failed = False
+_last_date = None   # 마지막 RMC 날짜 (GGA 에는 날짜가 없어서 이어받음)
 
 def read_gps():
+    global _port_failed
     try:
         ser = serial.Serial("/dev/serial0", baudrate=9600, timeout=1)
     except Exception as e:
-        print("GPS 포트 열기 실패:", e)
+        if not _port_failed:  # 1초마다 재시도하므로 처음 한 번만 기록
+            log.warning("GPS 포트 열기 실패: %s", e)
+        _port_failed = True
         return ("NO_MODULE", None)
+    _port_failed = False
+
+    try:
+        raw = ser.readline()
+        t_rx = time.monotonic()     # 줄 끝 수신 시각 (시계 보정용)
+    finally:
+        ser.close()
+    if RECORDER.active:
+        RECORDER.nmea(raw)
+    st, info = parse_nmea(raw.decode("ascii", errors="ignore").strip())
+    if st == "FIX" and info.get("utc") is not None:
+        CLOCK.on_gps(info["utc"], t_rx)
+    return st, info
+
+# 위도/경도 변환 (ddmm.mmmm / dddmm.mmmm to dd.ddddd)
+def convert(coord, direction):
+    if coord == "" or direction == "":
+        return None
+    # 분(mm.mmmm)은 항상 소수점 앞 2자리 → 경도(3자리 도)도 올바르게 처리
+    dot = coord.find(".")
+    split = (dot if dot >= 0 else len(coord)) - 2
+    degrees = float(coord[:split])
+    minutes = float(coord[split:])
+    result = degrees + (minutes / 60)
+    if direction in ["S", "W"]:
+        result = -result
+    return round(result, 4)
+
+# RMC 날짜 ddmmyy → date (형식 오류면 None)
+def rmc_date(ddmmyy):
+    try:
+        return datetime(2000 + int(ddmmyy[4:6]), int(ddmmyy[2:4]), int(ddmmyy[0:2])).date()
+    except (ValueError, IndexError):
+        return None
+
+# UTC to KST 변환 (날짜: RMC 날짜 → 직전 RMC 날짜 → 단말 시계 UTC 날짜 순)
+def kst_time_str(utc_time, utc_date=None):
+    if not utc_time:
+        return "시간 없음"
+    try:
+        hh = int(utc_time[0:2])
+        mm = int(utc_time[2:4])
+        ss = int(utc_time[4:6])
+        d = utc_date or _last_date or datetime.fromtimestamp(CLOCK.now(), timezone.utc).date()
+        utc_dt = datetime(d.year, d.month, d.day, hh, mm, ss, tzinfo=timezone.utc)
+        kst_dt = utc_dt.astimezone(timezone(timedelta(hours=9)))
+        return kst_dt.strftime("%Y-%m-%d %H:%M:%S")
+    except:
+        return "시간 오류"
+
+# RMC 날짜 + hhmmss(.ss) → UTC epoch 초 (시계 보정용, 날짜 없으면 None)
+def utc_epoch(date, utc_time):
+    if date is None or len(utc_time) < 6:
+        return None
+    try:
+        base = datetime(date.year, date.month, date.day, tzinfo=timezone.utc).timestamp()
+        return base + int(utc_time[0:2]) * 3600 + int(utc_time[2:4]) * 60 + float(utc_time[4:])
+    except ValueError:
+        return None
 
-    line = ser.readline().decode("ascii", errors="ignore").strip()
+def parse_nmea(line):
+    """NMEA 한 줄 → (상태, 정보) — read_gps 와 리플레이/일괄 분석이 같이 사용"""
     if not line:
         return ("NO_FIX", None)
 
-    if line.startswith("$GPGGA"):``
+    if line.startswith("$GPGGA"):
         parts = line.split(",")
         if len(parts) < 15:
             return ("NO_FIX", None)
@@ -20,33 +91,9 @@ def read_gps():
         if fix_status == "0":
             return ("NO_FIX", None)
 
-        # 위도/경도 변환 (ddmm.mmmm to dd.ddddd)
-        def convert(coord, direction):
-            if coord == "" or direction == "":
-                return None
-            degrees = float(coord[:2])
-            minutes = float(coord[2:])
-            result = degrees + (minutes / 60)
-            if direction in ["S", "W"]:
-                result = -result
-            return round(result, 4)
-
         lat = convert(parts[2], parts[3])
         lon = convert(parts[4], parts[5])
-        utc_time = parts[1]
-        # UTC to KST 변환
-        if utc_time:
-            try:
-                hh = int(utc_time[0:2])
-                mm = int(utc_time[2:4])
-                ss = int(utc_time[4:6])
-                utc_dt = datetime(2025, 1, 1, hh, mm, ss, tzinfo=timezone.utc)
-                kst_dt = utc_dt.astimezone(timezone(timedelta(hours=9)))
-                time_str = kst_dt.strftime("%Y-%m-%d %H:%M:%S")
-            except:
-                time_str = "시간 오류"
-        else:
-            time_str = "시간 없음"
+        time_str = kst_time_str(parts[1])
 
         return ("FIX", {"lat": lat, "lon": lon, "time": time_str})
 
@@ -58,42 +105,18 @@ def read_gps():
         if status != "A":
             return ("NO_FIX", None)
 
-        lat = parts[3]
-        lat_dir = parts[4]
-        lon = parts[5]
-        lon_dir = parts[6]
+        lat = convert(parts[3], parts[4])
+        lon = convert(parts[5], parts[6])
         speed = parts[7]
-
-        def convert(coord, direction):
-            if coord == "" or direction == "":
-                return None
-            degrees = float(coord[:2])
-            minutes = float(coord[2:])
-            result = degrees + (minutes / 60)
-            if direction in ["S", "W"]:
-                result = -result
-            return round(result, 4)
-
-        lat = convert(lat, lat_dir)
-        lon = convert(lon, lon_dir)
         speed_knots = float(speed) if speed else 0
         speed_kmh = round(speed_knots * 1.852, 2)
+        global _last_date
+        date = rmc_date(parts[9])
+        _last_date = date or _last_date
+        time_str = kst_time_str(parts[1], _last_date)
 
-        utc_time = parts[1]
-        if utc_time:
-            try:
-                hh = int(utc_time[0:2])
-                mm = int(utc_time[2:4])
-                ss = int(utc_time[4:6])
-                utc_dt = datetime(2025, 1, 1, hh, mm, ss, tzinfo=timezone.utc)
-                kst_dt = utc_dt.astimezone(timezone(timedelta(hours=9)))
-                time_str = kst_dt.strftime("%Y-%m-%d %H:%M:%S")
-            except:
-                time_str = "시간 오류"
-        else:
-            time_str = "시간 없음"
-
-        return ("FIX", {"lat": lat, "lon": lon, "speed": speed_kmh, "time": time_str})
+        return ("FIX", {"lat": lat, "lon": lon, "speed": speed_kmh, "time": time_str,
+                        "utc": utc_epoch(date, parts[1])})
 
     else:
         return ("NO_FIX", None)
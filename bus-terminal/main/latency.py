@@ -0,0 +1,83 @@
+# latency.py — 단말 ↔ 서버 RTT / 시계 오프셋 추정 (NTP 방식, 최소 RTT 필터)
+#
+# 서버는 msg_id 가 있는 모든 메시지에 {type:"ack", ack_id, ts:<서버 수신 시각 ms>} 로 응답한다.
+#   t0 = 송신 시각(단말), t1 = ts(서버), t3 = ack 수신 시각(단말)
+#   rtt    = t3 - t0                         (monotonic 으로 측정 → 벽시계 점프 영향 없음)
+#   offset = t1 - (t0 + rtt/2)               (서버시계 - 단말시계, 서버 처리시간 ≈ 0 가정)
+# 최근 WINDOW 개 표본 중 RTT 가 가장 작은 표본의 offset 을 채택한다 (큐잉 지연이 가장 적은 표본).
+# 단말 벽시계는 timesvc (GPS 보정 시계) — 단말끼리 같은 GPS 기준이라 편도 지연 비교가 가능.
+import time, threading, random
+import timesvc
+from collections import deque
+
+WINDOW         = 16     # 최소 필터 창 크기 (표본 수)
+PROBE_INTERVAL = 2.0    # ping 주기 (초)
+PENDING_TTL    = 10.0   # 이 시간 넘게 ack 없는 송신은 버림
+
+class LatencyTracker:
+    def __init__(self, window=WINDOW):
+        self.lock = threading.Lock()
+        self.pending = {}                  # msg_id -> (t0_mono, t0_wall_ms)
+        self.samples = deque(maxlen=window)  # (rtt_ms, offset_ms)
+        self.rtt_ms = None                 # 최소 필터 RTT
+        self.last_rtt_ms = None            # 가장 최근 표본
+        self.offset_ms = None              # 서버시계 - 단말시계
+        self.last_probe = 0.0
+
+    # -------------------- 송신 측 --------------------
+    def mark_sent(self, msg_id, wall_ms=None):
+        """msg_id 가 붙은 메시지를 보낼 때 호출"""
+        now = time.monotonic()
+        with self.lock:
+            self.pending[msg_id] = (now, wall_ms if wall_ms is not None else timesvc.now() * 1000.0)
+            if len(self.pending) > 64:
+                self._purge(now)
+
+    def probe_due(self, interval=PROBE_INTERVAL):
+        return time.monotonic() - self.last_probe >= interval
+
+    def make_probe(self, device):
+        """ping 메시지 생성 + 송신 기록 (서버는 msg_id 로 ack 만 돌려줌)"""
+        self.last_probe = time.monotonic()
+        wall_ms = timesvc.now_ms()
+        msg_id = f"p-{wall_ms}-{random.randint(0, 999)}"
+        self.mark_sent(msg_id, wall_ms)
+        return {"type": "ping", "msg_id": msg_id, "ts": wall_ms, "device": device}
+
+    def _purge(self, now):
+        for k in [k for k, (t0, _) in self.pending.items() if now - t0 > PENDING_TTL]:
+            del self.pending[k]
+
+    # -------------------- 수신 측 --------------------
+    def on_ack(self, obj):
+        """ack 수신 처리. 표본이 추가되면 rtt_ms 반환"""
+        t3 = time.monotonic()
+        with self.lock:
+            sent = self.pending.pop(obj.get("ack_id"), None)
+            if sent is None:
+                return None
+            t0, t0_wall = sent
+            rtt = (t3 - t0) * 1000.0
+            server_ts = obj.get("ts")
+            offset = None
+            if isinstance(server_ts, (int, float)):
+                offset = server_ts - (t0_wall + rtt / 2.0)
+            self.samples.append((rtt, offset))
+            best = min(self.samples, key=lambda s: s[0])
+            self.last_rtt_ms = rtt
+            self.rtt_ms = best[0]
+            if best[1] is not None:
+                self.offset_ms = best[1]
+            return rtt
+
+    def one_way_ms(self, server_ts, recv_wall_ms=None):
+        """서버가 ts 를 찍어 보낸 메시지의 서버→단말 편도 지연 (오프셋 보정, 추정 불가면 None)"""
+        if self.offset_ms is None or not isinstance(server_ts, (int, float)):
+            return None
+        if recv_wall_ms is None:
+            recv_wall_ms = timesvc.now() * 1000.0
+        return recv_wall_ms + self.offset_ms - server_ts
+
+    def server_now_ms(self):
+        """서버 시계 기준 현재 시각 추정"""
+        return timesvc.now() * 1000.0 + (self.offset_ms or 0.0)
@@ -3,27 +3,213 @@ from luma.core.interface.serial import spi
 from luma.lcd.device import ili9341
 from PIL import Image, ImageDraw, ImageFont
 from xpt2046 import XPT2046
-import time
+import time, json, os, threading, logging
+import splash
+from metrics import METRICS
 
 # ====== LCD 초기화 ======
-serial = spi(port=0, device=0, gpio_DC=24, gpio_RST=25)
+# SPI 속도/전송 단위는 config.json 으로 조정
+#   "spi_speed_hz": ILI9341 쓰기 클럭 (기본 32MHz, 배선이 길어 화면이 깨지면 낮춤)
+#   "spi_chunk":    luma 가 한 번에 spidev 로 넘기는 바이트 수 (기본 4096)
+#                   4096 보다 크게 하려면 커널 spidev.bufsiz 도 같이 올려야 함
+#                   (/boot/firmware/cmdline.txt 에 spidev.bufsiz=65536)
+def _lcd_conf():
+    try:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+_cfg = _lcd_conf()
+SPI_SPEED_HZ = int(_cfg.get("spi_speed_hz", 32000000))
+SPI_CHUNK    = int(_cfg.get("spi_chunk", 4096))
+#   "lcd_backend":  "rgb565" (기본, fb565: 16비트 + 바뀐 타일만 전송) | "luma" (device.display 전체 전송)
+LCD_BACKEND  = _cfg.get("lcd_backend", "rgb565")
+#   "lcd_backlight_gpio":   백라이트 제어 핀 (BCM). 없으면 백라이트가 전원에 직결된 것으로 보고 건드리지 않음
+#                           (luma 기본값 BCM18 은 부저 핀 beepSys.BUZZER_PIN 이라 그대로 두면 부저 PWM 과 충돌)
+#   "lcd_backlight_pwm_hz": 백라이트 PWM 주파수 (기본 1000, 0 이면 켜기/끄기만)
+BACKLIGHT_GPIO   = _cfg.get("lcd_backlight_gpio")
+BACKLIGHT_PWM_HZ = float(_cfg.get("lcd_backlight_pwm_hz", 1000))
+_BUZZER_PIN = 18                  # beepSys.BUZZER_PIN
+if BACKLIGHT_GPIO is not None and int(BACKLIGHT_GPIO) == _BUZZER_PIN:
+    logging.getLogger("lcdsystem").warning("lcd_backlight_gpio=%s 는 부저 핀 — 백라이트 제어 안 함", BACKLIGHT_GPIO)
+    BACKLIGHT_GPIO = None
+
+# main.py 가 띄우는 부팅 화면(splash.show_async) 전송이 끝난 뒤에 luma 가 패널을 잡음
+splash.wait()
+serial = spi(port=0, device=0, gpio_DC=24, gpio_RST=25,
+             bus_speed_hz=SPI_SPEED_HZ, transfer_size=SPI_CHUNK)
 #serial = spi(port=0, device=0, gpio=None)
 
-device = ili9341(serial, width=320, height=240, rotate=0)
+def _hardwired_backlight(value):
+    """백라이트 제어 핀 없음 — luma 가 기본 핀(BCM18)을 잡지 않도록 대신 넘김"""
+
+if BACKLIGHT_GPIO is None:
+    device = ili9341(serial, width=320, height=240, rotate=0, backlight=_hardwired_backlight)
+else:
+    device = ili9341(serial, width=320, height=240, rotate=0, gpio_LIGHT=int(BACKLIGHT_GPIO),
+                     pwm_frequency=BACKLIGHT_PWM_HZ or None)
+
+def set_backlight(level):
+    """0 = 끔, 1~100 = 밝기 (PWM 이 아니면 켜기/끄기) → 제어했으면 True (직결이면 False)"""
+    if BACKLIGHT_GPIO is None:
+        return False
+    if not BACKLIGHT_PWM_HZ:
+        device.backlight(level > 0)
+    else:
+        # luma 는 1 을 True(=100%)로 받으므로 켠 상태의 최소 밝기는 2
+        device.backlight(0.0 if level <= 0 else float(max(2, min(100, level))))
+    return True
+
+# ====== 더블 버퍼 + 전송 스레드 ======
+class DisplayPipeline:
+    """
+    프레임 합성(UI 루프)과 SPI 전송(flush 스레드)을 분리
+    - 전송 중(front) / 합성용(back) 버퍼 + 전송 대기 슬롯 1장
+    - 최신 프레임 우선: 전송이 밀려 있는 동안 새 프레임이 submit 되면 아직 안 나간 대기 프레임은 버림
+      → UI 루프는 SPI 를 기다리지 않고, flush 스레드는 깨어나면 항상 가장 최근 프레임을 보냄
+      (대기 슬롯도 버퍼 한 장을 차지하므로 합성용이 모자라지 않도록 3장)
+
+        img = DISPLAY.acquire()          # 합성용 버퍼 (이전 내용이 남아 있으니 전체를 다시 칠할 것)
+        ... draw ...
+        DISPLAY.submit(img)              # 바로 반환, 전송은 flush 스레드가
+    """
+    def __init__(self, device, fb=None, threaded=True):
+        self.device = device
+        self.fb = fb                     # Framebuffer565 (없으면 luma device.display)
+        self.redirect = None             # 렌더 프로세스가 SPI 를 맡으면 submit 을 그쪽으로 넘김 (fn(img, on_flushed))
+        self.threaded = threaded
+        self.bufs = [Image.new("RGB", device.size) for _ in range(3)]
+        self.free = list(self.bufs)
+        self.pending = None              # 전송 대기 프레임 (항상 최신 1장)
+        self.pending_cbs = []            # 대기 프레임이 실제로 나간 뒤 호출할 콜백
+        self.cv = threading.Condition()
+        self.frames = 0                  # 전송 완료 프레임 수
+        self.owner = None                # 마지막 프레임을 보낸 widgets.Screen (다른 화면이 끼어들면 전체 다시 그리게)
+        self.dropped = 0                 # 전송 전에 새 프레임으로 대체된 수
+        self._thread = None
+        self._stop = False
+
+    def _is_buf(self, img):
+        return any(img is b for b in self.bufs)
+
+    def acquire(self):
+        with self.cv:
+            while not self.free:
+                self.cv.wait()
+            return self.free.pop()
+
+    def submit(self, img, on_flushed=None, owner=None):
+        """합성 끝난 프레임을 전송 대기로 (acquire 로 받지 않은 Image 도 가능 — 내부 버퍼로 복사하지 않음)"""
+        self.owner = owner
+        if self.redirect is not None:
+            self.redirect(img, on_flushed)
+            if self._is_buf(img):
+                with self.cv:
+                    self.free.append(img)
+                    self.cv.notify_all()
+            return
+        if not self.threaded:
+            self._flush(img)
+            if on_flushed:
+                on_flushed()
+            if self._is_buf(img):
+                self.free.append(img)
+            return
+        with self.cv:
+            if self.pending is not None:
+                # 아직 안 나간 프레임은 버림 (그 프레임의 콜백은 이번 프레임이 나갈 때 같이 호출)
+                self.dropped += 1
+                METRICS.frames_dropped.inc()
+                if self._is_buf(self.pending):
+                    self.free.append(self.pending)
+            self.pending = img
+            if on_flushed:
+                self.pending_cbs.append(on_flushed)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="lcd-flush", daemon=True)
+                self._thread.start()
+            self.cv.notify_all()
+
+    def _run(self):
+        while True:
+            with self.cv:
+                while self.pending is None and not self._stop:
+                    self.cv.wait()
+                if self.pending is None:
+                    return
+                img, self.pending = self.pending, None
+                cbs, self.pending_cbs = self.pending_cbs, []
+            self._flush(img)
+            for cb in cbs:
+                try: cb()
+                except Exception: pass
+            with self.cv:
+                if self._is_buf(img):
+                    self.free.append(img)
+                self.cv.notify_all()
+
+    def _flush(self, img):
+        t = time.perf_counter()
+        if self.fb is not None:
+            self.fb.flush(img)
+        else:
+            self.device.display(img)
+        METRICS.spi_flush_ms.observe_since(t)
+        self.frames += 1
+
+    def wait_idle(self, timeout=1.0):
+        """대기 프레임까지 모두 전송될 때까지 (종료 직전 마지막 화면 보장)"""
+        end = time.monotonic() + timeout
+        with self.cv:
+            while (self.pending is not None or len(self.free) < len(self.bufs)) and time.monotonic() < end:
+                if self._thread is None:
+                    break
+                self.cv.wait(max(0.0, end - time.monotonic()))
+
+    def stop(self):
+        self.wait_idle()
+        with self.cv:
+            self._stop = True
+            self.cv.notify_all()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+def _framebuffer():
+    if LCD_BACKEND != "rgb565":
+        return None
+    try:
+        from fb565 import Framebuffer565
+        return Framebuffer565(device)
+    except Exception as e:          # numpy 없음 등 → luma 전체 전송으로
+        logging.getLogger("lcdsystem").warning("RGB565 프레임버퍼 사용 불가, luma 로 대체: %s", e)
+        return None
+
+DISPLAY = DisplayPipeline(device, fb=_framebuffer())
+# 부팅 화면 유지: luma 초기화(리셋)로 지워진 패널에 main.py 가 띄웠던 마지막 프레임을 바로 다시 (splash.py)
+splash.restore(DISPLAY)
 
 # ====== 터치 초기화 ======
 touch = XPT2046(irq_pin=23, spi_bus=0, spi_dev=1, rotate=1)
 
 # ====== 폰트 로드 ======
-FONT_BIG   = ImageFont.truetype("/usr/share/fonts/truetype/nanum/NanumGothicBold.ttf", 26)
-FONT_MED   = ImageFont.truetype("/usr/share/fonts/truetype/nanum/NanumGothicBold.ttf", 20)
-FONT_SMALL = ImageFont.truetype("/usr/share/fonts/truetype/nanum/NanumGothic.ttf", 16)
-FONT_MONO  = ImageFont.truetype("/usr/share/fonts/truetype/nanum/NanumGothic.ttf", 14)
+def _font(path, size):
+    # 나눔폰트가 없는 PC(simhw 시뮬레이션)에서는 PIL 기본 폰트로 대체
+    try:
+        return ImageFont.truetype(path, size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+FONT_BIG   = _font("/usr/share/fonts/truetype/nanum/NanumGothicBold.ttf", 26)
+FONT_MED   = _font("/usr/share/fonts/truetype/nanum/NanumGothicBold.ttf", 20)
+FONT_SMALL = _font("/usr/share/fonts/truetype/nanum/NanumGothic.ttf", 16)
+FONT_MONO  = _font("/usr/share/fonts/truetype/nanum/NanumGothic.ttf", 14)
 
 # ====== 공용 유틸 ======
 def clear(color="black"):
     img = Image.new("RGB", device.size, color)
-    device.display(img)
+    DISPLAY.submit(img)
 
 def draw_status(line1, line2="", color="white", bg="black"):
     """상태 메시지를 중앙 정렬로 표시"""
@@ -39,7 +225,7 @@ def draw_status(line1, line2="", color="white", bg="black"):
         tw2, th2 = bbox2[2] - bbox2[0], bbox2[3] - bbox2[1]
         draw.text(((320 - tw2)//2, 120), line2, font=FONT_SMALL, fill="#ccc")
 
-    device.display(img)
+    DISPLAY.submit(img)
 
 def wait_touch_exit(timeout=None):
     """화면 탭을 기다림 (디버그용)"""
@@ -0,0 +1,188 @@
+# logsys.py — 비동기 구조화 로깅 (큐 핸들러 + 단일 writer 스레드 + 회전/압축)
+#
+# 작업 스레드(WS 수신 루프, UI 루프 등)는 레코드를 큐에 넣기만 하고
+# 파일 쓰기/회전/gzip 압축/RingLog 콘솔 반영은 writer 스레드 하나가 전담한다.
+#
+#   import logsys
+#   logsys.setup("bussys", ring=LOG)      # 프로세스 시작 시 1회
+#   log = logsys.get_logger("bussys")
+#   log.info("문 열림 감지됨")
+#   log.debug("RAW %s", obj)              # 레벨에서 걸러지면 거의 비용 없음
+import logging, logging.handlers
+import os, json, gzip, shutil, time, queue, atexit
+from datetime import datetime, timezone, timedelta
+import timesvc
+
+KST = timezone(timedelta(hours=9))
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR  = os.path.join(BASE_DIR, "logs")
+
+MAX_BYTES    = 2 * 1024 * 1024   # 파일당 2MB 넘으면 회전
+ROTATE_EVERY = 24 * 3600         # 또는 하루마다 회전
+BACKUP_COUNT = 10                # .1.gz ~ .10.gz 보관
+QUEUE_SIZE   = 10000             # 가득 차면 버림 (작업 스레드는 절대 대기하지 않음)
+
+# 레코드 생성 비용 절감 (프로세스/멀티프로세싱 정보는 쓰지 않음)
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+# 레코드 시각은 시스템 시계 대신 GPS 보정 시계 (timesvc) 기준
+_base_factory = logging.getLogRecordFactory()
+
+def _record_factory(*args, **kwargs):
+    record = _base_factory(*args, **kwargs)
+    record.created = timesvc.now()
+    record.msecs = (record.created - int(record.created)) * 1000
+    return record
+
+logging.setLogRecordFactory(_record_factory)
+
+# ====== 포맷 ======
+class JsonLineFormatter(logging.Formatter):
+    """한 줄 = 한 JSON 객체 (jq / pandas.read_json(lines=True) 로 바로 읽힘)"""
+    def format(self, record):
+        obj = {
+            "ts":   round(record.created, 3),
+            "time": datetime.fromtimestamp(record.created, KST).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            "lvl":  record.levelname,
+            "src":  record.name,
+            "thr":  record.threadName,
+            "msg":  record.getMessage(),
+        }
+        data = getattr(record, "data", None)
+        if data is not None:
+            obj["data"] = data
+        if record.exc_info:
+            obj["exc"] = self.formatException(record.exc_info)
+        return json.dumps(obj, ensure_ascii=False, default=str)
+
+# ====== 파일 핸들러 (크기/시간 회전 + gzip) ======
+class CompressingRotatingHandler(logging.handlers.RotatingFileHandler):
+    """크기(max_bytes) 또는 시간(interval 초) 중 먼저 도달한 조건으로 회전, 지난 파일은 gzip"""
+    def __init__(self, filename, max_bytes=MAX_BYTES, interval=ROTATE_EVERY, backup_count=BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count,
+                         encoding="utf-8", delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._gzip_rotate
+
+    def shouldRollover(self, record):
+        if self.interval and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+    @staticmethod
+    def _gzip_rotate(src, dst):
+        if not os.path.exists(src):
+            return
+        with open(src, "rb") as fi, gzip.open(dst, "wb") as fo:
+            shutil.copyfileobj(fi, fo)
+        os.remove(src)
+
+# ====== RingLog 브리지 ======
+class RingLogHandler(logging.Handler):
+    """
+    화면 콘솔(RingLog)로 메시지 전달
+    - 지정한 로거(prefixes)의 INFO 이상 + 나머지 모듈은 WARNING 이상만
+    """
+    def __init__(self, ring, prefixes=("bussys",), level=logging.INFO):
+        super().__init__(level)
+        self.ring = ring
+        self.prefixes = tuple(prefixes)
+
+    def emit(self, record):
+        if record.levelno < logging.WARNING and not record.name.startswith(self.prefixes):
+            return
+        try:
+            self.ring.add(record.getMessage(), ts=record.created)
+        except Exception:
+            self.handleError(record)
+
+# ====== 논블로킹 큐 핸들러 ======
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """큐가 가득 차면 대기하지 않고 버린 뒤 개수만 센다"""
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+# ====== 전역 파이프라인 ======
+_queue    = None
+_handler  = None
+_listener = None
+
+def setup(name, ring=None, level=logging.INFO, echo=False):
+    """
+    프로세스 전체 로깅 파이프라인 구성 (여러 번 불려도 1회만 적용)
+    - logs/<name>.jsonl  (크기/시간 회전, gzip 압축)
+    - ring: RingLog 인스턴스를 주면 화면 콘솔로도 전달
+    - echo: True면 stdout 에도 사람이 읽는 형식으로 출력 (개발용)
+    """
+    global _queue, _handler, _listener
+    if _listener is not None:
+        if ring is not None:
+            attach_ring(ring)
+        return _listener
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    fh = CompressingRotatingHandler(os.path.join(LOG_DIR, f"{name}.jsonl"))
+    fh.setFormatter(JsonLineFormatter())
+    handlers = [fh]
+    if echo:
+        sh = logging.StreamHandler()
+        sh.setFormatter(logging.Formatter("[%(asctime)s] %(name)s %(levelname)s: %(message)s"))
+        handlers.append(sh)
+    if ring is not None:
+        handlers.append(RingLogHandler(ring))
+
+    _queue = queue.Queue(QUEUE_SIZE)
+    _handler = DroppingQueueHandler(_queue)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_handler)
+
+    _listener = logging.handlers.QueueListener(_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+    return _listener
+
+def attach_ring(ring, prefixes=("bussys",)):
+    """setup 이후에 RingLog 를 연결 (writer 스레드가 읽는 튜플을 통째로 교체)"""
+    if _listener is None:
+        return
+    _listener.handlers = _listener.handlers + (RingLogHandler(ring, prefixes),)
+
+def get_logger(name):
+    return logging.getLogger(name)
+
+def dropped():
+    """큐 포화로 버려진 레코드 수"""
+    return _handler.dropped if _handler else 0
+
+def queue_depth():
+    return _queue.qsize() if _queue else 0
+
+def shutdown():
+    """남은 레코드를 모두 기록하고 writer 스레드 종료"""
+    global _listener
+    if _listener is None:
+        return
+    try:
+        _listener.stop()
+        for h in _listener.handlers:
+            try: h.close()
+            except Exception: pass
+    finally:
+        logging.getLogger().removeHandler(_handler)
+        _listener = None
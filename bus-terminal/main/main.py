@@ -1,26 +1,19 @@
 # main.py
-from luma.core.interface.serial import spi
-from luma.lcd.device import ili9341
-from PIL import Image, ImageDraw, ImageFont
+# 부팅 첫 화면: 다른 import (PIL/luma/numpy, 폰트) 전에 마지막으로 그린 화면을 spidev 로 바로 LCD 에 (splash.py)
+# 패널 리셋 대기 동안 아래 import 는 계속 진행 (lcdsystem 이 luma 초기화 전에 splash.wait())
+import splash
+splash.show_async()
 import RPi.GPIO as GPIO
 import time, json, os, subprocess, socket
-from datetime import datetime
-from xpt2046 import XPT2046
 import logging
-import subprocess, signal, time
-from lcdsystem import device, touch, draw_status
-
-# ---------- 디스플레이 ----------
-serial = spi(port=0, device=0, gpio_DC=24, gpio_RST=25)
-device = ili9341(serial, width=320, height=240, rotate=0)
-
-FONT_BIG   = ImageFont.truetype("/usr/share/fonts/truetype/nanum/NanumGothicBold.ttf", 26)
-FONT_MED   = ImageFont.truetype("/usr/share/fonts/truetype/nanum/NanumGothicBold.ttf", 20)
-FONT_SMALL = ImageFont.truetype("/usr/share/fonts/truetype/nanum/NanumGothic.ttf", 16)
-
-# ---------- 터치 ----------
-#touch = XPT2046(cs_pin=7, irq_pin=23, spi_bus=0, spi_dev=1, rotate=0)
-touch = XPT2046(irq_pin=23, spi_bus=0, spi_dev=1, rotate=1)
+import logsys
+import subprocess, signal, time, sys
+# 디스플레이/터치/폰트/상태 화면은 bussys 와 같은 lcdsystem 것을 씀 (SPI 장치 중복 초기화 없음)
+from lcdsystem import device, touch, draw_status, DISPLAY, FONT_BIG, FONT_MED, FONT_SMALL
+from widgets import Screen, Box, Label, KeypadGrid
+from metrics import METRICS, process_age_s
+import selftest
+import supervisor
 
 
 # ---------- 경로/캐시 ----------
@@ -28,12 +21,9 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONF_PATH = os.path.join(BASE_DIR, "config.json")
 BUSSYS   = os.path.join(BASE_DIR, "bussys.py")
 
-logging.basicConfig(
-    filename='bussys_log.txt',
-    level=logging.INFO,
-    format='[%(asctime)s] %(message)s',
-    encoding='utf-8'
-)
+# 로그: logs/main.jsonl (비동기 writer 스레드, 크기/시간 회전 + gzip)
+logsys.setup("main")
+log = logging.getLogger("main")
 
 def load_conf():
     if os.path.exists(CONF_PATH):
@@ -61,69 +51,67 @@ GRID = (4,4)
 PAD_MARGIN = 8
 TOP_INFO_H = 70  # 상단 안내/입력창 높이
 
-def draw_keypad(draw):
-    w, h = device.size
-    grid_w = w - PAD_MARGIN * 2
-    grid_h = h - TOP_INFO_H - PAD_MARGIN * 2
-    cell_w = grid_w // GRID[0]
-    cell_h = grid_h // GRID[1]
-    ox, oy = PAD_MARGIN, TOP_INFO_H + PAD_MARGIN
+class WizardScreen(Screen):
+    """
+    설정 마법사 화면: 단계 안내 / 입력칸 / 도움말 / 키패드
+    키패드는 평상시/눌림 모양을 처음 한 번만 그리고, 키를 누르면 그 칸과 입력칸만 다시 보냄
+    """
+    def __init__(self):
+        super().__init__(device.size, "black")
+        w, h = device.size
+        ox, oy = PAD_MARGIN, TOP_INFO_H + PAD_MARGIN
+        self.keypad = self.add(KeypadGrid((ox, oy, w - PAD_MARGIN, h - PAD_MARGIN), KEYS, FONT_BIG))
+        self.info = self.add(Label((10, 8, 320, 34), font=FONT_MED, fg="#9ad0ff"))
+        self.cached = self.add(Label((220, 8, 320, 30), font=FONT_SMALL, fg="#6effa1"))
+        self.add(Box((10, 34, 311, 63), outline="#888", width=2))
+        self.value = self.add(Label((16, 36, 306, 62), font=FONT_MED, pad=(0, 2)))
+        # 키패드 위에 얹음 (글자 아래쪽이 키패드 윗줄 여백에 걸침)
+        self.helper = self.add(Label((10, 66, 320, 86), font=FONT_SMALL, fg="#bbb"))
+
+    def show_step(self, step, prompt, helper, value, cached=False):
+        self.info.set(text=f"[{step}/4] {prompt}", fg="#6effa1" if cached else "#9ad0ff")
+        self.cached.set(text="캐시 사용" if cached else "")
+        self.value.set(text=value if value else "입력 대기…", fg="white" if value else "#aaa")
+        self.helper.set(text=helper)
 
-    for r in range(GRID[1]):
-        for c in range(GRID[0]):
-            x0 = ox + c * cell_w
-            y0 = oy + r * cell_h
-            x1 = x0 + cell_w - 4
-            y1 = y0 + cell_h - 4
-            draw.rounded_rectangle((x0, y0, x1, y1), radius=10, outline="white", width=2)
-            label = KEYS[r][c]
-            if label:
-                bbox = draw.textbbox((0, 0), label, font=FONT_BIG)
-                tw, th = bbox[2] - bbox[0], bbox[3] - bbox[1]
-                draw.text(
-                    (x0 + (cell_w - tw) // 2, y0 + (cell_h - th) // 2),
-                    label,
-                    font=FONT_BIG,
-                    fill="white"
-                )
+class SelfTestScreen(Screen):
+    """부팅 자가 점검: 항목마다 한 줄 ("확인 중…" → 결과), 끝나는 대로 그 줄만 다시 보냄"""
+    def __init__(self, names):
+        super().__init__(device.size, "black")
+        self.add(Label((10, 8, 320, 34), text="자가 점검", font=FONT_MED, fg="#9ad0ff"))
+        self.rows = {}
+        for i, name in enumerate(names):
+            y = 48 + i * 40
+            self.add(Label((16, y, 100, y + 30), text=selftest.TITLES.get(name, name), font=FONT_MED))
+            self.rows[name] = self.add(Label((100, y + 4, 316, y + 30), text="확인 중…", font=FONT_SMALL, fg="#aaa"))
 
-def hit_test(px, py):
-    w, h = device.size
-    if py < TOP_INFO_H: 
-        return None
-    grid_w = w - PAD_MARGIN*2
-    grid_h = h - TOP_INFO_H - PAD_MARGIN*2
-    cell_w = grid_w // GRID[0]
-    cell_h = grid_h // GRID[1]
-    ox, oy = PAD_MARGIN, TOP_INFO_H + PAD_MARGIN
+    def show_result(self, name, ok, detail, ms):
+        self.rows[name].set(text=f"{'정상' if ok else '실패'}  {detail}", fg="#6effa1" if ok else "#ff7070")
+        self.present()
 
-    if not (ox <= px <= ox+grid_w and oy <= py <= oy+grid_h): 
-        return None
-    c = (px - ox) // cell_w
-    r = (py - oy) // cell_h
-    c = max(0, min(GRID[0]-1, c))
-    r = max(0, min(GRID[1]-1, r))
-    return KEYS[r][c]
+SELFTEST_HOLD_S = 2.0   # 실패 항목이 있으면 읽을 시간만큼 보여 주고 진행
 
-def draw_top(draw, step, prompt, value, cached=False):
-    # 상단 박스 + 안내
-    draw.rectangle((0,0,320,TOP_INFO_H), fill="black")
-    info = f"[{step}/4] {prompt}"
-    draw.text((10, 8), info, font=FONT_MED, fill="#9ad0ff" if not cached else "#6effa1")
-    draw.rectangle((10, 34, 310, 62), outline="#888", width=2)
-    draw.text((16, 38), value if value else "입력 대기…", font=FONT_MED, fill="white" if value else "#aaa")
-    if cached:
-        draw.text((220, 8), "캐시 사용", font=FONT_SMALL, fill="#6effa1")
+def boot_selftest(cfg, hold=SELFTEST_HOLD_S):
+    """터치 / GPS / 오디오 / 서버 점검을 동시에 — 결과는 끝나는 대로 화면에"""
+    ip = cfg.get("server_ip")
+    checks = selftest.default_checks(touch, server=(lambda: connect_server(ip)) if ip else None)
+    screen = SelfTestScreen([name for name, _ in checks])
+    screen.present()
+    results = selftest.run(checks, on_result=screen.show_result)
+    if not all(r["ok"] for r in results.values()):
+        time.sleep(hold)
+    return results
 
-def draw_status(line1, line2="", color="white"):
-    img = Image.new("RGB", device.size, "black")
-    draw = ImageDraw.Draw(img)
-    tw1, th1 = draw.textsize(line1, font=FONT_MED)
-    draw.text(((320 - tw1)//2, 80), line1, font=FONT_MED, fill=color)
-    if line2:
-        tw2, th2 = draw.textsize(line2, font=FONT_SMALL)
-        draw.text(((320 - tw2)//2, 120), line2, font=FONT_SMALL, fill="#ccc")
-    device.display(img)
+def mark_interactive():
+    """설정 화면 첫 프레임이 패널에 나간 순간 — 부팅(프로세스 시작) → 조작 가능 시간"""
+    if METRICS.boot_interactive_ms.get() is not None:
+        return
+    age = process_age_s()
+    if age is None:
+        return
+    METRICS.boot_interactive_ms.set(round(age * 1000.0, 1))
+    log.info("부팅 → 조작 가능: %.0fms (부팅 화면 %s)", age * 1000.0,
+             "없음" if splash.SHOWN_MS is None else f"{splash.SHOWN_MS:.0f}ms")
 
 def connect_server(ip):
     # 서버 IP: ws://<ip>:3000/device-ws 에 접속 시도 (1초 타임아웃)
@@ -148,86 +136,162 @@ def run_bussys():
         return False'''
         
         
+SUP = None   # supervisor.Supervisor — bussys 가 죽거나 멈추면 바로 다시 띄움 (finally 에서 정리)
+
 def run_bussys():
+    # bussys.py 를 감독 아래 실행 — 정상 종료(0)할 때까지 여기서 대기
+    # (죽음/워치독 멈춤 → 재시작, 대기 중이던 승하차 요청은 bussys 가 state.json 에서 복원)
+    global SUP
     try:
-        # Popen을 전역 변수로 저장
-        global bussys_proc
-        bussys_proc = subprocess.Popen(
-            ["python3", BUSSYS],
-            cwd=BASE_DIR,
-            start_new_session=False  # 같은 세션에 두면 Ctrl+C 신호 같이 받음
-        )
-        return True
+        env = dict(os.environ)
+        if METRICS.boot_interactive_ms.get() is not None:
+            env["BUS_BOOT_MS"] = str(METRICS.boot_interactive_ms.get())   # bussys 가 Prometheus 로 내보냄
+        # 같은 세션에 두면 Ctrl+C 신호 같이 받음
+        SUP = supervisor.Supervisor(["python3", BUSSYS], cwd=BASE_DIR, env=env)
     except Exception as e:
         draw_status("bussys 실행 실패", str(e), color="#ff7070")
         time.sleep(2)
         return False
+    SUP.run()
+    return True
 
-def input_loop():
-    cfg = load_conf()
+STEPS = [
+    ("단말 UID 입력", "device_id", "숫자/문자 가능. '=' 다음", "alnum"),
+    ("서버 IP 입력", "server_ip", "예: 192.168.0.10  '=' 다음", "ip"),
+    ("차량 번호(4자리)", "vehicle_no", "숫자4자리. '=' 다음", "4d"),
+    ("버스 번호(2~4자리)", "bus_no", "숫자2~4자리. '=' 다음", "2to4d"),
+]
 
-    steps = [
-        ("단말 UID 입력", "device_id", "숫자/문자 가능. '=' 다음", "alnum"),
-        ("서버 IP 입력", "server_ip", "예: 192.168.0.10  '=' 다음", "ip"),
-        ("차량 번호(4자리)", "vehicle_no", "숫자4자리. '=' 다음", "4d"),
-        ("버스 번호(2~4자리)", "bus_no", "숫자2~4자리. '=' 다음", "2to4d"),
-    ]
+class Wizard:
+    """입력 단계 상태 + 터치 처리. poll() 을 짧은 주기로 부르면 마지막 단계가 끝났을 때 True"""
+    def __init__(self, cfg, ui=None):
+        self.cfg = cfg
+        self.ui = ui or WizardScreen()
+        self.step_idx = 0
+        self.buf = cfg.get(STEPS[0][1], "")
+        self.was_touched = False
 
-    step_idx = 0
-    buf = cfg.get(steps[step_idx][1], "")
+    def on_key(self, k):
+        """키 하나 처리 → 마지막 단계까지 저장했으면 True"""
+        key_prompt, key_name, helper, rule = STEPS[self.step_idx]
+        if k == "C":
+            self.buf = ""
+        elif k == "⌫":
+            self.buf = self.buf[:-1]
+        elif k == "=":
+            # 검증
+            if validate(rule, self.buf):
+                self.cfg[key_name] = self.buf
+                save_conf(self.cfg)
+                self.step_idx += 1
+                if self.step_idx >= len(STEPS):
+                    return True
+                # 다음 단계 준비
+                self.buf = self.cfg.get(STEPS[self.step_idx][1], "")
+            else:
+                # 규칙 불일치 (다음 present 때 마법사 화면 전체를 다시 보냄)
+                draw_status("형식 오류", f"입력 다시 확인: {helper}", color="#ff9f43")
+                time.sleep(1.2)
+        elif k:
+            # 문자 추가 (길이 제한)
+            self.buf = append_with_rule(rule, self.buf, k)
+        return False
 
-    while True:
-        img = Image.new("RGB", device.size, "black")
-        draw = ImageDraw.Draw(img)
+    def refresh(self, on_flushed=None):
+        key_prompt, key_name, helper, rule = STEPS[self.step_idx]
+        self.ui.show_step(self.step_idx+1, key_prompt, helper, self.buf, bool(self.cfg.get(key_name)))
+        # 바뀐 게 없으면 아무것도 안 보냄 (보낼 게 없으면 on_flushed 는 바로)
+        if not self.ui.present(on_flushed) and on_flushed:
+            on_flushed()
 
-        key_prompt, key_name, helper, rule = steps[step_idx]
-        cached = bool(cfg.get(key_name))
-        draw_top(draw, step_idx+1, f"{key_prompt}", buf, cached)
-        draw.text((10, 66), helper, font=FONT_SMALL, fill="#bbb")
-        draw_keypad(draw)
-        device.display(img)
+    def poll(self):
+        # 터치: 눌리는 순간에만 키 입력 (누르고 있는 동안 반복 입력/디바운스 sleep 없음)
+        touched = touch.touched()
+        if touched and not self.was_touched:
+            t0 = time.perf_counter()
+            pos = touch.read()
+            if pos is None:
+                # XPT2046 은 누른 직후 압력이 안정될 때까지 None — was_touched 를 그대로 두고 다음 poll 에서 다시 읽음
+                return False
+            rc = self.ui.keypad.cell_at(*pos)
+            if rc is not None:
+                self.ui.keypad.press(rc)
+                if self.on_key(self.ui.keypad.keys[rc[0]][rc[1]]):
+                    return True
+                self.refresh(lambda: METRICS.key_latency_ms.observe_since(t0))
+                self.was_touched = touched
+                return False
+        elif not touched and self.was_touched:
+            self.ui.keypad.release()
+        self.was_touched = touched
+        self.refresh()
+        return False
+
+def input_loop():
+    cfg = load_conf()
+    wiz = Wizard(cfg)
+    wiz.refresh(mark_interactive)
+    while not wiz.poll():
+        supervisor.ping()  # systemd 워치독 (설정 중에도)
+        time.sleep(0.01)   # 가벼운 폴링
+    # 캐시가 있고, 사용자가 바로 '다음'을 원하는 경우(상단 아무데나 길게 탭) 등의 UX는 추후
+    return cfg
 
-        # 터치 처리
-        t0 = time.time()
-        while True:
-            # 가벼운 폴링
-            if touch.touched():
-                pos = touch.read()
-                if pos:
-                    k = hit_test(*pos)
-                    if k is None:
-                        continue
-                    if k == "":  # 빈칸
-                        time.sleep(0.15); break
-                    if k == "C":
-                        buf = ""
-                    elif k == "⌫":
-                        buf = buf[:-1]
-                    elif k == "=":
-                        # 검증
-                        if validate(rule, buf):
-                            cfg[key_name] = buf
-                            save_conf(cfg)
-                            step_idx += 1
-                            if step_idx >= len(steps):
-                                return cfg
-                            # 다음 단계 준비
-                            buf = cfg.get(steps[step_idx][1], "")
-                            time.sleep(0.2)
-                            break
-                        else:
-                            # 규칙 불일치
-                            draw_status("형식 오류", f"입력 다시 확인: {helper}", color="#ff9f43")
-                            time.sleep(1.2)
-                    else:
-                        # 문자 추가 (길이 제한)
-                        buf = append_with_rule(rule, buf, k)
+def bench_keypad(presses=40, spi_hz=32_000_000, full=False):
+    """
+    simhw 위에서 키 눌림 → 패널 반영(SPI 전송 완료) 지연 측정. full=True 는 키마다 전체 화면을 다시 그리는 비교용
+      python3 -c "import simhw; simhw.install(); import main; print(main.bench_keypad())"
+    """
+    import simhw
+    simhw.DEVICE.spi_hz = spi_hz
+    wiz = Wizard({})
+    wiz.refresh()
+    DISPLAY.wait_idle()
+    kp = wiz.ui.keypad
+    centers = {}
+    for r, row in enumerate(kp.keys):
+        for c, k in enumerate(row):
+            x0, y0, x1, y1 = kp.cell_rect(r, c)
+            centers[k] = (kp.rect[0] + (x0 + x1) // 2, kp.rect[1] + (y0 + y1) // 2)
+    seq = ["1", "2", "3", "4", "5", "6", "7", "8", "9", "0", "⌫", "⌫"]
+    samples, sent = [], 0
+    for i in range(presses):
+        if full:
+            # 예전 방식 흉내: 키패드 새로 그리기 + 전체 화면 전송
+            wiz.ui.keypad.invalidate()
+            wiz.ui.invalidate_all()
+            if DISPLAY.fb is not None:
+                DISPLAY.fb.invalidate()
+        b0 = simhw.DEVICE.spi_bytes
+        simhw.TOUCH.press(*centers[seq[i % len(seq)]])
+        wiz.poll()
+        DISPLAY.wait_idle()
+        samples.append(METRICS.key_latency_ms.last)
+        sent += simhw.DEVICE.spi_bytes - b0
+        simhw.TOUCH.release()
+        wiz.poll()
+        DISPLAY.wait_idle()
+    samples.sort()
+    return {"presses": presses, "p50_ms": round(samples[len(samples) // 2], 2),
+            "p95_ms": round(samples[int(len(samples) * 0.95)], 2), "max_ms": round(samples[-1], 2),
+            "bytes_per_press": sent // presses}
 
-                    time.sleep(0.12)  # 디바운스
-            # 캐시가 있고, 사용자가 바로 '다음'을 원하는 경우(상단 아무데나 길게 탭) 등의 UX는 추후
-            if time.time() - t0 > 0.03:
-                # 빠른 리프레시
-                break
+def bench_boot():
+    """
+    simhw 위에서 부팅 단계별 시간: 부팅 화면 / 자가 점검 (동시 실행 vs 각 점검 합) / 프로세스 시작 → 설정 화면 첫 프레임
+      python3 -c "import simhw; simhw.install(); import main; print(main.bench_boot())"
+    """
+    t0 = time.perf_counter()
+    results = boot_selftest(load_conf(), hold=0)
+    selftest_ms = (time.perf_counter() - t0) * 1000.0
+    wiz = Wizard({})
+    wiz.refresh(mark_interactive)
+    DISPLAY.wait_idle()
+    return {"splash_ms": None if splash.SHOWN_MS is None else round(splash.SHOWN_MS, 1),
+            "selftest_ms": round(selftest_ms, 1),
+            "selftest_serial_ms": round(sum(r["ms"] for r in results.values()), 1),
+            "selftest": {k: f"{'ok' if r['ok'] else 'fail'} {r['detail']}" for k, r in results.items()},
+            "interactive_ms": METRICS.boot_interactive_ms.get()}
 
 def validate(rule, s):
     import re
@@ -269,6 +333,7 @@ def append_with_rule(rule, buf, k):
     return buf
 
 def main():
+    boot_selftest(load_conf())
     while True:
         cfg = input_loop()
 
@@ -278,7 +343,7 @@ def main():
 
         if ok:
             draw_status("서버 연결 성공!", "2초 후 시작합니다", color="#6effa1")
-            logging.info(f"서버 연결 성공: {cfg['server_ip']}")
+            log.info("서버 연결 성공: %s", cfg['server_ip'])
             time.sleep(2)
             if run_bussys():
                 return
@@ -286,24 +351,24 @@ def main():
             # 화면에는 짧게 출력하되
             draw_status("서버 연결 실패", f"사유: \n {reason[:60]}...", color="#ff7070")
             # 전체 로그는 파일에 기록
-            logging.error(f"서버 연결 실패 ({cfg['server_ip']}) - 사유 전체: {reason}")
+            log.error("서버 연결 실패 (%s) - 사유 전체: %s", cfg['server_ip'], reason)
             time.sleep(2)
 
 if __name__ == "__main__":
+    # systemctl stop (SIGTERM) 도 finally 를 거쳐 bussys 를 정리하게
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     try:
         main()
     except Exception as e:
-        import traceback
-        with open("fatal_error.log", "a") as f:
-            f.write(f"[{datetime.now()}] {repr(e)}\n")
-            traceback.print_exc(file=f)
-        print("프로그램이 예기치 않게 중단되었습니다. fatal_error.log를 확인하세요.")
+        log.critical("프로그램 비정상 종료: %r", e, exc_info=True)
+        print("프로그램이 예기치 않게 중단되었습니다. logs/main.jsonl 을 확인하세요.")
     finally:
         try:
-            if 'bussys_proc' in globals():
-                bussys_proc.terminate()
-                bussys_proc.wait(timeout=3)
+            if SUP is not None:
+                SUP.stop()
+                SUP.kill()
         except Exception:
             pass
         GPIO.cleanup()
+        logsys.shutdown()
 
@@ -0,0 +1,213 @@
+# metrics.py — 단말 계측값 + 화면 오버레이 + localhost Prometheus 엔드포인트
+#
+# 기록 쪽은 락 없이 속성 대입/덧셈만 한다 (GIL 하에서 값이 깨지지 않음, 드물게
+# 동시 증가 1~2회가 누락될 수 있으나 운영 계측 용도로는 충분).
+#
+#   from metrics import METRICS
+#   t0 = time.perf_counter(); ...; METRICS.frame_ms.observe_since(t0)
+#   METRICS.telemetry_sent.inc()
+#   metrics.serve()                       # http://127.0.0.1:9108/metrics
+import os, time, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROM_HOST = "127.0.0.1"   # 외부 노출 금지: 차고지 툴은 ssh 터널/로컬 에이전트로 수집
+PROM_PORT = 9108
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+# ====== 기본 타입 ======
+class Counter:
+    __slots__ = ("name", "help", "value")
+    def __init__(self, name, help=""):
+        self.name, self.help, self.value = name, help, 0
+    def inc(self, n=1):
+        self.value += n
+
+class Gauge:
+    """값을 직접 set 하거나, fn 을 주면 읽을 때마다 계산"""
+    __slots__ = ("name", "help", "value", "fn")
+    def __init__(self, name, help="", fn=None):
+        self.name, self.help, self.value, self.fn = name, help, None, fn
+    def set(self, v):
+        self.value = v
+    def get(self):
+        return self.fn() if self.fn else self.value
+
+class Timing:
+    """ms 단위 구간 측정: 최근값, 지수평균, 최근 최대, 누적 합/횟수"""
+    __slots__ = ("name", "help", "last", "avg", "peak", "sum", "count", "_alpha")
+    def __init__(self, name, help="", alpha=0.1):
+        self.name, self.help = name, help
+        self.last = self.avg = self.peak = 0.0
+        self.sum = 0.0
+        self.count = 0
+        self._alpha = alpha
+    def observe(self, ms):
+        self.last = ms
+        if self.count:
+            self.avg += (ms - self.avg) * self._alpha
+        else:
+            self.avg = ms
+        # 최대값은 서서히 감쇠시켜 "최근 피크"로 사용
+        self.peak = ms if ms > self.peak else self.peak * 0.995
+        self.sum += ms
+        self.count += 1
+    def observe_since(self, t0):
+        self.observe((time.perf_counter() - t0) * 1000.0)
+
+class Rate:
+    """Counter 의 초당 변화율 (읽을 때 직전 읽기 대비 계산)"""
+    def __init__(self, counter):
+        self.counter = counter
+        self._t = time.monotonic()
+        self._v = counter.value
+        self.value = 0.0
+    def get(self):
+        now = time.monotonic()
+        dt = now - self._t
+        if dt >= 1.0:
+            self.value = (self.counter.value - self._v) / dt
+            self._t, self._v = now, self.counter.value
+        return self.value
+
+def percentile(xs, p):
+    """최근접 순위 백분위 (p: 0~1, 빈 목록이면 0.0) — 벤치/리포트 집계용"""
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+# ====== 스레드 CPU 시간 (/proc) ======
+def thread_cpu_seconds():
+    """{스레드이름: utime+stime 초} — 파이썬 스레드 이름과 native id 를 /proc/self/task 에 매칭"""
+    out = {}
+    for th in threading.enumerate():
+        tid = getattr(th, "native_id", None)
+        if tid is None:
+            continue
+        try:
+            with open(f"/proc/self/task/{tid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            # ')' 뒤 기준: [11]=utime, [12]=stime
+            out[th.name] = (int(fields[11]) + int(fields[12])) / _CLK_TCK
+        except (OSError, IndexError, ValueError):
+            pass
+    return out
+
+def process_age_s():
+    """이 프로세스가 시작된 뒤 경과 초 (/proc/self/stat starttime, 파이썬 시작·import 시간 포함)"""
+    try:
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        with open("/proc/self/stat") as f:
+            start = int(f.read().rsplit(")", 1)[1].split()[19]) / _CLK_TCK
+        return max(0.0, uptime - start)
+    except (OSError, IndexError, ValueError):
+        return None
+
+# ====== 레지스트리 ======
+class Metrics:
+    def __init__(self):
+        self.frame_ms         = Timing("bus_frame_render_ms", "draw_dashboard 1프레임 합성 시간 (전송 제외)")
+        self.spi_flush_ms     = Timing("bus_spi_flush_ms", "device.display SPI 전송 시간 (flush 스레드)")
+        self.lcd_convert_ms   = Timing("bus_lcd_convert_ms", "프레임 비교 + RGB565 변환 시간 (fb565)")
+        self.lcd_frame_bytes  = Gauge("bus_lcd_frame_bytes", "마지막 프레임 SPI 픽셀 바이트 (바뀐 타일만)")
+        self.lcd_bytes        = Counter("bus_lcd_bytes_total", "LCD 로 보낸 픽셀 바이트 누적")
+        self.frames_dropped   = Counter("bus_frames_dropped_total", "전송 전에 최신 프레임으로 대체된 프레임 수")
+        self.touch_latency_ms = Timing("bus_touch_latency_ms", "터치 감지 → 반영된 프레임 전송 완료")
+        self.key_latency_ms   = Timing("bus_key_latency_ms", "설정 키패드 눌림 감지 → 입력칸 반영 프레임 전송 완료")
+        self.gpio_event_ms    = Timing("bus_gpio_event_ms", "문/버튼 GPIO 엣지 → 처리(서버 송신 큐 투입) 완료")
+        self.ws_rtt_ms        = Gauge("bus_ws_rtt_ms", "WebSocket 왕복 지연 (최소 필터)")
+        self.clock_offset_ms  = Gauge("bus_clock_offset_ms", "서버시계 - 단말시계 추정")
+        self.ride_oneway_ms   = Timing("bus_ride_request_oneway_ms", "ride_request 서버→단말 편도 지연")
+        self.alight_oneway_ms = Timing("bus_alight_request_oneway_ms", "alight_request 서버→단말 편도 지연")
+        self.telemetry_sent   = Counter("bus_telemetry_sent_total", "telemetry 송신 수")
+        self.ws_rx            = Counter("bus_ws_rx_total", "WebSocket 수신 메시지 수")
+        self.out_queue_depth  = Gauge("bus_out_queue_depth", "송신 대기 큐 길이")
+        self.trip_bytes_written = Counter("bus_trip_bytes_written_total", "운행 궤적 파일 기록 바이트")
+        self.trip_upload_bytes  = Counter("bus_trip_upload_bytes_total", "운행 궤적 업로드(서버 저장 확인) 바이트")
+        self.time_error_ms    = Gauge("bus_time_error_ms", "GPS 기준 단말 시계 오차 (마지막 보정 직전, +면 빠름)")
+        self.power_idle       = Gauge("bus_power_idle", "유휴 절전 모드 (1=유휴)")
+        self.current_ma       = Gauge("bus_current_ma", "전원 전류 (hwmon 센서, 있을 때만)")
+        self.gps_fix_at       = Gauge("bus_gps_last_fix_monotonic", "마지막 GPS FIX 시각 (monotonic)")
+        self.boot_interactive_ms = Gauge("bus_boot_interactive_ms", "main.py 시작 → 설정 화면 첫 프레임 전송 완료 (조작 가능)")
+        self.dashboard_ready_ms  = Gauge("bus_dashboard_ready_ms", "bussys 시작 → 대시보드 첫 프레임 전송 완료")
+        self.telemetry_rate   = Rate(self.telemetry_sent)
+        self.overlay          = False   # 화면 오버레이 표시 여부
+
+    def gps_fix_age(self):
+        t = self.gps_fix_at.get()
+        return None if t is None else time.monotonic() - t
+
+    def render_prometheus(self):
+        lines = []
+        def emit(name, kind, help, samples):
+            # samples: [(이름 뒤에 붙는 접미사/레이블, 값)]
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for tail, v in samples:
+                if v is None:
+                    continue
+                lines.append(f"{name}{tail} {v:.6g}" if isinstance(v, float) else f"{name}{tail} {v}")
+
+        for t in (self.frame_ms, self.spi_flush_ms, self.lcd_convert_ms, self.touch_latency_ms, self.key_latency_ms,
+                  self.gpio_event_ms, self.ride_oneway_ms, self.alight_oneway_ms):
+            emit(t.name, "summary", t.help, [("_sum", t.sum), ("_count", t.count)])
+            emit(t.name + "_last", "gauge", t.help + " (최근값)", [("", t.last)])
+            emit(t.name + "_peak", "gauge", t.help + " (최근 피크)", [("", t.peak)])
+        for c in (self.telemetry_sent, self.ws_rx, self.frames_dropped, self.lcd_bytes, self.trip_bytes_written, self.trip_upload_bytes):
+            emit(c.name, "counter", c.help, [("", c.value)])
+        for g in (self.ws_rtt_ms, self.clock_offset_ms, self.out_queue_depth, self.time_error_ms,
+                  self.lcd_frame_bytes, self.power_idle, self.current_ma, self.boot_interactive_ms, self.dashboard_ready_ms):
+            emit(g.name, "gauge", g.help, [("", g.get())])
+        emit("bus_gps_fix_age_seconds", "gauge", "마지막 GPS FIX 이후 경과", [("", self.gps_fix_age())])
+        emit("bus_thread_cpu_seconds_total", "counter", "스레드별 CPU 시간",
+             [(f'{{thread="{n}"}}', v) for n, v in thread_cpu_seconds().items()])
+        emit("bus_process_cpu_seconds_total", "counter", "프로세스 CPU 시간", [("", time.process_time())])
+        return "\n".join(lines) + "\n"
+
+    def overlay_lines(self):
+        """화면 오버레이용 짧은 요약 줄"""
+        fmt = lambda v, unit="": "-" if v is None else f"{v:.0f}{unit}" if isinstance(v, float) else f"{v}{unit}"
+        age = self.gps_fix_age()
+        cpu = time.process_time()
+        return [
+            f"frame {self.frame_ms.avg:.1f}ms (pk {self.frame_ms.peak:.0f})",
+            f"spi {self.spi_flush_ms.avg:.1f}ms {fmt((self.lcd_frame_bytes.get() or 0) / 1024, 'K')}  touch {self.touch_latency_ms.last:.0f}ms",
+            f"rtt {fmt(self.ws_rtt_ms.get(), 'ms')}  tx {self.telemetry_rate.get():.1f}/s  q {fmt(self.out_queue_depth.get())}",
+            f"gps age {fmt(age, 's')}  cpu {cpu:.0f}s  ofs {fmt(self.clock_offset_ms.get(), 'ms')}",
+        ]
+
+METRICS = Metrics()
+
+# ====== Prometheus 텍스트 엔드포인트 ======
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404); return
+        body = METRICS.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # 스크랩마다 stderr 로그 남기지 않음
+
+_server = None
+
+def serve(host=PROM_HOST, port=PROM_PORT):
+    """백그라운드 스레드로 /metrics 제공 (이미 떠 있으면 그대로 반환)"""
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), _Handler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
+
+def shutdown():
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server = None
@@ -0,0 +1,178 @@
+# mqttlink.py — BusAPI MQTT 전송 (paho-mqtt, MQTT 3.1.1 / 5)
+#
+# 단말마다 Node 프로세스 하나에 WebSocket 을 붙드는 대신 브로커(mosquitto 등)를 거친다.
+# 메시지 JSON 은 WebSocket 경로와 바이트 단위로 같고 (hello / telemetry / ping / event / ack / 요청 — handle_message,
+# LatencyTracker, send_reliable 그대로), 주제(topic)와 QoS 만 종류별로 나눈다.
+#   단말 → 서버
+#     buson/v1/vehicle/<차량번호>/telemetry     QoS 0   최신 위치만 의미 있음 (유실 허용)
+#     buson/v1/device/<id>/up/ping               QoS 0   RTT 측정
+#     buson/v1/device/<id>/up/<type>             QoS 1   hello / event(문, 도착·출발) / trip_upload …
+#     buson/v1/device/<id>/status                QoS 1   retain "online", 비정상 종료 시 LWT "offline"
+#   서버 → 단말
+#     buson/v1/device/<id>/down/<type>           QoS 1   ride_request / alight_request / command / ack (장치별 구독)
+# 세션: 고정 client id + 영속 세션 (3.1.1 clean_session=False, 5 는 session expiry) → 끊긴 사이 온 승하차 요청도
+# 재연결하면 받는다. 재연결은 paho 가 1~30초 백오프로, 끊긴 동안 QoS 1 송신은 paho 가 쌓아 두었다가 보낸다.
+#
+#   api = BusAPI(..., server_ip="10.0.0.5", transport="mqtt")    # BusAPI.open_link() 가 MqttLink.connect 호출
+#   api.mqtt_password = cfg.get("mqtt_password")                  # 사용자명은 장치 id
+#   link.online                                                   # 지금 브로커에 붙어 있는지 (connected 는 세션 유지 여부)
+import json, queue, threading, logging
+
+MQTT_PORT        = 1883
+TOPIC_ROOT       = "buson/v1"
+KEEPALIVE_S      = 30
+SESSION_EXPIRY_S = 3600          # MQTT 5: 끊긴 뒤 브로커가 세션(구독 + 못 받은 QoS 1)을 들고 있는 시간
+CONNECT_TIMEOUT  = 3.0
+MAX_QUEUED       = 1000          # 끊긴 동안 쌓아둘 송신 메시지 수
+QOS0_TYPES       = ("telemetry", "ping")
+
+log = logging.getLogger("mqttlink")
+
+# ====== 주제 ======
+def up_topic(device_id, vehicle_no, kind):
+    if kind == "telemetry":
+        return f"{TOPIC_ROOT}/vehicle/{vehicle_no or device_id}/telemetry"
+    return f"{TOPIC_ROOT}/device/{device_id}/up/{kind}"
+
+def down_topic(device_id, kind):
+    return f"{TOPIC_ROOT}/device/{device_id}/down/{kind}"
+
+def status_topic(device_id):
+    return f"{TOPIC_ROOT}/device/{device_id}/status"
+
+def message_type(wire):
+    """JSON 문자열의 type — BusAPI 메시지는 "type" 이 맨 앞이라 다시 파싱하지 않고 잘라 읽음"""
+    if wire.startswith('{"type": "'):
+        end = wire.find('"', 10)
+        if end > 10:
+            return wire[10:end]
+    try:
+        return json.loads(wire).get("type") or "message"
+    except (ValueError, AttributeError):
+        return "message"
+
+def qos_for(kind):
+    return 0 if kind in QOS0_TYPES else 1
+
+def make_client(client_id, v5=False, clean=False):
+    """paho 1.x / 2.x 공용 Client 생성 (없으면 RuntimeError)"""
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError:
+        raise RuntimeError("MQTT 전송에는 paho-mqtt 필요: pip install paho-mqtt")
+    kw = {"client_id": client_id, "protocol": mqtt.MQTTv5 if v5 else mqtt.MQTTv311}
+    if not v5:
+        kw["clean_session"] = clean
+    if hasattr(mqtt, "CallbackAPIVersion"):
+        return mqtt, mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, **kw)
+    return mqtt, mqtt.Client(**kw)
+
+def connect_props(mqtt, v5, expiry=SESSION_EXPIRY_S):
+    """MQTT 5 영속 세션: clean_start=False + session expiry (3.1.1 은 clean_session=False 로 이미 영속)"""
+    if not v5:
+        return {}
+    from paho.mqtt.properties import Properties
+    from paho.mqtt.packettypes import PacketTypes
+    props = Properties(PacketTypes.CONNECT)
+    props.SessionExpiryInterval = expiry
+    return {"clean_start": False, "properties": props}
+
+# ====== 단말 링크 ======
+class MqttLink:
+    """BusAPI.ws 자리에 들어가는 연결: connected / send(text) / recv() / settimeout(s) / close()"""
+    def __init__(self, device_id, vehicle_no, v5=False, password=None):
+        self.device_id, self.vehicle_no = device_id, vehicle_no
+        self.v5 = v5
+        self.mqtt, self.client = make_client(f"buson-{device_id}", v5=v5)
+        # 사용자명 = 장치 id (브로커 ACL 을 장치 주제로 묶기 쉽고, 익명 접속에는 영속 세션을 안 주는 브로커도 있음)
+        self.client.username_pw_set(device_id, password)
+        self.inbox = queue.Queue()
+        self.timeout = None
+        self.online = False
+        self.closed = False
+        self.reconnects = 0
+        self._up = threading.Event()
+        self._down = f"{TOPIC_ROOT}/device/{device_id}/down/"
+        c = self.client
+        c.on_connect = self._on_connect
+        c.on_disconnect = self._on_disconnect
+        c.on_message = self._on_message
+        c.reconnect_delay_set(1, 30)
+        c.max_queued_messages_set(MAX_QUEUED)
+        c.will_set(status_topic(device_id), "offline", qos=1, retain=True)
+
+    @classmethod
+    def connect(cls, api, host, port=MQTT_PORT, timeout=CONNECT_TIMEOUT, v5=False):
+        link = cls(api.device_id, api.vehicle_no, v5=v5, password=getattr(api, "mqtt_password", None))
+        link.client.connect(host, port, KEEPALIVE_S, **connect_props(link.mqtt, v5))
+        link.client.loop_start()
+        if not link._up.wait(timeout):
+            link.close()
+            raise ConnectionError(f"MQTT CONNACK 없음: {host}:{port}")
+        return link
+
+    # -------------------- paho 콜백 (paho 네트워크 스레드) --------------------
+    def _on_connect(self, client, userdata, flags, rc, *rest):
+        if rc != 0:
+            log.warning("MQTT 연결 거부: %s", rc)
+            return
+        if self._up.is_set():
+            self.reconnects += 1
+            log.info("MQTT 재연결")
+        # 영속 세션이 남아 있어도 다시 구독 (브로커가 세션을 잃었을 수 있음, 중복 구독은 무해)
+        client.subscribe(self._down + "#", qos=1)
+        client.publish(status_topic(self.device_id), "online", qos=1, retain=True)
+        self.online = True
+        self._up.set()
+
+    def _on_disconnect(self, client, userdata, *rest):
+        if self.online and not self.closed:
+            log.warning("MQTT 끊김 — 재연결 대기")
+        self.online = False
+
+    def _on_message(self, client, userdata, msg):
+        if not msg.topic.startswith(self._down):      # 구독 밖 주제 (브로커 구현에 따라 섞여 오는 경우) 무시
+            return
+        self.inbox.put(msg.payload.decode("utf-8", errors="replace"))
+
+    # -------------------- websocket-client 와 같은 면 --------------------
+    @property
+    def connected(self):
+        """세션 유지 중이면 True (잠깐 끊겨도 QoS 1 은 쌓였다가 나가므로 BusAPI 는 계속 보냄)"""
+        return not self.closed
+
+    def send(self, wire):
+        kind = message_type(wire)
+        qos = qos_for(kind)
+        if qos == 0 and not self.online:
+            raise ConnectionError("MQTT 끊김 (QoS 0 버림)")
+        info = self.client.publish(up_topic(self.device_id, self.vehicle_no, kind), wire, qos=qos)
+        if info.rc not in (self.mqtt.MQTT_ERR_SUCCESS, self.mqtt.MQTT_ERR_NO_CONN):
+            raise ConnectionError(f"MQTT publish 실패: {info.rc}")
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def queued(self):
+        """paho 가 아직 브로커 확인을 못 받은 QoS 1/2 송신 (끊긴 동안 쌓인 것 포함, 최대 MAX_QUEUED)
+        — 공개 API 가 없어 paho 자신이 max_queued_messages 검사에 쓰는 _out_messages 를 읽음"""
+        return len(getattr(self.client, "_out_messages", ()))
+
+    def recv(self):
+        try:
+            return self.inbox.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.online:
+                self.client.publish(status_topic(self.device_id), "offline", qos=1, retain=True).wait_for_publish(1.0)
+            self.client.disconnect()
+        except Exception:
+            pass
+        self.client.loop_stop()
+        self.online = False
@@ -0,0 +1,306 @@
+# nmeabulk.py — 버스에서 내려받은 GPS 로그(NMEA) 일괄 파싱 → 열 단위 배열 (npz / Parquet)
+#
+# gpsrx.parse_nmea 와 같은 규칙($GPRMC status=A, $GPGGA fix!=0, ddmm.mmmm 좌표)을
+# 한 줄씩이 아니라 파일 전체에 대해 NumPy 로 한 번에 계산한다.
+#   - mmap 으로 파일을 열고 CHUNK_BYTES 단위(줄 경계)로 나눠 처리
+#   - 체크섬: 바이트 누적 XOR(prefix xor) 로 문장마다 cx[*-1] ^ cx[$] 한 번에 계산
+#   - 필드 위치: 쉼표 위치 배열 + searchsorted, 숫자 필드는 2차원 gather 로 한 번에 변환
+#   - 시각: RMC 날짜(ddmmyy)+시각 → UTC epoch ms. GGA 는 직전 RMC 날짜를 이어받음 (자정 넘김 보정)
+#
+#   python3 nmeabulk.py logs/gps-*.nmea -o depot.npz
+#   python3 nmeabulk.py gps.nmea -o gps.parquet --all          # NO_FIX 행도 포함 (fix 열로 구분)
+#   python3 nmeabulk.py gps.nmea --bench                       # 처리 속도만 측정
+#
+# 출력 열: t_ms(int64, 날짜 모르면 -1), kind(1=RMC, 2=GGA), lat, lon(float64),
+#          speed_kmh(float32, GGA 는 NaN), fix(bool), src(uint16 입력 파일 번호)
+import os, sys, mmap, time, json, argparse, traceback
+import numpy as np
+
+CHUNK_BYTES = 64 * 1024 * 1024
+FIELD_W = 12                     # 숫자 필드 최대 길이 (ddmm.mmmmmm / dddmm.mmmmmm 까지)
+KNOT_KMH = 1.852
+
+RMC, GGA = 1, 2
+_DOLLAR, _STAR, _COMMA, _NL = ord("$"), ord("*"), ord(","), ord("\n")
+
+# '0'-'9','A'-'F','a'-'f' → 값, 나머지 → 255
+_HEX = np.full(256, 255, dtype=np.uint8)
+_HEX[ord("0"):ord("9") + 1] = np.arange(10)
+_HEX[ord("A"):ord("F") + 1] = np.arange(10, 16)
+_HEX[ord("a"):ord("f") + 1] = np.arange(10, 16)
+
+# ====== 필드 유틸 ======
+def _gather(buf, start, width):
+    """start[i] 부터 width 바이트씩 2차원으로 (범위 밖은 0)"""
+    idx = start[:, None] + np.arange(width)
+    np.minimum(idx, len(buf) - 1, out=idx)
+    return buf[idx]
+
+def _number(buf, s, e):
+    """[s, e) 구간의 10진수(부호 없음, 소수점 선택) → float64, 빈 필드/이상 문자 NaN
+    자리(열)마다 1차원 연산: 정수 가수 = 가수*10 + 숫자, 소수점 뒤 자릿수로 마지막에 나눔"""
+    n = len(s)
+    if n == 0:
+        return np.empty(0)
+    ln = e - s
+    w = min(FIELD_W, int(ln.max(initial=0)))
+    last = len(buf) - 1
+    mant = np.zeros(n, np.int64)
+    frac = np.zeros(n, np.int64)
+    seen_dot = np.zeros(n, bool)
+    bad = (ln == 0) | (ln > FIELD_W)
+    for j in range(w):
+        c = buf[np.minimum(s + j, last)]
+        inside = ln > j
+        is_dot = inside & (c == 46)
+        d = c - np.uint8(48)                       # uint8 랩어라운드: 숫자면 0..9
+        dig = inside & ~is_dot
+        bad |= dig & (d > 9)
+        dig &= d <= 9
+        mant = np.where(dig, mant * 10 + d, mant)
+        frac += dig & seen_dot
+        seen_dot |= is_dot
+    val = mant / 10.0 ** frac
+    val[bad] = np.nan
+    return val
+
+def _coord(v, hemi, neg_char):
+    """ddmm.mmmm → 도 (gpsrx.convert 와 같은 분리: 소수점 앞 두 자리부터 분)"""
+    deg = np.floor(v / 100.0)
+    out = deg + (v - deg * 100.0) / 60.0
+    return np.where(hemi == neg_char, -out, out)
+
+def _days_from_civil(y, m, d):
+    """그레고리력 → 1970-01-01 기준 일수 (배열 연산)"""
+    y = y - (m <= 2)
+    era = np.floor_divide(y, 400)
+    yoe = y - era * 400
+    mp = (m + 9) % 12
+    doy = (153 * mp + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+class _PrefixXor:
+    """at(p) = buf[0] ^ ... ^ buf[p]. 바이트 단위 accumulate 대신 uint64 단어 단위로 누적"""
+    def __init__(self, buf):
+        n8 = -(-len(buf) // 8) * 8
+        if n8 != len(buf) or buf.ctypes.data % 8:
+            padded = np.zeros(n8, np.uint8)
+            padded[:len(buf)] = buf
+            buf = padded
+        self.words = buf.view("<u8")
+        acc = np.bitwise_xor.accumulate(self.words)
+        self.before = np.concatenate((np.zeros(1, acc.dtype), acc[:-1]))   # 단어 w 앞까지의 누적
+
+    def at(self, p):
+        w, r = p >> 3, (p & 7).astype(np.uint64)
+        # 단어 w 안에서 0..r 바이트만 (little endian)
+        mask = np.where(r == 7, np.uint64(0xFFFFFFFFFFFFFFFF),
+                        (np.uint64(1) << ((r + np.uint64(1)) * np.uint64(8))) - np.uint64(1))
+        x = self.before[w] ^ (self.words[w] & mask)
+        x ^= x >> np.uint64(32)
+        x ^= x >> np.uint64(16)
+        x ^= x >> np.uint64(8)
+        return (x & np.uint64(0xFF)).astype(np.uint8)
+
+# ====== 청크 파싱 ======
+def parse_buffer(buf, carry_day=-1, carry_tod=None, keep_all=False):
+    """
+    buf: uint8 배열 (문장 단위로 잘린 구간)
+    carry_day/carry_tod: 앞 청크 마지막 RMC 의 날짜(epoch 일)/하루 중 시각(ms)
+    반환: (열 dict, 통계 dict, carry_day, carry_tod)
+    """
+    stats = {"sentences": 0, "bad_checksum": 0, "no_fix": 0, "other": 0}
+    dollars = np.flatnonzero(buf == _DOLLAR)
+    stats["sentences"] = len(dollars)
+    if not len(dollars):
+        return _empty(), stats, carry_day, carry_tod
+    nxt_dollar = np.append(dollars[1:], len(buf))
+
+    # 문장 끝('*'): 보통 다음 '$' 바로 앞 "*XX\r\n" 또는 "*XX\n" 이므로 그 자리만 확인하고,
+    # 어긋난 문장(잘린 줄 등)만 전체 '*'/줄바꿈 위치로 다시 찾는다
+    last = len(buf) - 1
+    star = nxt_dollar - 5
+    hit = (star > dollars) & (buf[np.clip(star, 0, last)] == _STAR)
+    lf = ~hit & (nxt_dollar - 4 > dollars) & (buf[np.clip(nxt_dollar - 4, 0, last)] == _STAR)
+    star = np.where(lf, nxt_dollar - 4, star)
+    ok = hit | lf
+    miss = np.flatnonzero(~ok)
+    if len(miss):
+        stars = np.flatnonzero(buf == _STAR)
+        newlines = np.flatnonzero(buf == _NL)
+        dm = dollars[miss]
+        # 청크에 '*' 나 줄바꿈이 하나도 없으면 (잘린 꼬리) 찾을 것이 없음 → 그 문장은 끝 없음(len)
+        k = np.searchsorted(stars, dm)
+        has = k < len(stars)
+        sm = stars[np.minimum(k, len(stars) - 1)] if len(stars) else np.zeros_like(dm)
+        sm = np.where(has, sm, len(buf))
+        kn = np.searchsorted(newlines, dm)
+        nl = newlines[np.minimum(kn, len(newlines) - 1)] if len(newlines) else np.zeros_like(dm)
+        nl = np.where(kn < len(newlines), nl, len(buf))
+        star[miss] = sm
+        ok[miss] = has & (sm < nxt_dollar[miss]) & (sm < nl)
+    ok &= star + 2 <= last
+
+    # 체크섬: '$' 다음부터 '*' 앞까지 XOR = 누적 XOR 두 값의 XOR (누적은 8바이트 단위로)
+    px = _PrefixXor(buf)
+    calc = px.at(np.maximum(star - 1, 0)) ^ px.at(dollars)
+    hi = _HEX[buf[np.minimum(star + 1, last)]]
+    lo = _HEX[buf[np.minimum(star + 2, last)]]
+    given = (hi.astype(np.uint16) << 4) | lo
+    ck_ok = ok & (hi != 255) & (lo != 255) & (calc == given)
+    stats["bad_checksum"] = int((~ck_ok).sum())
+
+    # 문장 종류 ($GPRMC / $GPGGA — gpsrx 와 동일하게 GP talker 만)
+    key = _gather(buf, dollars + 1, 5)
+    is_rmc = (key == np.frombuffer(b"GPRMC", np.uint8)).all(1)
+    is_gga = (key == np.frombuffer(b"GPGGA", np.uint8)).all(1)
+    kind = np.where(is_rmc, RMC, np.where(is_gga, GGA, 0)).astype(np.uint8)
+
+    # 쉼표 → 필드 경계. f(i, n) = 문장 i 의 n 번째 필드 [시작, 끝)
+    commas = np.flatnonzero(buf == _COMMA)
+    c0 = np.searchsorted(commas, dollars)
+    nf = np.searchsorted(commas, star) - c0 + 1         # 필드 수 (= gpsrx 의 len(parts))
+    valid = ck_ok & (((kind == RMC) & (nf >= 12)) | ((kind == GGA) & (nf >= 15)))
+    stats["other"] = int((ck_ok & (kind == 0)).sum())
+
+    sel = np.flatnonzero(valid)
+    kd = kind[sel]
+    c0s, st = c0[sel], star[sel]
+    cm = np.append(commas, len(buf))
+
+    def field(n, rmc_n=None):
+        # RMC/GGA 에서 같은 의미의 필드 번호가 다르면 문장별로 골라 씀
+        fn = np.full(len(sel), n) if rmc_n is None else np.where(kd == RMC, rmc_n, n)
+        s = cm[np.minimum(c0s + fn - 1, len(cm) - 1)] + 1
+        e = np.minimum(cm[np.minimum(c0s + fn, len(cm) - 1)], st)
+        return s, np.maximum(e, s)
+
+    def char(n, rmc_n=None):
+        s, e = field(n, rmc_n)
+        return np.where(e > s, buf[np.minimum(s, len(buf) - 1)], 0)
+
+    # GGA: 2 lat 3 N/S 4 lon 5 E/W 6 fix / RMC: 2 status 3 lat 4 N/S 5 lon 6 E/W 7 속도(knot) 9 날짜
+    tod = _number(buf, *field(1))
+    lat = _number(buf, *field(2, 3))
+    lon = _number(buf, *field(4, 5))
+    lat = _coord(lat, char(3, 4), ord("S"))
+    lon = _coord(lon, char(5, 6), ord("W"))
+    status = char(6, 2)
+    fix = np.where(kd == RMC, status == ord("A"), (status != 0) & (status != ord("0")))
+    fix &= ~np.isnan(lat) & ~np.isnan(lon)
+    spd = _number(buf, *field(7, 7))
+    spd = np.where(kd == RMC, np.nan_to_num(spd) * KNOT_KMH, np.nan).astype(np.float32)
+
+    # 날짜: RMC ddmmyy → epoch 일. GGA 는 직전 RMC 의 날짜를 이어받고, 시각이 되돌아가면 다음 날
+    ds, de = field(9, 9)
+    dg = _gather(buf, ds, 6).astype(np.int64) - ord("0")
+    date_ok = (kd == RMC) & (de - ds == 6) & ((dg >= 0) & (dg <= 9)).all(1)
+    dd, mo, yy = dg[:, 0] * 10 + dg[:, 1], dg[:, 2] * 10 + dg[:, 3], dg[:, 4] * 10 + dg[:, 5]
+    day = np.where(date_ok, _days_from_civil(2000 + yy, mo, dd), -1)
+    tod_ms = np.where(np.isnan(tod), -1, np.round(np.nan_to_num(tod) // 10000 * 3600000
+                                                  + np.nan_to_num(tod) // 100 % 100 * 60000
+                                                  + np.nan_to_num(tod) % 100 * 1000)).astype(np.int64)
+    last = np.maximum.accumulate(np.where(date_ok, np.arange(len(sel)), -1))
+    have = last >= 0
+    base_day = np.where(have, day[np.maximum(last, 0)], carry_day)
+    base_tod = np.where(have, tod_ms[np.maximum(last, 0)], -1 if carry_tod is None else carry_tod)
+    rollover = (kd == GGA) & (base_tod >= 0) & (tod_ms >= 0) & (tod_ms + 12 * 3600000 < base_tod)
+    t_ms = np.where((base_day >= 0) & (tod_ms >= 0),
+                    (base_day + rollover) * 86400000 + tod_ms, -1).astype(np.int64)
+    if date_ok.any():
+        i = np.flatnonzero(date_ok)[-1]
+        carry_day, carry_tod = int(day[i]), int(tod_ms[i])
+
+    stats["no_fix"] = int((~fix).sum())
+    cols = {"t_ms": t_ms, "kind": kd, "lat": lat, "lon": lon, "speed_kmh": spd, "fix": fix}
+    if not keep_all:
+        cols = {k: v[fix] for k, v in cols.items()}
+    return cols, stats, carry_day, carry_tod
+
+def _empty():
+    return {"t_ms": np.empty(0, np.int64), "kind": np.empty(0, np.uint8), "lat": np.empty(0),
+            "lon": np.empty(0), "speed_kmh": np.empty(0, np.float32), "fix": np.empty(0, bool)}
+
+# ====== 파일 ======
+def parse_file(path, keep_all=False, chunk_bytes=CHUNK_BYTES):
+    """한 파일 → (열 dict, 통계). mmap 위에서 줄 경계로 자른 청크 단위 처리"""
+    parts = []
+    stats = {"bytes": 0, "sentences": 0, "bad_checksum": 0, "no_fix": 0, "other": 0}
+    size = os.path.getsize(path)
+    stats["bytes"] = size
+    if size == 0:
+        return _empty(), stats
+    carry_day, carry_tod = -1, None
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        whole = np.frombuffer(mm, dtype=np.uint8)
+        try:
+            pos = 0
+            while pos < size:
+                end = min(pos + chunk_bytes, size)
+                if end < size:
+                    nl = mm.rfind(b"\n", pos, end)
+                    end = nl + 1 if nl > pos else end
+                cols, st, carry_day, carry_tod = parse_buffer(whole[pos:end], carry_day, carry_tod, keep_all)
+                parts.append(cols)
+                for k in st:
+                    stats[k] += st[k]
+                pos = end
+        except BaseException as e:
+            # 예외의 traceback 프레임이 청크 뷰를 쥐고 있으면 mmap 닫기가 BufferError 로 원래 오류를 덮음
+            traceback.clear_frames(e.__traceback__)
+            raise
+        finally:
+            del whole                   # mmap 닫기 전에 버퍼 참조 해제
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}, stats
+
+def parse_files(paths, keep_all=False):
+    cols, stats = [], []
+    for n, p in enumerate(paths):
+        c, s = parse_file(p, keep_all)
+        c["src"] = np.full(len(c["t_ms"]), n, np.uint16)
+        cols.append(c)
+        stats.append({"file": p, **s})
+    out = {k: np.concatenate([c[k] for c in cols]) for k in cols[0]} if cols else _empty()
+    return out, stats
+
+def save(cols, path, files=()):
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow as pa, pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet 출력에는 pyarrow 필요: pip install pyarrow (또는 .npz 로 저장)")
+        table = pa.table(cols)
+        table = table.replace_schema_metadata({"files": json.dumps(list(files), ensure_ascii=False)})
+        pq.write_table(table, path, compression="zstd")
+    else:
+        np.savez_compressed(path, files=np.array(list(files)), **cols)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="NMEA 로그 일괄 파싱 (NumPy)")
+    ap.add_argument("files", nargs="+")
+    ap.add_argument("-o", "--out", help="출력 (.npz 또는 .parquet)")
+    ap.add_argument("--all", action="store_true", help="NO_FIX 행도 포함 (fix 열로 구분)")
+    ap.add_argument("--bench", action="store_true", help="처리 속도만 출력")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    cols, stats = parse_files(args.files, keep_all=args.all)
+    dt = time.perf_counter() - t0
+    n_sent = sum(s["sentences"] for s in stats)
+    n_bytes = sum(s["bytes"] for s in stats)
+    report = {"rows": int(len(cols["t_ms"])), "sentences": n_sent,
+              "bad_checksum": sum(s["bad_checksum"] for s in stats),
+              "seconds": round(dt, 3),
+              "sentences_per_s": round(n_sent / dt) if dt else None,
+              "mb_per_s": round(n_bytes / dt / 1e6, 1) if dt else None}
+    if not args.bench:
+        report["files"] = stats
+    if args.out:
+        save(cols, args.out, args.files)
+        report["out"] = args.out
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
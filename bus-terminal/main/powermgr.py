@@ -0,0 +1,150 @@
+# powermgr.py — 유휴 절전 모드 (백라이트 감광 + 화면/GPS/telemetry 주기 낮춤)
+#
+# 차고지/종점 대기처럼 요청·움직임·터치가 idle_after 초 동안 없으면 유휴로 들어간다.
+#   - 백라이트: idle_backlight (0 = 끔, PWM 백라이트면 1~100 밝기)
+#   - 화면: 시계만 1초마다 (IDLE_FRAME_S)
+#   - GPS 읽기 / telemetry 주기: IDLE_GPS_S / IDLE_TELEM_S
+# 깨우기는 activity() — 터치 IRQ/문/버튼(gpioevents 스레드), GPS 이동, 승하차 요청(BusAPI 스레드) 어디서든
+# 호출하면 그 자리에서 백라이트를 켜고 메인 루프의 wait() 를 바로 깨운다 (다음 프레임에 전체 화면 복귀).
+#
+#   PM = PowerManager(idle_after=300, on_change=apply_power_mode)
+#   PM.activity("touch")                  # 아무 스레드에서나
+#   PM.check(busy=api.status != "idle")   # 메인 루프에서 매 프레임
+#   PM.wait(PM.frame_interval)            # time.sleep 대신 (깨우면 바로 반환)
+#   PM.stats()                            # 상태별 CPU %, 전류(mA) 평균
+import time, threading, logging
+from metrics import METRICS
+
+ACTIVE_FRAME_S = 0.05
+IDLE_FRAME_S   = 1.0      # 유휴 중에는 시계만 초 단위로
+ACTIVE_GPS_S   = 1.0
+IDLE_GPS_S     = 5.0
+ACTIVE_TELEM_S = 0.5
+IDLE_TELEM_S   = 5.0
+MOVE_KMH       = 3.0      # 이보다 빠르면 주행 중 (GPS 깨우기)
+
+log = logging.getLogger("powermgr")
+
+def hwmon_current(path):
+    """INA219 등 hwmon 전류 센서 (curr1_input, mA) 읽기 함수 — 없으면 None"""
+    def read():
+        try:
+            with open(path) as f:
+                return float(f.read().strip())
+        except (OSError, ValueError):
+            return None
+    return read
+
+class PowerManager:
+    def __init__(self, idle_after=300.0, on_change=None, current_fn=None):
+        """
+        on_change(idle: bool) — 상태 전환 직후 (백라이트/주기 반영). 깨울 때는 activity() 를 부른 스레드에서
+        current_fn() → mA 또는 None — 전류 센서 (hwmon_current) 또는 시뮬레이터 모델
+        """
+        self.idle_after = idle_after
+        self.on_change = on_change
+        self.current_fn = current_fn
+        self.lock = threading.Lock()
+        self.idle = False
+        self.last_activity = time.monotonic()
+        self.last_reason = "start"
+        self._wake = threading.Event()
+        # 상태별 측정: [벽시계 초, 프로세스 CPU 초, 전류 표본 합, 표본 수]
+        self._acc = {False: [0.0, 0.0, 0.0, 0], True: [0.0, 0.0, 0.0, 0]}
+        self._t = time.monotonic()
+        self._cpu = time.process_time()
+        self.transitions = 0
+        METRICS.power_idle.set(0)
+
+    # -------------------- 주기 --------------------
+    @property
+    def frame_interval(self):
+        return IDLE_FRAME_S if self.idle else ACTIVE_FRAME_S
+
+    @property
+    def gps_interval(self):
+        return IDLE_GPS_S if self.idle else ACTIVE_GPS_S
+
+    @property
+    def telem_interval(self):
+        return IDLE_TELEM_S if self.idle else ACTIVE_TELEM_S
+
+    # -------------------- 전환 --------------------
+    def activity(self, reason):
+        """사용/운행 신호. 유휴 중이었으면 바로 깨우고 True"""
+        self.last_activity = time.monotonic()
+        self.last_reason = reason
+        if not self.idle:
+            return False
+        with self.lock:
+            if not self.idle:
+                return False
+            self._switch(False)
+        log.info("유휴 해제 (%s)", reason)
+        self._wake.set()
+        return True
+
+    def check(self, busy=False):
+        """메인 루프에서 매 프레임: busy(요청 처리 중 등) 이면 활동으로 간주, 오래 조용하면 유휴로"""
+        self._sample()
+        if busy:
+            self.activity("busy")
+            return
+        if not self.idle and time.monotonic() - self.last_activity >= self.idle_after:
+            with self.lock:
+                if self.idle or time.monotonic() - self.last_activity < self.idle_after:
+                    return
+                self._switch(True)
+            log.info("유휴 진입 (%.0f초 동안 요청/이동/터치 없음)", self.idle_after)
+
+    def _switch(self, idle):
+        self._account()
+        self.idle = idle
+        self.transitions += 1
+        METRICS.power_idle.set(1 if idle else 0)
+        if self.on_change:
+            try:
+                self.on_change(idle)
+            except Exception:
+                log.exception("절전 전환 처리 오류")
+
+    def wait(self, timeout):
+        """time.sleep(timeout) 대신 — activity() 로 깨우면 바로 반환"""
+        if self._wake.wait(timeout):
+            self._wake.clear()
+
+    # -------------------- 측정 --------------------
+    def _account(self):
+        now, cpu = time.monotonic(), time.process_time()
+        acc = self._acc[self.idle]
+        acc[0] += now - self._t
+        acc[1] += cpu - self._cpu
+        self._t, self._cpu = now, cpu
+
+    def _sample(self):
+        if self.current_fn is None:
+            return
+        ma = self.current_fn()
+        if ma is None:
+            return
+        METRICS.current_ma.set(ma)
+        acc = self._acc[self.idle]
+        acc[2] += ma
+        acc[3] += 1
+
+    def stats(self):
+        """{"active"|"idle": {"seconds", "cpu_pct", "current_ma"}, "cpu_reduction_pct", "current_reduction_pct"}"""
+        with self.lock:
+            self._account()
+            out = {}
+            for idle, (wall, cpu, ma_sum, n) in self._acc.items():
+                out["idle" if idle else "active"] = {
+                    "seconds": round(wall, 1),
+                    "cpu_pct": round(100.0 * cpu / wall, 2) if wall > 0 else None,
+                    "current_ma": round(ma_sum / n, 1) if n else None,
+                }
+        a, i = out["active"], out["idle"]
+        for key, name in (("cpu_pct", "cpu_reduction_pct"), ("current_ma", "current_reduction_pct")):
+            out[name] = round(100.0 * (1 - i[key] / a[key]), 1) if a[key] and i[key] is not None else None
+        out["transitions"] = self.transitions
+        return out
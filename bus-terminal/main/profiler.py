@@ -0,0 +1,147 @@
+# profiler.py — 내장 샘플링 프로파일러 + 핫패스 구간(span) 계측
+#
+# - SIGUSR1 또는 대시보드 [X] 길게 누르기로 start() → N초 동안 모든 스레드 스택을
+#   sys._current_frames() 로 샘플링해서 flame graph 용 collapsed-stack 파일로 저장
+#   (flamegraph.pl / speedscope 에 그대로 넣으면 됨)
+# - span("이름"): 프로파일 중일 때만 구간 시간을 누적. 꺼져 있으면 플래그 하나만 확인
+import os, sys, time, signal, threading, logging
+from collections import Counter
+from contextlib import contextmanager
+
+log = logging.getLogger("profiler")
+
+BASE_DIR    = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+
+DEFAULT_HZ       = 100    # 초당 샘플 수
+DEFAULT_DURATION = 10.0   # 초
+
+ACTIVE = False            # span() 이 보는 전역 플래그 (프로파일 중에만 True)
+_spans = {}               # name -> [count, total_ms, max_ms]
+_lock = threading.Lock()
+_thread = None
+
+# ====== 구간 계측 ======
+class _NullSpan:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL = _NullSpan()
+
+class _Span:
+    __slots__ = ("name", "t0")
+    def __init__(self, name):
+        self.name = name
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+    def __exit__(self, *exc):
+        ms = (time.perf_counter() - self.t0) * 1000.0
+        with _lock:
+            st = _spans.get(self.name)
+            if st is None:
+                _spans[self.name] = [1, ms, ms]
+            else:
+                st[0] += 1; st[1] += ms
+                if ms > st[2]: st[2] = ms
+        return False
+
+def span(name):
+    """with profiler.span("draw_dashboard"): ...  (비활성 시 공유 no-op 객체 반환)"""
+    return _Span(name) if ACTIVE else _NULL
+
+def hot_path(name):
+    """함수 전체를 span 으로 감싸는 데코레이터"""
+    def deco(fn):
+        def wrapper(*args, **kwargs):
+            if not ACTIVE:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__wrapped__ = fn
+        return wrapper
+    return deco
+
+# ====== 스택 샘플러 ======
+def _collapse(frame):
+    parts = []
+    while frame is not None:
+        co = frame.f_code
+        parts.append(f"{co.co_name} ({os.path.basename(co.co_filename)}:{co.co_firstlineno})")
+        frame = frame.f_back
+    parts.reverse()
+    return ";".join(parts)
+
+class SamplingProfiler(threading.Thread):
+    def __init__(self, hz=DEFAULT_HZ, duration=DEFAULT_DURATION, out_dir=PROFILE_DIR):
+        super().__init__(daemon=True, name="profiler")
+        self.interval = 1.0 / hz
+        self.duration = duration
+        self.out_dir = out_dir
+        self.stacks = Counter()
+        self.samples = 0
+        self.path = None
+
+    def run(self):
+        global ACTIVE
+        names = {}
+        me = threading.get_ident()
+        ACTIVE = True
+        with _lock:
+            _spans.clear()
+        t_end = time.monotonic() + self.duration
+        next_t = time.monotonic()
+        try:
+            while time.monotonic() < t_end:
+                for th in threading.enumerate():
+                    names[th.ident] = th.name
+                for tid, frame in sys._current_frames().items():
+                    if tid == me:
+                        continue
+                    self.stacks[f"{names.get(tid, tid)};{_collapse(frame)}"] += 1
+                self.samples += 1
+                next_t += self.interval
+                delay = next_t - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_t = time.monotonic()   # 밀렸으면 따라잡지 않고 다시 맞춤
+        finally:
+            ACTIVE = False
+        self.path = self._write()
+
+    def _write(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.out_dir, f"profile-{stamp}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        with _lock:
+            spans = sorted(_spans.items(), key=lambda kv: -kv[1][1])
+        with open(path[:-len(".folded")] + ".spans.txt", "w", encoding="utf-8") as f:
+            f.write("name\tcount\ttotal_ms\tavg_ms\tmax_ms\n")
+            for name, (n, total, mx) in spans:
+                f.write(f"{name}\t{n}\t{total:.1f}\t{total / n:.2f}\t{mx:.1f}\n")
+        log.warning("프로파일 저장: %s (%d 샘플)", os.path.basename(path), self.samples)
+        return path
+
+def running():
+    return _thread is not None and _thread.is_alive()
+
+def start(hz=DEFAULT_HZ, duration=DEFAULT_DURATION):
+    """프로파일 시작 (이미 실행 중이면 무시하고 False)"""
+    global _thread
+    if running():
+        return False
+    _thread = SamplingProfiler(hz=hz, duration=duration)
+    _thread.start()
+    log.warning("프로파일 시작: %dHz × %.0f초", hz, duration)
+    return True
+
+def install_signal(sig=signal.SIGUSR1, hz=DEFAULT_HZ, duration=DEFAULT_DURATION):
+    """kill -USR1 <pid> 로 프로파일 시작 (메인 스레드에서 호출해야 함)"""
+    signal.signal(sig, lambda signum, frame: start(hz, duration))
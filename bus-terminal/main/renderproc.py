@@ -0,0 +1,292 @@
+# renderproc.py — 대시보드 합성 + LCD 전송을 별도 프로세스에서 (GIL 분리)
+#
+# 메인 프로세스(WS 수신/GPS/GPIO/비프/음성)와 PIL 글자 렌더링이 GIL 하나를 두고 다투면
+# 글자 많은 프레임 동안 WS 처리가 밀린다. 이 모듈은 합성과 SPI 전송을 다른 코어의 프로세스로 옮긴다.
+#
+#   메인 → 렌더 : Queue 로 ("frame", seq, 스냅샷, 새 콘솔 줄, 콘솔 offset) — 기본 타입만이라 pickle 이 가벼움
+#                 렌더 쪽은 밀린 메시지를 모두 꺼내 콘솔 줄은 전부 반영하고 그리기는 마지막 것만 (최신 프레임 우선)
+#   프레임버퍼 : multiprocessing.shared_memory
+#                 [0] 렌더 프로세스가 마지막으로 내보낸 화면 (메인에서 frame() 으로 스크린샷)
+#                 [1] 메인이 직접 만든 전체 화면 이미지 (draw_status 등) → ("blit", seq) 로 알림
+#   렌더 → 메인 : ("done", seq, 통계) — 메인의 리더 스레드가 METRICS 반영 + on_flushed 콜백 호출
+#   렌더 쪽이 죽으면 : 리더 스레드가 남은 on_flushed 를 모두 호출(그 프레임은 안 나감 — 기다리는 쪽이 멈추지 않게)하고
+#                 on_exit() 으로 알림 (bussys 는 DISPLAY.redirect = None 으로 직접 그리기 복귀)
+#   공유 메모리 : 죽거나 stop() 하면 바로 unlink, 메인이 비정상 종료해도 atexit 으로 (/dev/shm 에 남지 않게)
+#   경보 띠     : 스냅샷에 실린 시각표(alertanim) 대로 렌더 프로세스가 정시에 직접 전환
+#
+# 렌더 프로세스는 fork 로 만든다: 이미 초기화된 luma 장치/폰트/프레임버퍼를 그대로 물려받고
+# (spawn 이면 bussys 모듈 전체가 다시 import 되어 GPIO/비프/사운드 초기화가 한 번 더 돈다)
+# 그래서 스레드가 하나도 없을 때 — bussys.main() 맨 처음 — 시작해야 한다.
+#
+#   RENDER = RenderProcess(device.size, CONSOLE, on_exit=...).start()
+#   DISPLAY.redirect = RENDER.show_image       # 메인 프로세스의 나머지 화면 출력도 렌더 프로세스로
+#   RENDER.submit(bussys.dashboard_state(...), on_flushed)
+import time, queue, signal, threading, logging, traceback, atexit
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from PIL import Image
+from metrics import METRICS
+
+log = logging.getLogger("renderproc")
+
+class RenderProcess:
+    def __init__(self, size, console, on_exit=None):
+        """
+        console: 메인 프로세스의 ConsoleView (ring 의 새 줄과 offset 만 보냄)
+        on_exit: 렌더 프로세스가 stop() 없이 끝났을 때 리더 스레드에서 한 번 호출
+        """
+        w, h = size
+        self.size = size
+        self.console = console
+        self.on_exit = on_exit
+        self.ctx = mp.get_context("fork")
+        self.shm = shared_memory.SharedMemory(create=True, size=2 * w * h * 3)
+        self._unlinked = False
+        atexit.register(self._unlink)
+        frames = np.ndarray((2, h, w, 3), np.uint8, buffer=self.shm.buf)
+        self.out, self.inbox = frames[0], frames[1]
+        self.lock = self.ctx.Lock()             # 공유 프레임버퍼 읽기/쓰기
+        self.inq = self.ctx.Queue()
+        self.outq = self.ctx.Queue()
+        self.seq = 0
+        self.done_seq = 0
+        self.console_seq = 0
+        self.callbacks = {}                     # seq -> [on_flushed]
+        self.cb_lock = threading.Lock()
+        ring = console.ring
+        self.proc = self.ctx.Process(
+            target=_worker, name="bus-render", daemon=True,
+            args=(self.out, self.inbox, self.lock, self.inq, self.outq,
+                  (ring.history, ring.width, ring.line_h, console.rows, console.fg, console.bg)))
+        self._reader = None
+        self._stopping = False
+        self.closed = False                     # 리더 스레드가 끝남 (더는 done 이 오지 않음)
+
+    def start(self):
+        self.proc.start()
+        self._reader = threading.Thread(target=self._read, name="render-rx", daemon=True)
+        self._reader.start()
+        log.info("렌더 프로세스 시작 (pid %s)", self.proc.pid)
+        return self
+
+    def alive(self):
+        return self.proc.is_alive()
+
+    # -------------------- 메인 → 렌더 --------------------
+    def _next(self, on_flushed):
+        self.seq += 1
+        if on_flushed:
+            with self.cb_lock:
+                self.callbacks[self.seq] = on_flushed
+        return self.seq
+
+    def submit(self, snap, on_flushed=None):
+        """대시보드 스냅샷 전송. 렌더 프로세스가 죽었으면 False"""
+        if not self.proc.is_alive():
+            return False
+        self.console_seq, lines = self.console.ring.since(self.console_seq)
+        self.inq.put(("frame", self._next(on_flushed), snap, lines, self.console.offset))
+        return True
+
+    def show_image(self, img, on_flushed=None):
+        """메인 프로세스에서 만든 전체 화면 이미지 표시 (lcdsystem.DISPLAY.redirect 용)"""
+        if self.closed:
+            return                              # on_exit 이 redirect 를 풀기 직전에 들어온 것
+        a = np.asarray(img.convert("RGB") if img.mode != "RGB" else img)
+        with self.lock:
+            self.inbox[:] = a
+        self.inq.put(("blit", self._next(on_flushed)))
+
+    def frame(self):
+        """지금 화면에 나가 있는 프레임 사본 (스크린샷)"""
+        with self.lock:
+            return Image.fromarray(self.out.copy())
+
+    # -------------------- 렌더 → 메인 --------------------
+    def _read(self):
+        try:
+            self._read_loop()
+        finally:
+            self._closed()
+
+    def _read_loop(self):
+        while True:
+            try:
+                msg = self.outq.get(timeout=1.0)
+            except queue.Empty:
+                if not self.proc.is_alive():
+                    log.error("렌더 프로세스 종료됨 (exitcode %s)", self.proc.exitcode)
+                    return
+                continue
+            except (EOFError, OSError):
+                log.error("렌더 프로세스 연결 끊김")
+                return
+            kind = msg[0]
+            if kind == "done":
+                _, seq, st = msg
+                self.done_seq = seq
+                if st.get("compose_ms") is not None:
+                    METRICS.frame_ms.observe(st["compose_ms"])
+                METRICS.spi_flush_ms.observe(st["flush_ms"])
+                if st.get("convert_ms") is not None:
+                    METRICS.lcd_convert_ms.observe(st["convert_ms"])
+                    METRICS.lcd_frame_bytes.set(st["bytes"])
+                    METRICS.lcd_bytes.inc(st["bytes"])
+                if st["dropped"]:
+                    METRICS.frames_dropped.inc(st["dropped"])
+                # 건너뛴(대체된) 프레임의 콜백도 이번 프레임이 나간 시점에 호출
+                with self.cb_lock:
+                    ready = [k for k in self.callbacks if k <= seq]
+                    cbs = [self.callbacks.pop(k) for k in sorted(ready)]
+                for cb in cbs:
+                    try: cb()
+                    except Exception: log.exception("on_flushed 콜백 오류")
+            elif kind == "error":
+                log.error("렌더 프로세스 오류:\n%s", msg[1])
+            elif kind == "exit":
+                return
+
+    def _closed(self):
+        """리더 스레드 종료 — 더 나갈 프레임이 없으니 남은 콜백 정리 + 알림"""
+        self.closed = True
+        with self.cb_lock:
+            cbs = [self.callbacks.pop(k) for k in sorted(self.callbacks)]
+        for cb in cbs:
+            try: cb()
+            except Exception: log.exception("on_flushed 콜백 오류")
+        if self._stopping:
+            return
+        self._unlink()      # 매핑(out/inbox)은 그대로 — frame() 은 stop() 전까지 계속 동작
+        if self.on_exit:
+            try: self.on_exit()
+            except Exception: log.exception("on_exit 콜백 오류")
+
+    def _unlink(self):
+        if self._unlinked:
+            return
+        self._unlinked = True
+        try:
+            self.shm.unlink()
+        except Exception:
+            pass
+
+    def stop(self, timeout=2.0):
+        self._stopping = True
+        try:
+            self.inq.put(("stop",))
+            self.proc.join(timeout)
+        except Exception:
+            pass
+        finally:
+            if self.proc.is_alive():
+                self.proc.terminate()
+                self.proc.join(1.0)
+            self.out = self.inbox = None
+            self._unlink()
+            try:
+                self.shm.close()
+            except Exception:
+                pass
+            atexit.unregister(self._unlink)
+
+# ====== 렌더 프로세스 ======
+def _worker(out, inbox, lock, inq, outq, console_args):
+    # 터미널 Ctrl+C 는 메인이 받아서 stop() 으로 정리
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        # fork 로 물려받은 패널/프레임버퍼 (메인은 redirect 이후 SPI 를 건드리지 않음)
+        import lcdsystem
+        from dashboard import DashboardScreen
+        from console import RingLog, ConsoleView
+        display = lcdsystem.DISPLAY
+        display.threaded = False                # 이 프로세스에서는 합성 후 바로 전송
+        history, width, line_h, rows, fg, bg = console_args
+        ring = RingLog(history=history, font=lcdsystem.FONT_MONO, width=width, line_h=line_h)
+        view = ConsoleView(ring, rows=rows, fg=fg, bg=bg)
+        dash = DashboardScreen(view)
+        parent = mp.parent_process()
+    except Exception:
+        outq.put(("error", traceback.format_exc()))
+        return
+
+    running = True
+    nxt = None                                  # 경보 띠 다음 전환 시각 (alertanim, 대시보드가 보일 때만)
+    while running:
+        timeout = 1.0 if nxt is None else min(1.0, max(0.0, nxt - time.monotonic()))
+        try:
+            batch = [inq.get(timeout=timeout)]
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                break
+            if nxt is not None and time.monotonic() >= nxt:
+                # 메인 프로세스 프레임을 기다리지 않고 정시에 띠만 전환
+                try:
+                    nxt = dash.tick(time.monotonic())
+                    if dash.dirty:
+                        dash.render()
+                        with lock:
+                            out[:] = np.asarray(dash.canvas)
+                        display.submit(dash.canvas)
+                except Exception:
+                    nxt = None
+                    outq.put(("error", traceback.format_exc()))
+            continue
+        while True:
+            try:
+                batch.append(inq.get_nowait())
+            except queue.Empty:
+                break
+
+        last = None
+        frames_in = 0
+        for m in batch:
+            if m[0] == "stop":
+                running = False
+            elif m[0] == "frame":
+                for line in m[3]:
+                    ring.add_text(line)
+                last = m
+                frames_in += 1
+            elif m[0] == "blit":
+                last = m
+                frames_in += 1
+        if last is None:
+            continue
+
+        try:
+            t0 = time.perf_counter()
+            compose_ms = None
+            if last[0] == "frame":
+                view.offset = last[4]
+                dash.update(last[2])
+                nxt = dash.tick(time.monotonic())
+                dash.render()
+                img = dash.canvas
+                compose_ms = (time.perf_counter() - t0) * 1000.0
+                with lock:
+                    out[:] = np.asarray(img)
+            else:
+                with lock:
+                    out[:] = inbox
+                    img = Image.fromarray(inbox.copy())
+                dash.invalidate_all()           # 다음 대시보드 프레임은 전체 다시 그림
+                nxt = None
+            t1 = time.perf_counter()
+            display.submit(img)
+            flush_ms = (time.perf_counter() - t1) * 1000.0
+            fb = display.fb
+            outq.put(("done", last[1], {
+                "compose_ms": compose_ms, "flush_ms": flush_ms,
+                "convert_ms": fb.last_convert_ms if fb else None,
+                "bytes": fb.last_bytes if fb else 0,
+                "dropped": frames_in - 1,
+            }))
+        except Exception:
+            outq.put(("error", traceback.format_exc()))
+
+    try:
+        display.stop()
+    except Exception:
+        pass
+    outq.put(("exit",))
@@ -0,0 +1,288 @@
+# replay.py — 단말 입력 기록(record) / 재생(replay)
+#
+# 기록: WS 수신 프레임, GPIO 엣지(BUTTON_PIN/DOOR_PIN), GPS NMEA 원본 바이트, 터치 샘플을
+#       시간순 바이너리 로그(.brec)로 저장. 기록 호출은 메모리 버퍼에 붙이기만 하고
+#       디스크 쓰기는 1초마다 flusher 스레드가 한다.
+# 재생: 시뮬레이션 하드웨어(simhw) 위에서 bussys 의 입력 처리 경로로 다시 흘려보낸다.
+#       1배속 또는 최대 속도(--speed 0), 결과 상태 변화의 digest 로 회귀 테스트 가능.
+#
+#   python3 replay.py recordings/shift-20251020-0800.brec --speed 0
+#   python3 replay.py shift.brec --speed 0 --expect 3f2a…   (불일치 시 종료코드 1)
+#
+# 파일 형식
+#   헤더: b"BUSREC\x01\n" + varint(len) + meta(JSON, utf-8)
+#   레코드: varint(직전 레코드 대비 μs) + kind(1B) + varint(len) + payload
+import os, sys, json, time, struct, threading, hashlib, argparse
+from metrics import percentile
+
+MAGIC = b"BUSREC\x01\n"
+
+WS_IN, GPIO_EDGE, NMEA, TOUCH = 1, 2, 3, 4
+KIND_NAMES = {WS_IN: "ws", GPIO_EDGE: "gpio", NMEA: "nmea", TOUCH: "touch"}
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REC_DIR  = os.path.join(BASE_DIR, "recordings")
+
+# ====== varint ======
+def _varint(n, out):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _read_varint(buf, i):
+    shift = n = 0
+    while True:
+        b = buf[i]; i += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, i
+        shift += 7
+
+# ====== 기록 ======
+class Recorder:
+    FLUSH_EVERY = 1.0
+
+    def __init__(self):
+        self.active = False
+        self.path = None
+        self.lock = threading.Lock()
+        self._buf = bytearray()
+        self._last_ns = 0
+        self._f = None
+        self._stop = threading.Event()
+        self.records = 0
+
+    def start(self, path, meta=None):
+        if self.active:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "wb")
+        head = bytearray(MAGIC)
+        m = json.dumps({"start": time.time(), **(meta or {})}, ensure_ascii=False).encode("utf-8")
+        _varint(len(m), head)
+        head += m
+        self._f.write(head)
+        self.path = path
+        self._last_ns = time.monotonic_ns()
+        self._stop.clear()
+        self.active = True
+        threading.Thread(target=self._flusher, name="recorder", daemon=True).start()
+
+    def _put(self, kind, payload):
+        now = time.monotonic_ns()
+        with self.lock:
+            b = self._buf
+            _varint((now - self._last_ns) // 1000, b)
+            self._last_ns = now
+            b.append(kind)
+            _varint(len(payload), b)
+            b += payload
+            self.records += 1
+
+    def ws_in(self, raw):
+        self._put(WS_IN, raw.encode("utf-8") if isinstance(raw, str) else raw)
+
+    def gpio(self, pin, level):
+        self._put(GPIO_EDGE, bytes((pin, 1 if level else 0)))
+
+    def nmea(self, raw):
+        self._put(NMEA, raw)
+
+    def touch(self, pos):
+        """pos=(x,y) 눌림/이동, None 떼어짐"""
+        self._put(TOUCH, b"" if pos is None else struct.pack("<hh", *pos))
+
+    def _swap(self):
+        with self.lock:
+            data, self._buf = self._buf, bytearray()
+        return data
+
+    def _flusher(self):
+        while not self._stop.wait(self.FLUSH_EVERY):
+            data = self._swap()
+            if data:
+                self._f.write(data)
+                self._f.flush()
+
+    def stop(self):
+        if not self.active:
+            return
+        self.active = False
+        self._stop.set()
+        self._f.write(self._swap())
+        self._f.close()
+        self._f = None
+
+RECORDER = Recorder()
+
+def start_recording(meta=None):
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    RECORDER.start(os.path.join(REC_DIR, f"shift-{stamp}.brec"), meta)
+    return RECORDER.path
+
+# ====== 읽기 ======
+def read_log(path):
+    """(meta, [(t초, kind, payload), ...])"""
+    with open(path, "rb") as f:
+        buf = f.read()
+    if not buf.startswith(MAGIC):
+        raise ValueError(f"기록 파일 아님: {path}")
+    n, i = _read_varint(buf, len(MAGIC))
+    meta = json.loads(buf[i:i + n].decode("utf-8"))
+    i += n
+    recs = []
+    t_us = 0
+    end = len(buf)
+    try:
+        while i < end:
+            dt, i = _read_varint(buf, i)
+            kind = buf[i]; i += 1
+            ln, i = _read_varint(buf, i)
+            if i + ln > end:
+                break                       # 전원 차단 등으로 잘린 마지막 레코드
+            t_us += dt
+            recs.append((t_us / 1e6, kind, bytes(buf[i:i + ln])))
+            i += ln
+    except IndexError:
+        pass
+    return meta, recs
+
+# ====== 재생 ======
+class _CaptureWS:
+    """BusAPI.ws 대체: 송신 메시지를 기록만 함"""
+    connected = True
+    def __init__(self, sink):
+        self.sink = sink
+    def send(self, data):
+        self.sink(json.loads(data))
+    def close(self): pass
+
+class ReplayHarness:
+    """simhw 위에서 bussys 입력 처리 경로 그대로 재생"""
+    def __init__(self, meta, render=False):
+        import simhw
+        simhw.install()
+        import bussys
+        from busapi import BusAPI
+        self.simhw = simhw
+        self.bs = bussys
+        self.render = render
+        self.trace = []
+        self.sent = 0
+
+        # ride_request 처리 시 config.json 을 쓰므로 실제 설정 파일 대신 임시 사본 사용
+        tmp = os.path.join(REC_DIR, ".replay-config.json")
+        os.makedirs(REC_DIR, exist_ok=True)
+        with open(tmp, "w") as f:
+            json.dump({k: meta.get(k, "") for k in ("device_id", "server_ip", "vehicle_no", "bus_no")}, f)
+        bussys.CONF_PATH = tmp
+        bussys.TRIPS.trip_dir = os.path.join(REC_DIR, ".replay-trips")
+        # set_status() 가 상태 저널을 쓰므로 — 실제 state.json 에 쓰면 다음 bussys 시작 때 가짜 요청 경보로 복원됨
+        bussys.JOURNAL.path = os.path.join(REC_DIR, ".replay-state.json")
+        # 프레임 수가 재생마다 같도록 flush 스레드 없이 바로 전송
+        import lcdsystem
+        lcdsystem.DISPLAY.threaded = False
+        self.display = lcdsystem.DISPLAY
+
+        self.api = BusAPI(device_id=meta.get("device_id", ""), bus_no=meta.get("bus_no", ""),
+                          vehicle_no=meta.get("vehicle_no", ""), server_ip="127.0.0.1")
+        self.api.ws = _CaptureWS(self._on_send)
+        self.api.connected = True
+        self.api.status = "idle"
+        bussys.bind_api_handlers(self.api)
+        self.wscli = type("ReplayWS", (), {"state": "CONNECTED", "last_err": "", "rtt_ms": None, "api": self.api})()
+        self.gps = bussys.GPSPoller()
+        self.inputs = bussys.InputState()
+        # 기록된 엣지는 이미 디바운스된 것이므로 잠금 없이, 콜백 안에서 바로 처리 (결정적 순서)
+        self.gpio_ev = bussys.start_gpio_events(self.inputs, lambda: self.api, threaded=False, debounce=False)
+        self._last = None
+
+    def _on_send(self, obj):
+        self.sent += 1
+        if obj.get("type") != "telemetry" and obj.get("type") != "ping":
+            self.trace.append(("send", obj.get("type"), obj.get("event"), json.dumps(obj.get("payload"), sort_keys=True)))
+
+    def apply(self, kind, payload):
+        bs, hw = self.bs, self.simhw
+        if kind == WS_IN:
+            self.api.handle_message(json.loads(payload), time.time() * 1000.0)
+        elif kind == GPIO_EDGE:
+            hw.GPIO.set_level(payload[0], payload[1])      # → 엣지 콜백 → handle_gpio_event
+        elif kind == NMEA:
+            hw.SERIAL.feed(payload)
+            self.gps.poll_once()
+        elif kind == TOUCH:
+            if payload:
+                hw.TOUCH.press(*struct.unpack("<hh", payload))
+            else:
+                hw.TOUCH.release()
+            bs.poll_touch(self.inputs)
+        if self.render:
+            bs.draw_dashboard(self.wscli, self.gps, self.api)
+        state = (self.api.status, self.api.current_stop_name, self.gps.status)
+        if state != self._last:
+            self.trace.append(("state",) + state)
+            self._last = state
+
+    def digest(self):
+        h = hashlib.sha1()
+        for ev in self.trace:
+            h.update(repr(ev).encode("utf-8"))
+        return h.hexdigest()
+
+def replay(path, speed=0.0, render=False):
+    """speed=1.0 이면 기록 당시 간격대로, 0 이면 최대 속도"""
+    meta, recs = read_log(path)
+    h = ReplayHarness(meta, render=render)
+    # 실시간 재생일 때만 기록된 GPS 시각으로 시계 보정 (빨리 감기면 매 줄이 시계 점프가 됨)
+    import timesvc
+    timesvc.CLOCK.discipline = speed == 1.0
+    lat = {k: [] for k in KIND_NAMES}
+    t_start = time.perf_counter()
+    for t, kind, payload in recs:
+        if speed:
+            delay = t / speed - (time.perf_counter() - t_start)
+            if delay > 0:
+                time.sleep(delay)
+        t0 = time.perf_counter()
+        h.apply(kind, payload)
+        lat[kind].append((time.perf_counter() - t0) * 1000.0)
+    wall = time.perf_counter() - t_start
+    h.gpio_ev.stop()
+    report = {
+        "file": os.path.basename(path),
+        "records": len(recs),
+        "span_s": round(recs[-1][0], 3) if recs else 0,
+        "wall_s": round(wall, 3),
+        "records_per_s": round(len(recs) / wall, 1) if wall else None,
+        "sent": h.sent,
+        "final_status": h.api.status,
+        "digest": h.digest(),
+        "handler_ms": {
+            KIND_NAMES[k]: {"n": len(v), "mean": round(sum(v) / len(v), 3),
+                            "p50": round(percentile(v, 0.5), 3), "p99": round(percentile(v, 0.99), 3),
+                            "max": round(max(v), 3)}
+            for k, v in lat.items() if v
+        },
+    }
+    if render:
+        report["frames"] = h.display.frames
+    return report
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="단말 입력 기록 재생")
+    ap.add_argument("log")
+    ap.add_argument("--speed", type=float, default=0.0, help="1=실시간, 0=최대 속도 (기본)")
+    ap.add_argument("--render", action="store_true", help="레코드마다 draw_dashboard 도 실행")
+    ap.add_argument("--expect", help="이 digest 와 다르면 종료코드 1 (회귀 테스트)")
+    args = ap.parse_args(argv)
+    report = replay(args.log, speed=args.speed, render=args.render)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.expect and args.expect != report["digest"]:
+        print(f"digest 불일치: 기대 {args.expect}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
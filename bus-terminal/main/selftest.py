@@ -0,0 +1,107 @@
+# selftest.py — 부팅 자가 점검 (터치 / GPS 시리얼 / 오디오 / 서버) 동시 실행
+#
+# 예전에는 main.py 가 서버 접속만, 그것도 설정 마법사가 끝난 뒤에 확인했다 (하드웨어는 점검 안 함).
+# 여기서는 점검마다 스레드 하나씩 동시에 돌리고 끝나는 대로 알려서 부팅 화면이 한 줄씩 채워진다.
+# 전체 시간 = 가장 느린 점검 (최대 TIMEOUT_S, 넘으면 "시간 초과"로 표시하고 진행).
+# 결과 콜백은 run() 을 부른 스레드(UI 루프)에서 불린다 — 화면 위젯을 바로 고쳐도 됨.
+#
+#   checks = selftest.default_checks(touch, server=lambda: connect_server(cfg["server_ip"]))
+#   results = selftest.run(checks, on_result=screen.show_result)
+#   results["gps"]  → {"ok": True, "detail": "NMEA 수신 (FIX)", "ms": 412.0}
+import time, queue, threading, logging
+
+log = logging.getLogger("selftest")
+
+TIMEOUT_S  = 3.0
+GPS_PORT   = "/dev/serial0"       # gpsrx.read_gps 와 같은 포트/속도
+GPS_BAUD   = 9600
+GPS_WAIT_S = 2.0                  # 1Hz 모듈이면 문장 한 묶음이 들어올 시간
+
+TITLES = {"touch": "터치", "gps": "GPS", "audio": "오디오", "server": "서버"}
+
+# ====== 점검 항목 — 각각 (ok, 설명) 반환, 예외는 실패로 ======
+def check_touch(touch):
+    """XPT2046 온도 채널(TEMP0) 변환값 — 응답 없는 컨트롤러는 0 또는 4095 로 고정"""
+    if not hasattr(touch, "_xfer"):
+        return True, "시뮬레이션"
+    r = touch._xfer(0x84)
+    v = ((r[1] << 8) | r[2]) >> 3
+    if 0 < v < 4095:
+        return True, f"응답 정상 ({v})"
+    return False, f"응답 없음 ({v})"
+
+def check_gps(port=GPS_PORT, baud=GPS_BAUD, wait_s=GPS_WAIT_S):
+    import serial
+    fix = False
+    got = 0
+    with serial.Serial(port, baudrate=baud, timeout=0.5) as ser:
+        end = time.monotonic() + wait_s
+        while time.monotonic() < end:
+            line = ser.readline().decode("ascii", errors="ignore").strip()
+            if not line.startswith("$G"):
+                continue
+            got += 1
+            parts = line.split(",")
+            if parts[0][3:] == "RMC" and len(parts) > 2 and parts[2] == "A":
+                fix = True
+                break
+            if got >= 3:
+                break
+    if not got:
+        return False, "NMEA 없음"
+    return True, "NMEA 수신 (FIX)" if fix else "NMEA 수신 (FIX 전)"
+
+def check_audio():
+    """ALSA 사운드 카드 (pygame.mixer 를 여는 것보다 훨씬 쌈)"""
+    try:
+        with open("/proc/asound/cards") as f:
+            lines = [l.strip() for l in f if l.strip() and l.strip()[0].isdigit()]
+    except OSError:
+        return False, "ALSA 없음"
+    if not lines:
+        return False, "사운드 카드 없음"
+    return True, lines[0].split(":", 1)[-1].strip()[:24]
+
+def default_checks(touch, server=None):
+    """[(이름, fn)] — server: () -> (ok, 사유) (없으면 서버 점검 생략)"""
+    checks = [("touch", lambda: check_touch(touch)), ("gps", check_gps), ("audio", check_audio)]
+    if server is not None:
+        def check_server():
+            ok, reason = server()
+            return ok, "접속 정상" if ok else reason
+        checks.append(("server", check_server))
+    return checks
+
+# ====== 실행 ======
+def _one(name, fn, out):
+    t0 = time.perf_counter()
+    try:
+        ok, detail = fn()
+    except Exception as e:
+        ok, detail = False, str(e) or type(e).__name__
+    out.put((name, bool(ok), detail, (time.perf_counter() - t0) * 1000.0))
+
+def run(checks, on_result=None, timeout=TIMEOUT_S):
+    """점검을 모두 동시에 시작, 끝나는 순서대로 on_result(name, ok, detail, ms) → {name: 결과}"""
+    out = queue.Queue()
+    for name, fn in checks:
+        threading.Thread(target=_one, args=(name, fn, out), name=f"selftest-{name}", daemon=True).start()
+    results = {}
+    end = time.monotonic() + timeout
+    while len(results) < len(checks):
+        try:
+            name, ok, detail, ms = out.get(timeout=max(0.0, end - time.monotonic()))
+        except queue.Empty:
+            break
+        results[name] = {"ok": ok, "detail": detail, "ms": round(ms, 1)}
+        if on_result:
+            on_result(name, ok, detail, ms)
+    for name, _ in checks:
+        if name not in results:
+            results[name] = {"ok": False, "detail": "시간 초과", "ms": timeout * 1000.0}
+            if on_result:
+                on_result(name, False, "시간 초과", timeout * 1000.0)
+    for name, r in results.items():
+        (log.info if r["ok"] else log.warning)("자가 점검 %s: %s (%s, %.0fms)", name, "정상" if r["ok"] else "실패",
+                                               r["detail"], r["ms"])
+    return results
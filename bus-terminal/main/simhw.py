@@ -0,0 +1,285 @@
+# simhw.py — 시뮬레이션 하드웨어 (PC 에서 단말 코드를 그대로 돌리기 위한 가짜 GPIO/LCD/터치/GPS/오디오)
+#
+#   import simhw; simhw.install()     # 반드시 bussys/lcdsystem 등을 import 하기 전에
+#   import bussys
+#   simhw.GPIO.set_level(bussys.DOOR_PIN, 0)       # 문 열림
+#   simhw.TOUCH.press(297, 15)                      # [X] 터치
+#   simhw.SERIAL.feed(b"$GPRMC,...\r\n")            # NMEA 한 줄
+#   simhw.DEVICE.frames                             # 지금까지 display() 된 프레임 수
+#
+# install() 은 sys.modules 에 RPi.GPIO / spidev / serial / luma / gtts / pygame 을 등록한다.
+# 실제 하드웨어가 있는 라즈베리파이에서는 호출하지 않는다.
+import sys, time, types, threading
+from collections import deque
+
+# ====== GPIO ======
+class SimGPIO(types.ModuleType):
+    BCM, BOARD = 11, 10
+    IN, OUT = 1, 0
+    PUD_UP, PUD_DOWN, PUD_OFF = 22, 21, 20
+    LOW, HIGH = 0, 1
+    FALLING, RISING, BOTH = 32, 31, 33
+
+    class PWM:
+        def __init__(self, pin, freq):
+            self.pin, self.freq, self.duty = pin, freq, 0
+        def start(self, duty): self.duty = duty
+        def stop(self): self.duty = 0
+        def ChangeFrequency(self, f): self.freq = f
+        def ChangeDutyCycle(self, d): self.duty = d
+
+    def __init__(self):
+        super().__init__("RPi.GPIO")
+        self.levels = {}           # pin -> 0/1
+        self.outputs = {}
+        self.callbacks = {}        # pin -> [(edge, fn, bouncetime)]
+        self.lock = threading.Lock()
+
+    def setmode(self, mode): pass
+    def setwarnings(self, flag): pass
+    def cleanup(self, *pins): pass
+
+    def setup(self, pin, mode, pull_up_down=None, initial=None):
+        with self.lock:
+            if mode == self.IN:
+                self.levels.setdefault(pin, 1 if pull_up_down == self.PUD_UP else 0)
+            else:
+                self.outputs[pin] = initial or 0
+
+    def input(self, pin):
+        return self.levels.get(pin, 1)
+
+    def output(self, pin, value):
+        self.outputs[pin] = value
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        with self.lock:
+            self.callbacks.setdefault(pin, [])
+            if callback:
+                self.callbacks[pin].append((edge, callback))
+
+    def add_event_callback(self, pin, callback):
+        with self.lock:
+            self.callbacks.setdefault(pin, []).append((self.BOTH, callback))
+
+    def remove_event_detect(self, pin):
+        with self.lock:
+            self.callbacks.pop(pin, None)
+
+    def set_level(self, pin, level):
+        """시뮬레이터/리플레이 쪽에서 핀 레벨을 바꿈 (등록된 엣지 콜백 호출)"""
+        with self.lock:
+            prev = self.levels.get(pin, 1)
+            self.levels[pin] = level
+            cbs = list(self.callbacks.get(pin, ())) if prev != level else []
+        edge = self.RISING if level else self.FALLING
+        for want, fn in cbs:
+            if want in (self.BOTH, edge):
+                fn(pin)
+
+# ====== 터치 (XPT2046 대체) ======
+class SimTouch:
+    def __init__(self, *args, **kwargs):
+        self.pos = None
+        self.width, self.height = 320, 240
+    IRQ_PIN = 23                # XPT2046 PENIRQ (눌리면 LOW)
+    def press(self, x, y):
+        self.pos = (int(x), int(y))
+        GPIO.set_level(self.IRQ_PIN, 0)
+    def release(self):
+        self.pos = None
+        GPIO.set_level(self.IRQ_PIN, 1)
+    def touched(self):
+        return self.pos is not None
+    def read(self):
+        return self.pos
+    def read_raw(self):
+        return self.pos or (0, 0)
+
+# ====== GPS 시리얼 (pyserial 대체) ======
+class SimSerial:
+    """모든 Serial(...) 생성이 같은 포트 버퍼를 공유 (gpsrx 는 호출마다 포트를 새로 연다)"""
+    def __init__(self):
+        self.lines = deque()
+        self.cond = threading.Condition()
+    def feed(self, raw):
+        with self.cond:
+            self.lines.append(raw if isinstance(raw, bytes) else raw.encode("ascii"))
+            self.cond.notify_all()
+    def readline(self, timeout=0.0):
+        with self.cond:
+            if not self.lines and timeout:
+                self.cond.wait(timeout)
+            return self.lines.popleft() if self.lines else b""
+
+class _SerialPort:
+    def __init__(self, port=None, baudrate=9600, timeout=None, **kwargs):
+        self.port, self.baudrate, self.timeout = port, baudrate, timeout
+        self.is_open = True
+    def readline(self):
+        return SERIAL.readline(0.0)
+    def read(self, n=1):
+        return SERIAL.readline(0.0)[:n]
+    def close(self):
+        self.is_open = False
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+# ====== LCD (luma ili9341 대체) ======
+class SimDevice:
+    def __init__(self, serial_interface=None, width=320, height=240, rotate=0, **kwargs):
+        self.width, self.height = width, height
+        self.size = (width, height)
+        self.mode = "RGB"
+        self.last_image = None
+        self.frames = 0
+        self.spi_bytes = 0
+        self.backlight_on = True
+        self.backlight_level = 100  # PWM 백라이트 밝기 (0~100, on/off 만이면 0/100)
+        self.flush_delay = 0.0      # 실제 SPI 전송 시간을 흉내낼 때 (초)
+        self.spi_hz = 0             # >0 이면 data() 가 바이트 수만큼 SPI 전송 시간을 흉내냄
+        # fb565 처럼 창(CASET/PASET) + RAMWR 로 직접 쓰는 경로용 16비트 GRAM
+        self.gram = bytearray(width * height * 2)
+        self._cmd = None
+        self._win = [0, 0, width - 1, height - 1]
+    def display(self, image):
+        if self.flush_delay:
+            time.sleep(self.flush_delay)
+        self.last_image = image.copy()
+        self.frames += 1
+        self.spi_bytes += self.width * self.height * 2
+    def command(self, cmd, *args):
+        self._cmd = cmd
+        if args:
+            self._param(cmd, args)
+    def data(self, data):
+        self.spi_bytes += len(data)
+        if self.spi_hz:
+            time.sleep(len(data) * 8 / self.spi_hz)
+        if self._cmd == 0x2C:
+            self._ramwr(bytes(data))
+        elif self._cmd is not None:
+            self._param(self._cmd, list(data))
+    def _param(self, cmd, args):
+        if cmd == 0x2A and len(args) >= 4:
+            self._win[0], self._win[2] = args[0] << 8 | args[1], args[2] << 8 | args[3]
+        elif cmd == 0x2B and len(args) >= 4:
+            self._win[1], self._win[3] = args[0] << 8 | args[1], args[2] << 8 | args[3]
+    def _ramwr(self, data):
+        x0, y0, x1, y1 = self._win
+        row = (x1 - x0 + 1) * 2
+        for i, y in enumerate(range(y0, y1 + 1)):
+            chunk = data[i * row:(i + 1) * row]
+            if not chunk:
+                break
+            o = (y * self.width + x0) * 2
+            self.gram[o:o + len(chunk)] = chunk
+    def backlight(self, on):
+        self.backlight_on = bool(on)
+        self.backlight_level = (100 if on else 0) if isinstance(on, bool) else max(0, min(100, int(on)))
+    def clear(self): pass
+    def cleanup(self): pass
+
+# ====== 전류 모델 (전류 센서 대체) ======
+class SimPower:
+    """
+    전원 전류 추정 (mA): 보드 기본 + CPU 사용률 + 백라이트 밝기 + SPI 전송량
+    계수는 Pi Zero 2 W + 2.8" ILI9341 모듈 대략값 — 실기 측정(hwmon 센서)의 상대 비교용
+    """
+    BASE_MA, CPU_MA, BACKLIGHT_MA, SPI_MA_PER_MBPS = 120.0, 180.0, 80.0, 6.0
+
+    def __init__(self):
+        self._t = time.monotonic()
+        self._cpu = time.process_time()
+        self._spi = 0
+
+    def current_ma(self):
+        now, cpu = time.monotonic(), time.process_time()
+        dt = max(1e-6, now - self._t)
+        load = min(1.0, (cpu - self._cpu) / dt)
+        spi = DEVICE.spi_bytes if DEVICE else 0
+        mbps = (spi - self._spi) * 8 / dt / 1e6
+        self._t, self._cpu, self._spi = now, cpu, spi
+        bl = DEVICE.backlight_level / 100.0 if DEVICE else 1.0
+        return self.BASE_MA + self.CPU_MA * load + self.BACKLIGHT_MA * bl + self.SPI_MA_PER_MBPS * mbps
+
+POWER = SimPower()
+
+class _SimSPI:
+    def __init__(self, *args, **kwargs):
+        self.args, self.kwargs = args, kwargs
+    def command(self, *cmd): pass
+    def data(self, data): pass
+    def cleanup(self): pass
+
+# ====== 오디오 (gtts / pygame.mixer 대체) ======
+class _SimMusic:
+    def __init__(self):
+        self.played = []
+    def load(self, path): self._path = path
+    def play(self, *a): self.played.append(getattr(self, "_path", None))
+    def get_busy(self): return False
+    def stop(self): pass
+
+class _SimGTTS:
+    def __init__(self, text="", lang="ko", **kwargs):
+        self.text, self.lang = text, lang
+    def save(self, path):
+        SPOKEN.append(self.text)
+
+# ====== 전역 인스턴스 ======
+GPIO   = SimGPIO()
+TOUCH  = SimTouch()
+SERIAL = SimSerial()
+DEVICE = None          # install() 후 lcdsystem 이 만든 SimDevice
+SPIDEV_BYTES = 0       # spidev 로 직접 보낸 바이트 (splash.show 등 luma 를 거치지 않는 경로)
+SPOKEN = []            # 음성 안내로 요청된 문장
+
+_installed = False
+
+def _module(name, **attrs):
+    m = types.ModuleType(name)
+    m.__dict__.update(attrs)
+    sys.modules[name] = m
+    return m
+
+def install():
+    """가짜 하드웨어 모듈을 sys.modules 에 등록 (여러 번 불려도 1회만)"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    rpi = _module("RPi")
+    rpi.GPIO = GPIO
+    sys.modules["RPi.GPIO"] = GPIO
+
+    class _SpiDev:
+        max_speed_hz, mode = 0, 0
+        def open(self, bus, dev): pass
+        def xfer2(self, data): return [0] * len(data)
+        def writebytes(self, data): self.writebytes2(data)
+        def writebytes2(self, data):
+            global SPIDEV_BYTES
+            SPIDEV_BYTES += len(data)
+        def close(self): pass
+    _module("spidev", SpiDev=_SpiDev)
+
+    _module("serial", Serial=_SerialPort, SerialException=OSError)
+
+    def _make_device(serial_interface=None, **kwargs):
+        global DEVICE
+        DEVICE = SimDevice(serial_interface, **kwargs)
+        return DEVICE
+    _module("luma"); _module("luma.core"); _module("luma.core.interface")
+    _module("luma.core.interface.serial", spi=_SimSPI)
+    _module("luma.lcd")
+    _module("luma.lcd.device", ili9341=_make_device)
+
+    # xpt2046 는 spidev/GPIO 만 쓰지만, 터치 상태는 TOUCH 로 직접 제어
+    _module("xpt2046", XPT2046=lambda *a, **k: TOUCH)
+
+    _module("gtts", gTTS=_SimGTTS)
+    mixer = types.SimpleNamespace(init=lambda *a, **k: None, music=_SimMusic())
+    _module("pygame", mixer=mixer)
+    _module("pygame.mixer", init=mixer.init, music=mixer.music)
@@ -1,9 +1,12 @@
 # soundsys.py
 import os
 import threading
+import logging
 from gtts import gTTS
 from pygame import mixer
 
+log = logging.getLogger("soundsys")
+
 class SoundSystem:
     def __init__(self, lang="ko"):
         self.lang = lang
@@ -22,7 +25,7 @@ class SoundSystem:
                 while mixer.music.get_busy():
                     pass
             except Exception as e:
-                print(f"[SoundSys] 오류: {e}")
+                log.warning("음성 출력 오류: %s", e)
 
     def announce_bus(self, bus_no: str):
         """버스 번호를 음성으로 안내"""
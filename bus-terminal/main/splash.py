@@ -0,0 +1,154 @@
+# splash.py — 부팅 첫 화면: 마지막으로 그린 프레임(RGB565 원본)을 PIL/luma 없이 바로 LCD 로
+#
+# 전원을 켜면 PIL/luma/numpy import + 폰트 로드 + 첫 키패드 그리기까지 화면이 비어 있었다.
+# main.py 가 다른 import 보다 먼저 show_async() 를 불러 spidev + RPi.GPIO 만으로 패널을 리셋/최소 초기화하고
+# splash.565 (320x240x2 바이트, fb565 와 같은 빅엔디언 RGB565) 를 전체 창 한 번으로 보낸다.
+# 리셋 대기(~250ms) 동안 main.py 는 import 를 계속하고, lcdsystem 은 luma 로 패널을 잡기 전에 wait() 한다.
+# luma 초기화(리셋)로 지워진 화면은 restore() 로 곧바로 다시 올린다.
+# 저장: bussys 가 대기 상태 화면을 가끔 save_async() — 변환/쓰기는 별도 스레드, 임시파일 + fsync + os.replace.
+#
+#   import splash; splash.show_async()    # main.py 맨 위 (다른 import 보다 먼저)
+#   splash.wait(); device = ili9341(...)  # lcdsystem: 전송이 끝난 뒤 luma 초기화
+#   splash.restore(DISPLAY)               # lcdsystem: luma 초기화 직후
+#   splash.SHOWN_MS                       # 부팅 화면 표시에 걸린 ms (없으면 None)
+#   splash.save_async(DISPLAY.fb.prev)    # ndarray (h, w, 3) 또는 PIL Image
+#
+# 패널 방향: MADCTL 은 luma ili9341 가로(320x240) 초기화와 같아야 한다 — 다르면 config.json "lcd_madctl"
+import os, json, time, threading, logging
+
+log = logging.getLogger("splash")
+
+BASE_DIR    = os.path.dirname(os.path.abspath(__file__))
+SPLASH_PATH = os.path.join(BASE_DIR, "splash.565")
+
+WIDTH, HEIGHT = 320, 240
+PIN_DC, PIN_RST = 24, 25          # lcdsystem 의 spi(gpio_DC=24, gpio_RST=25) 와 같은 배선
+MADCTL_DEFAULT  = 0x28            # MV(가로) | BGR
+RESET_HOLD_S    = 0.01
+RESET_WAIT_S    = 0.12            # 리셋 해제 후 명령 받기까지
+SLPOUT_WAIT_S   = 0.12            # Sleep Out 후 안정화
+
+# ILI9341 명령
+SLPOUT, DISPON, CASET, PASET, RAMWR, MADCTL, COLMOD = 0x11, 0x29, 0x2A, 0x2B, 0x2C, 0x36, 0x3A
+
+SHOWN_MS = None         # show() 가 부팅 화면을 띄우는 데 걸린 ms
+_show_thread = None
+
+def _conf():
+    try:
+        with open(os.path.join(BASE_DIR, "config.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def load(path=SPLASH_PATH):
+    """저장된 화면 바이트 (없거나 크기가 다르면 None)"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    return data if len(data) == WIDTH * HEIGHT * 2 else None
+
+# ====== 부팅 직후 표시 ======
+def show(path=SPLASH_PATH):
+    """패널 리셋 + 최소 초기화 + 저장 화면 전송 → 걸린 ms (화면 없음/하드웨어 오류면 None, 부팅은 계속)"""
+    t0 = time.perf_counter()
+    data = load(path)
+    if data is None:
+        return None
+    cfg = _conf()
+    try:
+        import spidev
+        import RPi.GPIO as GPIO
+        GPIO.setwarnings(False)
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(PIN_DC, GPIO.OUT)
+        GPIO.setup(PIN_RST, GPIO.OUT)
+        spi = spidev.SpiDev()
+        spi.open(0, 0)
+    except Exception as e:
+        log.warning("부팅 화면 표시 불가: %s", e)
+        return None
+    try:
+        spi.max_speed_hz = int(cfg.get("spi_speed_hz", 32000000))
+        spi.mode = 0
+
+        def cmd(c, *params):
+            GPIO.output(PIN_DC, GPIO.LOW)
+            spi.writebytes([c])
+            if params:
+                GPIO.output(PIN_DC, GPIO.HIGH)
+                spi.writebytes(list(params))
+
+        GPIO.output(PIN_RST, GPIO.LOW)
+        time.sleep(RESET_HOLD_S)
+        GPIO.output(PIN_RST, GPIO.HIGH)
+        time.sleep(RESET_WAIT_S)
+        cmd(SLPOUT)
+        time.sleep(SLPOUT_WAIT_S)
+        cmd(COLMOD, 0x55)
+        cmd(MADCTL, int(cfg.get("lcd_madctl", MADCTL_DEFAULT)))
+        cmd(CASET, 0, 0, (WIDTH - 1) >> 8, (WIDTH - 1) & 0xFF)
+        cmd(PASET, 0, 0, (HEIGHT - 1) >> 8, (HEIGHT - 1) & 0xFF)
+        cmd(RAMWR)
+        GPIO.output(PIN_DC, GPIO.HIGH)
+        spi.writebytes2(data)               # spidev 가 bufsiz 단위로 나눠 보냄
+        cmd(DISPON)                         # 다 채운 뒤 켜서 그리는 과정이 안 보이게
+    except Exception as e:
+        log.warning("부팅 화면 전송 실패: %s", e)
+        return None
+    finally:
+        spi.close()
+    global SHOWN_MS
+    SHOWN_MS = (time.perf_counter() - t0) * 1000.0
+    return SHOWN_MS
+
+def show_async(path=SPLASH_PATH):
+    """show() 를 별도 스레드로 — 패널 리셋 대기 동안 호출한 쪽은 import 를 계속"""
+    global _show_thread
+    if _show_thread is None:
+        _show_thread = threading.Thread(target=show, args=(path,), name="splash", daemon=True)
+        _show_thread.start()
+
+def wait(timeout=2.0):
+    """show_async() 가 끝날 때까지 (luma 가 같은 SPI/GPIO 를 잡기 전에)"""
+    if _show_thread is not None:
+        _show_thread.join(timeout)
+    return SHOWN_MS
+
+def restore(display, path=SPLASH_PATH):
+    """luma 초기화(리셋)로 지워진 패널에 다시 — RGB565 프레임버퍼가 있을 때만"""
+    fb = getattr(display, "fb", None)
+    data = load(path) if fb is not None else None
+    if data is None:
+        return False
+    fb.push_raw(data)
+    return True
+
+# ====== 저장 ======
+def save(frame, path=SPLASH_PATH):
+    """frame: (h, w, 3) uint8 ndarray 또는 PIL Image → RGB565 원본 파일 (전원이 끊겨도 이전 것 아니면 새 것)"""
+    import numpy as np
+    from fb565 import to_rgb565
+    a = np.asarray(frame.convert("RGB") if hasattr(frame, "convert") else frame)
+    if a.shape[:2] != (HEIGHT, WIDTH):
+        return False
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(to_rgb565(a))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return True
+
+def save_async(frame, path=SPLASH_PATH):
+    """호출 스레드(UI 루프)는 기다리지 않음"""
+    if frame is None:
+        return
+    def run():
+        try:
+            save(frame, path)
+        except Exception as e:
+            log.warning("부팅 화면 저장 실패: %s", e)
+    threading.Thread(target=run, name="splash-save", daemon=True).start()
@@ -0,0 +1,48 @@
+# statejournal.py — 요청/상태 저널 (프로세스가 죽었다 살아나도 기사 화면의 경보 상태 그대로)
+#
+# bussys.set_status() 가 상태가 바뀔 때마다 write() — 작은 JSON 한 줄을 임시파일에 쓰고 os.replace.
+# fsync 는 하지 않는다: 프로세스가 죽어도 페이지 캐시는 남고, 전원이 끊긴 경우라면 요청 자체가 이미 낡았다.
+# (쓰기 한 번 ~0.1ms, 전환은 분에 몇 번 — 호출 스레드에서 바로 써도 부담 없음)
+# 재시작 직후 load() 로 읽어 RESTORE_MAX_S 안의 요청 대기 상태면 그대로 복원 (경보 비프 포함).
+#
+#   JOURNAL.write(status="ride_pending", stop="시청")
+#   JOURNAL.load()      → {"t": ms, "status": "ride_pending", "stop": "시청", "pid": 1234} 또는 None
+import os, json, threading
+import timesvc
+
+BASE_DIR     = os.path.dirname(os.path.abspath(__file__))
+JOURNAL_PATH = os.path.join(BASE_DIR, "state.json")
+
+RESTORE_MAX_S = 10 * 60      # 이보다 오래된 요청은 복원하지 않음
+
+class StateJournal:
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.writes = 0
+
+    def write(self, **state):
+        data = json.dumps({"t": timesvc.now_ms(), "pid": os.getpid(), **state}, ensure_ascii=False)
+        tmp = f"{self.path}.{threading.get_ident()}.tmp"
+        with self.lock:
+            try:
+                with open(tmp, "w") as f:
+                    f.write(data)
+                os.replace(tmp, self.path)
+                self.writes += 1
+            except OSError:
+                pass
+
+    def load(self, max_age_s=RESTORE_MAX_S):
+        """최근 상태 (없음/깨짐/오래됨이면 None)"""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            age_ms = timesvc.now_ms() - int(state["t"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if not 0 <= age_ms <= max_age_s * 1000:
+            return None
+        return state
+
+JOURNAL = StateJournal()
@@ -0,0 +1,252 @@
+# stopindex.py — 노선 정류장 인덱스 (GPS → 현재/다음 정류장 + 거리, 서버 없이 단말에서 계산)
+#
+# stops/<노선>.stx 파일 하나에 노선 순서대로 정렬된 정류장 목록이 들어 있고,
+# 로드 시 노선 중심 기준 평면 좌표(m)로 투영한 뒤 격자(GRID_M) 버킷에 넣어 둔다.
+# locate(lat, lon) 은 주변 격자 몇 칸만 보므로 수 μs 수준.
+# 운행 중에는 StopTracker 로 — 마지막으로 맞춘 정류장부터 앞쪽(seq 증가)만 보므로
+# 양방향 노선에서 길 건너편(반대 방향) 정류장으로 현재 정류장이 왔다 갔다 하지 않는다.
+#
+#   python3 stopindex.py build stops_229.csv -o stops/229.stx     # CSV: seq,stop_id,name,lat,lon
+#   python3 stopindex.py query stops/229.stx 37.5665 126.9780
+#
+# .stx 형식 (little endian)
+#   b"STX1" + u16 개수 + [u16 seq, i32 lat*1e6, i32 lon*1e6, u8 len + id, u8 len + name] * 개수
+import os, csv, math, struct, argparse
+
+MAGIC = b"STX1"
+GRID_M = 250.0            # 격자 한 칸 크기 (m)
+AT_STOP_M = 40.0          # 이 거리 안이면 "현재 정류장"
+AHEAD_STOPS = 3           # 추적 중 후보: 마지막 정류장부터 이만큼 앞까지 (GPS 가 몇 정류장 건너뛰어도)
+REJOIN_M = 300.0          # 앞쪽 정류장이 전체 최근접보다 이만큼 더 멀면 노선 재합류(회차/새 운행/우회)로 보고 추적 초기화
+PAIR_M = 60.0             # 추적 시작 시 최근접과 이 차이 안의 정류장(길 건너편 쌍)은 진행 방향으로 고름
+HEADING_MIN_M = 10.0      # 이만큼 움직여야 진행 방향으로 인정 (정차 중 GPS 흔들림 무시)
+EARTH_R = 6371008.8
+
+BASE_DIR  = os.path.dirname(os.path.abspath(__file__))
+STOPS_DIR = os.path.join(BASE_DIR, "stops")
+
+# ====== 파일 입출력 ======
+def write_stx(path, stops):
+    """stops: [(seq, stop_id, name, lat, lon)] — seq 순으로 정렬해서 저장"""
+    stops = sorted(stops, key=lambda s: int(s[0]))
+    out = bytearray(MAGIC)
+    out += struct.pack("<H", len(stops))
+    for seq, sid, name, lat, lon in stops:
+        out += struct.pack("<Hii", int(seq), round(float(lat) * 1e6), round(float(lon) * 1e6))
+        for text in (str(sid), str(name)):
+            b = text.encode("utf-8")[:255]
+            out += struct.pack("<B", len(b)) + b
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(out)
+
+def read_stx(path):
+    with open(path, "rb") as f:
+        buf = f.read()
+    if buf[:4] != MAGIC:
+        raise ValueError(f"정류장 인덱스 파일 아님: {path}")
+    (n,) = struct.unpack_from("<H", buf, 4)
+    i = 6
+    stops = []
+    for _ in range(n):
+        seq, lat, lon = struct.unpack_from("<Hii", buf, i); i += 10
+        texts = []
+        for _ in range(2):
+            ln = buf[i]; i += 1
+            texts.append(buf[i:i + ln].decode("utf-8")); i += ln
+        stops.append((seq, texts[0], texts[1], lat / 1e6, lon / 1e6))
+    return stops
+
+# ====== 인덱스 ======
+class StopIndex:
+    def __init__(self, stops):
+        self.seq  = [s[0] for s in stops]
+        self.ids  = [s[1] for s in stops]
+        self.names = [s[2] for s in stops]
+        self.lat  = [s[3] for s in stops]
+        self.lon  = [s[4] for s in stops]
+        n = len(stops)
+        # 노선 중심 기준 등거리 원통 투영 (도심 노선 규모에서 오차 무시 가능)
+        self.lat0 = sum(self.lat) / n if n else 0.0
+        self.lon0 = sum(self.lon) / n if n else 0.0
+        self._kx = math.radians(1) * EARTH_R * math.cos(math.radians(self.lat0))
+        self._ky = math.radians(1) * EARTH_R
+        self.x = [(lo - self.lon0) * self._kx for lo in self.lon]
+        self.y = [(la - self.lat0) * self._ky for la in self.lat]
+        self.grid = {}
+        for k in range(n):
+            self.grid.setdefault(self._cell(self.x[k], self.y[k]), []).append(k)
+
+    @classmethod
+    def load(cls, path):
+        return cls(read_stx(path))
+
+    @classmethod
+    def for_route(cls, *names):
+        """stops/<이름>.stx 중 처음 존재하는 파일로 로드 (bus_no, line_name 순으로 시도)"""
+        for name in names:
+            if not name:
+                continue
+            path = os.path.join(STOPS_DIR, f"{name}.stx")
+            if os.path.exists(path):
+                return cls.load(path)
+        return None
+
+    def __len__(self):
+        return len(self.seq)
+
+    def _cell(self, x, y):
+        return (int(x // GRID_M), int(y // GRID_M))
+
+    def project(self, lat, lon):
+        return (lon - self.lon0) * self._kx, (lat - self.lat0) * self._ky
+
+    def nearest(self, lat, lon, max_m=2000.0):
+        """(정류장 인덱스, 거리 m) — max_m 안에 없으면 (None, None)"""
+        x, y = self.project(lat, lon)
+        cx, cy = self._cell(x, y)
+        best, best_d2 = None, max_m * max_m
+        ring = 0
+        max_ring = int(max_m // GRID_M) + 1
+        while ring <= max_ring:
+            for gx in range(cx - ring, cx + ring + 1):
+                for gy in range(cy - ring, cy + ring + 1):
+                    if ring and abs(gx - cx) != ring and abs(gy - cy) != ring:
+                        continue            # 이번 고리의 테두리 칸만
+                    for k in self.grid.get((gx, gy), ()):
+                        d2 = (self.x[k] - x) ** 2 + (self.y[k] - y) ** 2
+                        if d2 < best_d2:
+                            best, best_d2 = k, d2
+            # 찾은 거리보다 다음 고리가 확실히 멀면 종료
+            if best is not None and (ring * GRID_M) ** 2 >= best_d2:
+                break
+            ring += 1
+        if best is None:
+            return None, None
+        return best, math.sqrt(best_d2)
+
+    def within(self, lat, lon, r):
+        """[(정류장 인덱스, 거리 m)] — 반경 r 안 전부"""
+        x, y = self.project(lat, lon)
+        cx, cy = self._cell(x, y)
+        n = int(r // GRID_M) + 1
+        out = []
+        for gx in range(cx - n, cx + n + 1):
+            for gy in range(cy - n, cy + n + 1):
+                for k in self.grid.get((gx, gy), ()):
+                    d = math.hypot(self.x[k] - x, self.y[k] - y)
+                    if d <= r:
+                        out.append((k, d))
+        return out
+
+    def heading_dot(self, k, hx, hy):
+        """정류장 k 에서의 노선 진행 방향(k→k+1, 마지막이면 k-1→k)과 (hx, hy) 의 내적"""
+        a, b = (k, k + 1) if k + 1 < len(self.seq) else (k - 1, k)
+        if a < 0:
+            return 0.0
+        return (self.x[b] - self.x[a]) * hx + (self.y[b] - self.y[a]) * hy
+
+    def locate(self, lat, lon):
+        """
+        GPS 위치 → {"current": 이름|None, "next": 이름|None, "next_seq", "dist_next_m"}
+        가장 가까운 정류장 k 를 지났는지(k→k+1 방향 내적)로 다음 정류장을 고른다.
+        """
+        k, d = self.nearest(lat, lon)
+        if k is None:
+            return None
+        return self.describe(k, d, lat, lon)
+
+    def describe(self, k, d, lat, lon):
+        """정류장 k (거리 d) 기준 locate() 결과"""
+        x, y = self.project(lat, lon)
+        last = len(self.seq) - 1
+        at_stop = d <= AT_STOP_M
+        if k < last:
+            vx, vy = self.x[k + 1] - self.x[k], self.y[k + 1] - self.y[k]
+            passed = (x - self.x[k]) * vx + (y - self.y[k]) * vy > 0
+        else:
+            passed = False
+        # 정류장 k 에 서 있거나 이미 지났으면 다음은 k+1, 아니면 k 로 접근 중
+        nxt = k + 1 if (at_stop or passed) and k < last else (k if not at_stop else None)
+        return {
+            "current": self.names[k] if at_stop else None,
+            "next": self.names[nxt] if nxt is not None else None,
+            "next_seq": self.seq[nxt] if nxt is not None else None,
+            "dist_next_m": round(math.hypot(self.x[nxt] - x, self.y[nxt] - y)) if nxt is not None else None,
+        }
+
+class StopTracker:
+    """
+    진행 방향 추적 locate (.stx 는 노선 순서라 진행 방향 = 인덱스 증가,
+    왕복 노선이면 길 건너편 정류장은 인덱스가 멀리 떨어져 있음)
+    - 추적 시작: 최근접과 PAIR_M 안쪽 차이의 후보 중 움직인 방향과 노선 방향이 맞는 정류장으로 잡음
+      (아직 움직이지 않아 방향을 모르면 최근접을 알려 주기만 하고 잡지 않음)
+    - 추적 중: 마지막으로 맞춘 정류장부터 AHEAD_STOPS 앞까지 중 가장 가까운 것 (움직이는 중이면 방향이 맞는 것만,
+      회차 지점 근처에서 앞쪽 창에 걸린 반대 방향 정류장 제외). 그 안에 후보가 없거나 전체 최근접보다 REJOIN_M 이상 멀면 (회차/새 운행/우회) 추적을 풀고 다시 시작
+    """
+    def __init__(self, index, ahead=AHEAD_STOPS, rejoin_m=REJOIN_M):
+        self.index = index
+        self.ahead = ahead
+        self.rejoin_m = rejoin_m
+        self.k = None               # 마지막으로 맞춘 정류장 인덱스 (None = 추적 전)
+        self._prev = None           # 진행 방향 기준점 (투영 좌표)
+
+    def _heading(self, lat, lon):
+        x, y = self.index.project(lat, lon)
+        if self._prev is None:
+            self._prev = (x, y)
+            return None
+        hx, hy = x - self._prev[0], y - self._prev[1]
+        if hx * hx + hy * hy < HEADING_MIN_M * HEADING_MIN_M:
+            return None
+        self._prev = (x, y)
+        return hx, hy
+
+    def locate(self, lat, lon):
+        idx = self.index
+        heading = self._heading(lat, lon)
+        k, d = idx.nearest(lat, lon)
+        if k is None:
+            return None
+        if self.k is not None:
+            ahead = [c for c in idx.within(lat, lon, d + self.rejoin_m)
+                     if self.k <= c[0] <= self.k + self.ahead
+                     and (heading is None or idx.heading_dot(c[0], *heading) > 0)]
+            if ahead:
+                self.k, d = min(ahead, key=lambda c: c[1])
+                return idx.describe(self.k, d, lat, lon)
+            self.k = None
+        if heading is not None:
+            for kc, dc in sorted(idx.within(lat, lon, d + PAIR_M), key=lambda c: c[1]):
+                if idx.heading_dot(kc, *heading) > 0:
+                    self.k = kc
+                    return idx.describe(kc, dc, lat, lon)
+        return idx.describe(k, d, lat, lon)
+
+# ====== CLI ======
+def _load_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = [r for r in csv.reader(f) if r and not r[0].startswith("#")]
+    if rows and not rows[0][0].strip().isdigit():
+        rows = rows[1:]                      # 헤더 줄
+    return [(int(r[0]), r[1].strip(), r[2].strip(), float(r[3]), float(r[4])) for r in rows]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="노선 정류장 인덱스")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="CSV(seq,stop_id,name,lat,lon) → .stx")
+    b.add_argument("csv"); b.add_argument("-o", "--out", required=True)
+    q = sub.add_parser("query", help="좌표로 현재/다음 정류장 조회")
+    q.add_argument("stx"); q.add_argument("lat", type=float); q.add_argument("lon", type=float)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        stops = _load_csv(args.csv)
+        write_stx(args.out, stops)
+        print(f"{len(stops)}개 정류장 → {args.out} ({os.path.getsize(args.out)} bytes)")
+    else:
+        idx = StopIndex.load(args.stx)
+        print(idx.locate(args.lat, args.lon))
+
+if __name__ == "__main__":
+    main()
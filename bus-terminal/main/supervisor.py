@@ -0,0 +1,242 @@
+# supervisor.py — 작업 스레드 생존 감시 + sd_notify 워치독 + bussys 재시작
+#
+# 단말 쪽 (bussys):
+#   작업 스레드(UI 루프 / WS / BusAPI 수신 / GPS)가 HB.beat(이름) 으로 살아 있음을 알리고
+#   Watchdog 스레드가 1초마다 확인해서 전부 제때 뛰고 있으면 sd_notify("WATCHDOG=1").
+#   하나라도 멈추면 그 스레드 스택을 로그에 남기고 "WATCHDOG=trigger" → 감독 프로세스가 바로 재시작.
+# 감독 쪽 (main.py):
+#   Supervisor 가 bussys 를 자식으로 띄우면서 NOTIFY_SOCKET 을 자기 소켓(추상 네임스페이스)으로 넘긴다
+#   (bussys 는 systemd 아래에서 직접 돌 때와 같은 코드로 알림). 자식이 죽거나(종료 코드 ≠ 0, 시그널)
+#   WATCHDOG_S 동안 핑이 없거나 trigger 를 보내면 죽이고 바로 다시 띄운다 (연달아 죽으면 0.5 → 1 → 2 … 5초 대기).
+#   systemd 에는 감독 루프가 도는 동안 WATCHDOG=1 (Type=notify, WatchdogSec=…) — 자식 상태는 감독이 책임짐.
+#
+#   HB.expect("gps", 20, thread=lambda: gps)       # 이름, 허용 공백(초), 멈췄을 때 스택을 찍을 스레드
+#   HB.beat("gps")                                  # 작업 루프 한 바퀴마다
+#   Watchdog(HB).start(); sd_notify("READY=1")
+#
+#   sup = Supervisor(["python3", "bussys.py"], cwd=BASE_DIR); sup.run()   # 자식이 0 으로 끝날 때까지
+import os, sys, time, socket, signal, threading, traceback, subprocess
+import logging
+
+log = logging.getLogger("supervisor")
+
+CHECK_S        = 1.0        # 생존 확인 주기
+WATCHDOG_S     = 10.0       # 자식이 이만큼 핑이 없으면 멈춘 것으로
+START_TIMEOUT_S = 60.0      # 띄운 뒤 READY 까지 (import + 첫 화면)
+STABLE_S       = 60.0       # 이만큼 버티면 재시작 대기 초기화
+BACKOFF_S      = (0.0, 0.5, 1.0, 2.0, 5.0)
+KILL_GRACE_S   = 2.0        # SIGTERM 후 이만큼 기다렸다 SIGKILL
+STATUS_CONNECTED = "서버 연결됨"   # 자식이 STATUS= 로 보내면 재시작 → 재연결 시간을 기록
+
+# ====== sd_notify ======
+_sock = None
+_last_ping = 0.0
+
+def sd_notify(state):
+    """NOTIFY_SOCKET 으로 상태 한 줄 이상 ("READY=1", "WATCHDOG=1", "STATUS=…") — 없으면 False"""
+    global _sock
+    path = os.environ.get("NOTIFY_SOCKET")
+    if not path:
+        return False
+    if path[0] == "@":
+        path = "\0" + path[1:]
+    try:
+        if _sock is None:
+            _sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC)
+        _sock.sendto(state.encode("utf-8"), path)
+        return True
+    except OSError:
+        return False
+
+def watchdog_interval():
+    """systemd/감독이 요구하는 핑 간격 절반 (초, 워치독 없으면 None)"""
+    pid = os.environ.get("WATCHDOG_PID")
+    if pid and pid != str(os.getpid()):
+        return None
+    usec = os.environ.get("WATCHDOG_USEC")
+    return int(usec) / 2e6 if usec and usec.isdigit() else None
+
+def ping():
+    """WATCHDOG=1 — 워치독 간격 절반마다만 실제로 보냄 (루프에서 매번 불러도 됨)"""
+    global _last_ping
+    every = watchdog_interval()
+    now = time.monotonic()
+    if every is None or now - _last_ping < every:
+        return
+    _last_ping = now
+    sd_notify("WATCHDOG=1")
+
+# ====== 작업 스레드 생존 감시 ======
+class Heartbeats:
+    def __init__(self):
+        self.last = {}              # 이름 → 마지막 beat (monotonic)
+        self.limits = {}            # 이름 → 허용 공백 (초)
+        self.probes = {}            # 이름 → () -> 마지막 시각 (None 이면 지금은 감시 안 함)
+        self.threads = {}           # 이름 → () -> Thread (스택 출력용)
+
+    def expect(self, name, max_age_s, probe=None, thread=None):
+        self.limits[name] = max_age_s
+        self.last[name] = time.monotonic()      # 등록 시점부터 유예
+        if probe:
+            self.probes[name] = probe
+        if thread:
+            self.threads[name] = thread
+
+    def beat(self, name):
+        self.last[name] = time.monotonic()
+
+    def stale(self, now=None):
+        """[(이름, 공백 초)] — 허용 공백을 넘긴 것"""
+        now = time.monotonic() if now is None else now
+        out = []
+        for name, limit in self.limits.items():
+            probe = self.probes.get(name)
+            t = probe() if probe else self.last.get(name)
+            if t is not None and now - t > limit:
+                out.append((name, now - t))
+        return out
+
+    def stack(self, name):
+        """멈춘 스레드가 지금 어디서 서 있는지"""
+        get = self.threads.get(name)
+        th = get() if get else None
+        frame = sys._current_frames().get(getattr(th, "ident", None))
+        return "".join(traceback.format_stack(frame)) if frame else "(스레드 없음)"
+
+class Watchdog(threading.Thread):
+    """CHECK_S 마다 Heartbeats 확인 → 정상이면 ping(), 멈춘 스레드가 있으면 trigger (한 번만)"""
+    def __init__(self, hb, check_s=CHECK_S):
+        super().__init__(daemon=True, name="watchdog")
+        self.hb = hb
+        self.check_s = check_s
+        self.tripped = False
+        self.stop_flag = threading.Event()
+
+    def run(self):
+        while not self.stop_flag.wait(self.check_s):
+            stale = self.hb.stale()
+            if not stale:
+                ping()
+                continue
+            if self.tripped:
+                continue
+            self.tripped = True
+            names = ", ".join(f"{n} {age:.0f}초" for n, age in stale)
+            for n, _ in stale:
+                log.error("작업 스레드 응답 없음: %s\n%s", n, self.hb.stack(n))
+            if not sd_notify(f"STATUS=응답 없음: {names}\nWATCHDOG=trigger"):
+                log.error("감독 프로세스 없음 — 재시작 불가, 계속 실행 (%s)", names)
+
+    def stop(self):
+        self.stop_flag.set()
+
+# ====== 감독 (main.py) ======
+class Supervisor:
+    """자식 프로세스 실행 + 자식의 sd_notify 수신 + 죽음/멈춤 시 재시작"""
+    def __init__(self, argv, cwd=None, env=None, watchdog_s=WATCHDOG_S):
+        self.argv, self.cwd = argv, cwd
+        self.env = dict(os.environ if env is None else env)
+        self.watchdog_s = watchdog_s
+        self.name = f"buson-sup-{os.getpid()}"
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC)
+        self.sock.bind("\0" + self.name)
+        self.sock.settimeout(0.1)        # 자식 종료도 이 주기로 확인 (재시작 지연 상한)
+        self.proc = None
+        self.restarts = 0
+        self.status = ""
+        self.stop_flag = threading.Event()
+        self._fails = 0
+        self._reset()
+
+    def _reset(self):
+        self.spawned_at = time.monotonic()
+        self.ready_at = None
+        self.connected_at = None
+        self.last_ping = None
+        self.trigger = False
+
+    def spawn(self):
+        env = dict(self.env)
+        env["NOTIFY_SOCKET"] = "@" + self.name
+        env["WATCHDOG_USEC"] = str(int(self.watchdog_s * 1e6))
+        env.pop("WATCHDOG_PID", None)
+        self._reset()
+        self.proc = subprocess.Popen(self.argv, cwd=self.cwd, env=env)
+        log.info("자식 시작: pid %d (재시작 %d회)", self.proc.pid, self.restarts)
+        return self.proc
+
+    def kill(self, sig=signal.SIGTERM):
+        p = self.proc
+        if p is None or p.poll() is not None:
+            return
+        try:
+            p.send_signal(sig)
+            p.wait(KILL_GRACE_S)
+        except subprocess.TimeoutExpired:
+            p.kill()
+            p.wait()
+
+    def _on_notify(self, msg):
+        now = time.monotonic()
+        for line in msg.splitlines():
+            key, _, val = line.partition("=")
+            if key == "READY" and self.ready_at is None:
+                self.ready_at = self.last_ping = now
+                log.info("자식 준비 완료: 시작 후 %.0fms", (now - self.spawned_at) * 1000)
+            elif key == "WATCHDOG":
+                if val == "trigger":
+                    self.trigger = True
+                else:
+                    self.last_ping = now
+            elif key == "STATUS":
+                self.status = val
+                if val == STATUS_CONNECTED and self.connected_at is None:
+                    self.connected_at = now
+                    log.info("자식 서버 연결: 시작 후 %.0fms", (now - self.spawned_at) * 1000)
+
+    def _why_dead(self):
+        """죽었으면 사유, 살아 있으면 None"""
+        now = time.monotonic()
+        code = self.proc.poll()
+        if code is not None:
+            return f"종료 코드 {code}"
+        if self.trigger:
+            return f"워치독 trigger ({self.status})"
+        if self.ready_at is None:
+            if now - self.spawned_at > START_TIMEOUT_S:
+                return "시작 시간 초과"
+        elif now - self.last_ping > self.watchdog_s:
+            return f"핑 없음 {now - self.last_ping:.0f}초"
+        return None
+
+    def run(self):
+        """자식이 정상 종료(0)하거나 stop() 될 때까지 — 반환값은 마지막 종료 코드"""
+        sd_notify("READY=1")
+        self.spawn()
+        while not self.stop_flag.is_set():
+            try:
+                self._on_notify(self.sock.recv(4096).decode("utf-8", errors="replace"))
+            except socket.timeout:
+                pass
+            ping()
+            why = self._why_dead()
+            if why is None:
+                continue
+            if self.proc.poll() == 0:
+                log.info("자식 정상 종료")
+                return 0
+            log.error("자식 재시작: %s", why)
+            self.kill()
+            if time.monotonic() - self.spawned_at >= STABLE_S:
+                self._fails = 0
+            delay = BACKOFF_S[min(self._fails, len(BACKOFF_S) - 1)]
+            self._fails += 1
+            if delay and self.stop_flag.wait(delay):
+                break
+            self.restarts += 1
+            self.spawn()
+        self.kill()
+        return self.proc.returncode
+
+    def stop(self):
+        self.stop_flag.set()
@@ -0,0 +1,59 @@
+# test_nmeabulk.py — 잘린 로그(마지막 문장에 '*'/줄바꿈 없음) 처리
+#
+#   python3 -m pytest -q tests/
+import os, sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import nmeabulk
+
+def nmea(body):
+    ck = 0
+    for b in body.encode("ascii"):
+        ck ^= b
+    return f"${body}*{ck:02X}\r\n".encode("ascii")
+
+RMC = nmea("GPRMC,083000.00,A,3733.1230,N,12658.4560,E,10.0,0.0,201025,,,A")
+GGA = nmea("GPGGA,083001.00,3733.1240,N,12658.4570,E,1,08,1.0,30.0,M,20.0,M,,")
+
+@pytest.mark.parametrize("tail", [
+    b"$GPRMC,083002.00,A,3733.12",            # '*' 도 줄바꿈도 없음
+    b"$GPGGA,083002.00,3733.1250,N,1265*4",   # '*' 는 있지만 줄바꿈/체크섬 없음
+    b"$",
+])
+def test_truncated_tail(tmp_path, tail):
+    p = tmp_path / "gps.nmea"
+    p.write_bytes(RMC + GGA + tail)
+    cols, stats = nmeabulk.parse_file(str(p))
+    assert stats["sentences"] == 3
+    assert list(cols["kind"]) == [nmeabulk.RMC, nmeabulk.GGA]
+    assert np.allclose(cols["lat"], [37 + 33.123 / 60, 37 + 33.124 / 60])
+
+def test_only_truncated_sentence(tmp_path):
+    """청크 전체에 '*' 와 줄바꿈이 하나도 없는 경우"""
+    p = tmp_path / "gps.nmea"
+    p.write_bytes(b"$GPRMC,083000.00,A,3733.123,N,12658.456,E")
+    cols, stats = nmeabulk.parse_file(str(p))
+    assert stats["sentences"] == 1 and stats["bad_checksum"] == 1
+    assert len(cols["t_ms"]) == 0
+
+def test_chunk_cut_mid_sentence(tmp_path):
+    """청크 경계가 문장 중간이어도 (줄바꿈 없는 긴 꼬리) 결과가 한 번에 읽은 것과 같음"""
+    p = tmp_path / "gps.nmea"
+    p.write_bytes((RMC + GGA) * 50 + b"$GPRMC,0830")
+    whole, _ = nmeabulk.parse_file(str(p))
+    small, _ = nmeabulk.parse_file(str(p), chunk_bytes=100)
+    assert len(whole["t_ms"]) == 100
+    for k in whole:
+        assert np.array_equal(whole[k], small[k], equal_nan=k == "speed_kmh")
+
+def test_error_not_masked_by_mmap(tmp_path, monkeypatch):
+    """파싱 중 예외가 mmap 닫기의 BufferError 로 바뀌지 않음"""
+    p = tmp_path / "gps.nmea"
+    p.write_bytes(RMC)
+    def boom(buf, *a):
+        raise ValueError("boom")
+    monkeypatch.setattr(nmeabulk, "parse_buffer", boom)
+    with pytest.raises(ValueError):
+        nmeabulk.parse_file(str(p))
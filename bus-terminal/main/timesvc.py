@@ -0,0 +1,143 @@
+# timesvc.py — GPS 로 보정하는 단말 시계 (RTC 없는 Pi 의 벽시계 대신 사용)
+#
+# now() = epoch_ref + (monotonic() - mono_ref) * (1 + rate)
+#   - 부팅 직후에는 시스템 시계로 시작 (source="system")
+#   - GPS RMC 날짜+시각이 들어오면 보정 (source="gps")
+#       NMEA 문장은 해당 초 경계보다 UART 전송/수신기 처리 시간만큼 늦게 도착하므로
+#       최근 WINDOW 개 표본 중 지연이 가장 작은 표본(최소 필터)을 기준으로 삼는다.
+#   - PPS 핀이 연결돼 있으면 PPS 상승 엣지(초 경계의 monotonic) 와 바로 뒤 RMC 의 초를 짝지어 보정 (source="pps")
+#   - 처음 동기/큰 차이(STEP_S 초과)는 한 번에 맞추고, 이후에는 위상/주파수를 조금씩 당겨서
+#     now() 가 뒤로 가지 않게 한다.
+#
+#   import timesvc
+#   timesvc.now()      # epoch 초 (float)
+#   timesvc.now_ms()   # epoch ms (int) — telemetry ts, 로그, 지연 계산 공용
+import time, threading, logging
+from collections import deque
+
+log = logging.getLogger("timesvc")
+
+WINDOW       = 8        # GPS 최소 필터 표본 수
+NMEA_DELAY   = 0.08     # 지연 최소 표본의 초 경계 대비 도착 지연 추정 (9600bps RMC 1줄 ≈ 70ms)
+STEP_S       = 0.5      # 이보다 크게 어긋나면 즉시 맞춤
+PHASE_GAIN   = 0.2      # 표본마다 위상 오차의 이 비율만큼 보정
+FREQ_BASELINE = 300.0   # 주파수 추정 기준 간격 (초) — 짧으면 NMEA 지연 흔들림이 그대로 ppm 잡음
+FREQ_GAIN    = 0.5      # 기준 간격마다 추정 주파수 쪽으로 당기는 비율
+MAX_RATE     = 500e-6   # 주파수 보정 한계 (±500 ppm)
+PPS_PAIR_S   = 0.9      # PPS 엣지 후 이 시간 안에 온 RMC 만 짝지음
+HOLDOVER_S   = 600.0    # 마지막 보정 후 이 시간이 지나면 synced=False (표시용)
+
+class TimeService:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mono_ref = time.monotonic()
+        self.epoch_ref = time.time()
+        self.rate = 0.0                    # 단말 monotonic 의 주파수 오차 보정 (1e-6 = 1ppm)
+        self.source = "system"
+        self.last_sync = None              # 마지막 보정 monotonic
+        self.last_error = None             # 마지막 보정 직전 오차 (초, +면 단말이 빠름)
+        self.steps = 0
+        self.discipline = True             # False: GPS/PPS 입력 무시 (최대 속도 리플레이 등)
+        self._samples = deque(maxlen=WINDOW)   # (t_rx_mono, gps_epoch)
+        self._pps_mono = None
+        self._anchor = None                # 주파수 추정 기준점 (monotonic, 실제 epoch)
+        self._last_now = 0.0
+
+    # -------------------- 읽기 --------------------
+    def _at(self, mono):
+        return self.epoch_ref + (mono - self.mono_ref) * (1.0 + self.rate)
+
+    def now(self):
+        with self.lock:
+            t = self._at(time.monotonic())
+            # 보정(step) 직후 외에는 절대 뒤로 가지 않음
+            if t < self._last_now:
+                t = self._last_now
+            self._last_now = t
+            return t
+
+    def now_ms(self):
+        return int(self.now() * 1000)
+
+    def synced(self):
+        return self.last_sync is not None and time.monotonic() - self.last_sync < HOLDOVER_S
+
+    def status(self):
+        return {"source": self.source if self.synced() else "system",
+                "error_ms": None if self.last_error is None else round(self.last_error * 1000, 1),
+                "rate_ppm": round(self.rate * 1e6, 2),
+                "sync_age_s": None if self.last_sync is None else round(time.monotonic() - self.last_sync, 1),
+                "steps": self.steps}
+
+    # -------------------- 보정 입력 --------------------
+    def on_pps(self, *_):
+        """PPS 상승 엣지 콜백 (GPIO 스레드)"""
+        if not self.discipline:
+            return
+        self._pps_mono = time.monotonic()
+
+    def on_gps(self, gps_epoch, t_rx=None):
+        """
+        RMC 한 줄: gps_epoch = 문장에 적힌 UTC 시각(초), t_rx = 줄 수신 직후 monotonic
+        PPS 가 최근에 들어왔으면 그 엣지를, 아니면 최소 지연 표본을 기준으로 보정
+        """
+        if not self.discipline:
+            return
+        t_rx = time.monotonic() if t_rx is None else t_rx
+        pps = self._pps_mono
+        if pps is not None and 0.0 <= t_rx - pps <= PPS_PAIR_S:
+            # RMC 는 방금 지난 초 경계(PPS) 의 시각을 담고 있음 (소수부는 보통 .00)
+            self._discipline(pps, float(int(gps_epoch)), "pps")
+            return
+        with self.lock:
+            self._samples.append((t_rx, gps_epoch))
+            # 도착 지연 = t_rx 시점 단말시계 - GPS 시각. 가장 작은 표본이 지연 최소
+            t_best, e_best = min(self._samples, key=lambda s: self._at(s[0]) - s[1])
+        self._discipline(t_best, e_best + NMEA_DELAY, "gps")
+
+    def _discipline(self, mono, true_epoch, source):
+        stepped = False
+        with self.lock:
+            err = self._at(mono) - true_epoch          # +: 단말 시계가 빠름
+            self.last_error = err
+            now_mono = time.monotonic()
+            if self.last_sync is None or abs(err) > STEP_S:
+                # 처음 동기 또는 큰 점프: 즉시 맞춤 (기준점을 지금으로 옮김)
+                self.epoch_ref = true_epoch + (now_mono - mono) * (1.0 + self.rate)
+                self.mono_ref = now_mono
+                self._last_now = 0.0
+                self.steps += 1
+                self._samples.clear()
+                self._anchor = (mono, true_epoch)
+                stepped = True
+            else:
+                # 주파수: FREQ_BASELINE 넘게 떨어진 두 기준점 사이 실제 경과 / monotonic 경과
+                a_mono, a_true = self._anchor
+                if mono - a_mono >= FREQ_BASELINE:
+                    est = (true_epoch - a_true) / (mono - a_mono) - 1.0
+                    self.rate += FREQ_GAIN * (est - self.rate)
+                    self.rate = max(-MAX_RATE, min(MAX_RATE, self.rate))
+                    self._anchor = (mono, true_epoch)
+                # 위상: 기준점을 지금으로 옮기면서 오차 일부만 되돌림 (시계는 계속 앞으로)
+                cur = self._at(now_mono)
+                self.epoch_ref = cur - PHASE_GAIN * err
+                self.mono_ref = now_mono
+            self.last_sync = now_mono
+            self.source = source
+        if stepped:
+            # 로그 레코드 시각도 now() 를 쓰므로 락 밖에서
+            log.warning("시계 맞춤 (%s): %+.3f초", source, -err)
+
+    def attach_pps(self, gpio, pin):
+        """PPS 핀 엣지 감지 등록 (RPi.GPIO 호환 모듈)"""
+        gpio.setup(pin, gpio.IN, pull_up_down=gpio.PUD_DOWN)
+        gpio.add_event_detect(pin, gpio.RISING, callback=self.on_pps)
+        log.info("PPS 입력 사용: GPIO%d", pin)
+
+CLOCK = TimeService()
+
+def now():
+    return CLOCK.now()
+
+def now_ms():
+    return CLOCK.now_ms()
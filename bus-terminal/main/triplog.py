@@ -0,0 +1,428 @@
+# triplog.py — 운행(trip) 궤적 기록 + 단말 압축 + 묶음 업로드
+#
+# 기록: GPS FIX 마다 (시각, 위도, 경도, 속도) 를 전부 메모리 구간(segment)에 쌓고,
+#       구간이 닫히면(SEGMENT_S 경과 / 운행 종료) Douglas–Peucker 로 줄인 뒤
+#       delta + zigzag varint 로 인코딩해서 trips/<trip_id>.part 에 덧붙인다.
+#       문 열림/닫힘, 승하차 요청 수신·취소·리셋, 정류장 도착/출발은 이벤트 레코드로 같이 기록.
+# 압축: 시간 동기 거리(SED) 기준 DP — 정차 중 같은 자리 점도 "언제 멈췄다 출발했는지"가 남는다.
+# 업로드: 운행이 끝난 .trp 파일을 버스가 대기(요청 없음 + 정차) 중이거나 종점 도착 시
+#       trip_upload 메시지로 묶어 보내고, 서버가 trip_upload_ack 로 저장을 확인한 trip_id 만 삭제
+#       (일반 ack 는 서버가 처리 전에 보내므로 저장 여부와 무관 — 그것만으로는 지우지 않음).
+#
+#   python3 triplog.py bench recordings/shift-20251020-0800.brec     # 리플레이 NMEA 로 용량 측정
+#   python3 triplog.py bench gps.nmea --eps 5
+#   python3 triplog.py dump trips/20251020-081500.trp
+#
+# 파일 형식
+#   헤더: b"BUSTRIP\x01" + varint(len) + meta(JSON)
+#   레코드: kind(1B) + varint(len) + payload
+#     SEG   : varint(점 개수) + 점마다 zigzag varint 델타 (ms, 위도e6, 경도e6, 속도 0.1km/h)
+#     EVENT : JSON {"t": ms, "kind": ..., ...}
+#     END   : JSON {"t": ms, "reason": ...}
+import os, sys, json, math, time, base64, threading, argparse
+from metrics import METRICS
+import timesvc
+import logging
+
+log = logging.getLogger("triplog")
+
+MAGIC = b"BUSTRIP\x01"
+SEG, EVENT, END = 1, 2, 3
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRIP_DIR = os.path.join(BASE_DIR, "trips")
+
+EPS_M          = 3.0         # DP 허용 오차 (m, SED)
+SEGMENT_S      = 120.0       # 이 시간마다 구간을 닫고 압축해서 디스크에 씀
+STATIONARY_KMH = 1.0         # 정차로 보는 속도
+UPLOAD_IDLE_S  = 60.0        # 요청 없음 + 이만큼 정차하면 업로드
+UPLOAD_CHECK_S = 5.0         # 업로드 조건 확인 주기
+UPLOAD_TIMEOUT = 15.0        # 저장 확인(trip_upload_ack) 없으면 재전송
+UPLOAD_BATCH_BYTES = 48 * 1024   # 메시지 하나에 담을 최대 원본 바이트
+EARTH_R = 6371008.8
+
+# ====== varint ======
+def _varint(n, out):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _read_varint(buf, i):
+    shift = n = 0
+    while True:
+        b = buf[i]; i += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, i
+        shift += 7
+
+def _zz(n):
+    return (n << 1) if n >= 0 else ((-n << 1) - 1)
+
+def _unzz(n):
+    return (n >> 1) if not n & 1 else -((n + 1) >> 1)
+
+# ====== Douglas–Peucker (SED) ======
+def simplify(points, eps=EPS_M):
+    """
+    points: [(t_ms, lat, lon, speed)] → 남길 점 인덱스 목록 (처음/끝 포함)
+    거리 기준은 시간 동기 거리: 점 i 의 시각에 양 끝점 사이를 선형 보간한 위치와의 거리
+    """
+    n = len(points)
+    if n <= 2:
+        return list(range(n))
+    lat0 = points[0][1]
+    kx = math.radians(1) * EARTH_R * math.cos(math.radians(lat0))
+    ky = math.radians(1) * EARTH_R
+    xs = [p[2] * kx for p in points]
+    ys = [p[1] * ky for p in points]
+    ts = [p[0] for p in points]
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    eps2 = eps * eps
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        ta, dt = ts[a], ts[b] - ts[a]
+        dx, dy = xs[b] - xs[a], ys[b] - ys[a]
+        worst, wi = -1.0, -1
+        for i in range(a + 1, b):
+            f = (ts[i] - ta) / dt if dt else 0.0
+            ex = xs[a] + dx * f - xs[i]
+            ey = ys[a] + dy * f - ys[i]
+            d2 = ex * ex + ey * ey
+            if d2 > worst:
+                worst, wi = d2, i
+        if worst > eps2:
+            keep[wi] = True
+            stack.append((a, wi))
+            stack.append((wi, b))
+    return [i for i in range(n) if keep[i]]
+
+# ====== 구간 인코딩 ======
+def encode_segment(points):
+    out = bytearray()
+    _varint(len(points), out)
+    pt = pa = po = ps = 0
+    for t, lat, lon, spd in points:
+        qa, qo, qs = round(lat * 1e6), round(lon * 1e6), round((spd or 0.0) * 10)
+        for v in (t - pt, qa - pa, qo - po, qs - ps):
+            _varint(_zz(v), out)
+        pt, pa, po, ps = t, qa, qo, qs
+    return bytes(out)
+
+def decode_segment(buf):
+    n, i = _read_varint(buf, 0)
+    pts = []
+    t = a = o = s = 0
+    for _ in range(n):
+        d = []
+        for _ in range(4):
+            v, i = _read_varint(buf, i)
+            d.append(_unzz(v))
+        t += d[0]; a += d[1]; o += d[2]; s += d[3]
+        pts.append((t, a / 1e6, o / 1e6, s / 10))
+    return pts
+
+def read_trip(path):
+    """(meta, points, events, end) — 잘린 마지막 레코드는 무시"""
+    with open(path, "rb") as f:
+        buf = f.read()
+    if not buf.startswith(MAGIC):
+        raise ValueError(f"운행 기록 파일 아님: {path}")
+    n, i = _read_varint(buf, len(MAGIC))
+    meta = json.loads(buf[i:i + n].decode("utf-8"))
+    i += n
+    points, events, end = [], [], None
+    try:
+        while i < len(buf):
+            kind = buf[i]; i += 1
+            ln, i = _read_varint(buf, i)
+            if i + ln > len(buf):
+                break
+            body = buf[i:i + ln]; i += ln
+            if kind == SEG:
+                points.extend(decode_segment(body))
+            elif kind == EVENT:
+                events.append(json.loads(body.decode("utf-8")))
+            elif kind == END:
+                end = json.loads(body.decode("utf-8"))
+    except IndexError:
+        pass
+    return meta, points, events, end
+
+# ====== 기록 ======
+class TripLog:
+    def __init__(self, trip_dir=TRIP_DIR, eps=EPS_M, segment_s=SEGMENT_S):
+        self.trip_dir = trip_dir
+        self.eps = eps
+        self.segment_s = segment_s
+        self.lock = threading.Lock()
+        self.meta = {}
+        self.trip_id = None
+        self.path = None
+        self._f = None
+        self._seg = []                  # 아직 압축 안 한 현재 구간 (전체 해상도)
+        self._seg_t0 = None
+        self._moving_at = None          # 마지막으로 움직이던 시각 (monotonic)
+        self.raw_points = 0
+        self.kept_points = 0
+        self.bytes_written = 0
+
+    def set_meta(self, **meta):
+        self.meta.update(meta)
+
+    def recover(self):
+        """전원 차단 등으로 남은 .part → .trp (읽기는 잘린 레코드를 무시하므로 그대로 업로드 가능)"""
+        if not os.path.isdir(self.trip_dir):
+            return 0
+        n = 0
+        for name in os.listdir(self.trip_dir):
+            if name.endswith(".part"):
+                base = os.path.join(self.trip_dir, name[:-5])
+                os.replace(base + ".part", base + ".trp")
+                n += 1
+        return n
+
+    # -------------------- 운행 시작/종료 --------------------
+    def _start(self, t_ms):
+        os.makedirs(self.trip_dir, exist_ok=True)
+        self.trip_id = time.strftime("%Y%m%d-%H%M%S", time.localtime(t_ms / 1000))
+        self.path = os.path.join(self.trip_dir, f"{self.trip_id}.part")
+        self.raw_points = self.kept_points = 0
+        self._f = open(self.path, "wb")
+        head = bytearray(MAGIC)
+        m = json.dumps({"trip_id": self.trip_id, "start": t_ms, "eps_m": self.eps, **self.meta},
+                       ensure_ascii=False).encode("utf-8")
+        _varint(len(m), head)
+        head += m
+        self._write(head)
+        log.info("운행 기록 시작: %s", self.trip_id)
+
+    def end_trip(self, reason="manual"):
+        """현재 운행을 닫고 업로드 대기(.trp)로 넘김. 완성된 파일 경로 반환"""
+        with self.lock:
+            if self._f is None:
+                return None
+            self._close_segment()
+            self._record(END, json.dumps({"t": timesvc.now_ms(), "reason": reason}).encode("utf-8"))
+            self._f.close()
+            self._f = None
+            done = self.path[:-5] + ".trp"
+            os.replace(self.path, done)
+            log.info("운행 기록 종료: %s (%s, %d→%d점, %d bytes)", self.trip_id, reason,
+                     self.raw_points, self.kept_points, os.path.getsize(done))
+            self.trip_id = self.path = None
+            return done
+
+    # -------------------- 입력 --------------------
+    def add_fix(self, lat, lon, speed_kmh=None, t_ms=None):
+        t_ms = timesvc.now_ms() if t_ms is None else int(t_ms)
+        now = time.monotonic()
+        with self.lock:
+            if self._f is None:
+                self._start(t_ms)
+            if self._seg and self._seg[-1][0] >= t_ms:
+                return                              # 같은 초의 GGA/RMC 중복
+            self._seg.append((t_ms, lat, lon, speed_kmh or 0.0))
+            self.raw_points += 1
+            if self._seg_t0 is None:
+                self._seg_t0 = t_ms
+            if speed_kmh is None or speed_kmh > STATIONARY_KMH:
+                self._moving_at = now
+            if (t_ms - self._seg_t0) / 1000.0 >= self.segment_s:
+                self._close_segment()
+
+    def event(self, kind, t_ms=None, **data):
+        """문/요청/정류장 이벤트 — 운행 중일 때만 기록"""
+        t_ms = timesvc.now_ms() if t_ms is None else int(t_ms)
+        with self.lock:
+            if self._f is None:
+                return
+            self._record(EVENT, json.dumps({"t": t_ms, "kind": kind, **data}, ensure_ascii=False).encode("utf-8"))
+
+    def stationary_s(self):
+        """마지막으로 움직인 뒤 경과 시간 (기록 전이면 0)"""
+        return 0.0 if self._moving_at is None else time.monotonic() - self._moving_at
+
+    # -------------------- 내부 --------------------
+    def _close_segment(self):
+        seg = self._seg
+        if not seg:
+            return
+        keep = simplify(seg, self.eps)
+        self._record(SEG, encode_segment([seg[i] for i in keep]))
+        self.kept_points += len(keep)
+        self._seg = []
+        self._seg_t0 = None
+
+    def _record(self, kind, body):
+        out = bytearray((kind,))
+        _varint(len(body), out)
+        out += body
+        self._write(out)
+
+    def _write(self, data):
+        self._f.write(data)
+        self._f.flush()
+        self.bytes_written += len(data)
+        METRICS.trip_bytes_written.inc(len(data))
+
+TRIPS = TripLog()
+
+# ====== 업로드 ======
+class TripUploader:
+    """끝난 운행(.trp)을 대기 중/종점에서 묶어 보내고 ack 받으면 삭제 (동시에 한 묶음만)"""
+    def __init__(self, trip_dir=TRIP_DIR):
+        self.trip_dir = trip_dir
+        self.inflight = None            # (msg_id, [paths], 보낸 시각)
+        self.force = False              # 종점 도착 → 정차 대기 없이 업로드
+        self._checked = 0.0
+        self.uploaded_bytes = 0
+
+    def request_now(self):
+        self.force = True
+
+    def pending(self):
+        if not os.path.isdir(self.trip_dir):
+            return []
+        return sorted(os.path.join(self.trip_dir, n) for n in os.listdir(self.trip_dir) if n.endswith(".trp"))
+
+    def poll(self, api, idle):
+        """메인 루프에서 매번 호출 (실제 확인은 UPLOAD_CHECK_S 마다)"""
+        now = time.monotonic()
+        if now - self._checked < UPLOAD_CHECK_S:
+            return
+        self._checked = now
+        if not api or not api.connected or not (idle or self.force):
+            return
+        if self.inflight and now - self.inflight[2] < UPLOAD_TIMEOUT:
+            return
+        files = self.pending()
+        if not files:
+            self.force = False
+            return
+        batch, size = [], 0
+        for p in files:
+            n = os.path.getsize(p)
+            if batch and size + n > UPLOAD_BATCH_BYTES:
+                break
+            batch.append(p); size += n
+        trips = []
+        for p in batch:
+            with open(p, "rb") as f:
+                trips.append({"trip_id": os.path.basename(p)[:-4],
+                              "data": base64.b64encode(f.read()).decode("ascii")})
+        msg_id = f"u-{timesvc.now_ms()}"
+        msg = {"type": "trip_upload", "msg_id": msg_id, "ts": timesvc.now_ms(),
+               "device": {"id": api.device_id, "device_type": api.device_type},
+               "payload": {"encoding": "bustrip1", "trips": trips}}
+        wire = json.dumps(msg)
+        self.inflight = (msg_id, batch, now)
+        api.send_reliable(msg, lambda ack: self._on_stored(msg_id, batch, len(wire), ack),
+                          wire=wire, ack_type="trip_upload_ack")
+        log.info("운행 기록 업로드: %d건, %d bytes", len(batch), len(wire))
+
+    def _on_stored(self, msg_id, batch, wire_bytes, ack):
+        """trip_upload_ack — 서버가 저장했다고 한 trip_id 만 삭제 (늦게 온 이전 묶음의 확인도 그대로 반영)"""
+        stored = set((ack.get("payload") or {}).get("trip_ids") or ())
+        done = [p for p in batch if os.path.basename(p)[:-4] in stored]
+        for p in done:
+            try: os.remove(p)
+            except OSError: pass
+        if len(done) < len(batch):
+            log.warning("운행 기록 서버 저장 실패: %d/%d건 — 다음에 다시 업로드", len(batch) - len(done), len(batch))
+        if done:
+            self.uploaded_bytes += wire_bytes
+            METRICS.trip_upload_bytes.inc(wire_bytes)
+        if self.inflight and self.inflight[0] == msg_id:
+            self.inflight = None
+            if done:
+                self._checked = 0.0     # 남은 파일이 있으면 바로 다음 묶음
+
+# ====== 벤치마크 (리플레이 NMEA) ======
+def _nmea_lines(path):
+    """.brec 이면 NMEA 레코드 (기록 시각 ms), 아니면 NMEA 텍스트 한 줄 = 0.5초 간격"""
+    if path.endswith(".brec"):
+        from replay import read_log, NMEA
+        meta, recs = read_log(path)
+        t0 = int(meta.get("start", 0) * 1000)
+        for t, kind, payload in recs:
+            if kind == NMEA:
+                yield t0 + int(t * 1000), payload.decode("ascii", errors="ignore").strip()
+    else:
+        with open(path, encoding="ascii", errors="ignore") as f:
+            for k, line in enumerate(f):
+                yield k * 500, line.strip()
+
+def bench(path, eps=EPS_M, shift_h=9.0):
+    import tempfile
+    import simhw
+    simhw.install()                     # gpsrx 가 pyserial 을 import 하므로 PC 에서도 돌도록
+    from gpsrx import parse_nmea
+    tmp = tempfile.mkdtemp(prefix="tripbench-")
+    trip = TripLog(trip_dir=tmp, eps=eps)
+    fixes = 0
+    t_first = t_last = None
+    t0 = time.perf_counter()
+    for t_ms, line in _nmea_lines(path):
+        st, info = parse_nmea(line)
+        if st != "FIX" or info.get("lat") is None:
+            continue
+        fixes += 1
+        t_first = t_ms if t_first is None else t_first
+        t_last = t_ms
+        trip.add_fix(info["lat"], info["lon"], info.get("speed"), t_ms=t_ms)
+    cpu_ms = (time.perf_counter() - t0) * 1000.0
+    out = trip.end_trip("bench")
+    if out is None:
+        return {"file": os.path.basename(path), "fixes": 0}
+    stored = os.path.getsize(out)
+    _, pts, _, _ = read_trip(out)
+    wire = len(json.dumps({"type": "trip_upload", "payload": {"encoding": "bustrip1", "trips": [
+        {"trip_id": os.path.basename(out)[:-4], "data": base64.b64encode(open(out, "rb").read()).decode("ascii")}]}}))
+    span_h = max((t_last - t_first) / 3.6e6, 1e-9)
+    telem_json = 330                    # telemetry 1건 JSON 크기 (gps/stop 포함, 대략)
+    return {
+        "file": os.path.basename(path),
+        "fixes": fixes,
+        "stored_points": trip.raw_points,
+        "kept_points": len(pts),
+        "eps_m": eps,
+        "span_h": round(span_h, 3),
+        "raw_fixed_bytes": trip.raw_points * 16,     # (ms u32, lat i32, lon i32, speed u32) 고정폭
+        "stored_bytes": stored,
+        "upload_bytes": wire,
+        "ratio_vs_fixed": round(trip.raw_points * 16 / stored, 1) if stored else None,
+        "bytes_per_hour": round(stored / span_h),
+        "bytes_per_shift": round(stored / span_h * shift_h),
+        "telemetry_bytes_per_shift": round(2 * 3600 * shift_h * telem_json),
+        "encode_cpu_ms": round(cpu_ms, 1),
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="운행 궤적 기록")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="리플레이 NMEA(.brec 또는 .nmea) → 저장/업로드 용량")
+    b.add_argument("src"); b.add_argument("--eps", type=float, default=EPS_M)
+    b.add_argument("--shift-hours", type=float, default=9.0)
+    d = sub.add_parser("dump", help=".trp 내용 출력")
+    d.add_argument("trp"); d.add_argument("--points", action="store_true")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "bench":
+        print(json.dumps(bench(args.src, args.eps, args.shift_hours), ensure_ascii=False, indent=2))
+    else:
+        meta, pts, events, end = read_trip(args.trp)
+        print(json.dumps({"meta": meta, "points": len(pts), "events": events, "end": end},
+                         ensure_ascii=False, indent=2))
+        if args.points:
+            for p in pts:
+                print(*p, sep=",")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,536 @@
+# widgets.py — 작은 retained-mode UI (설정 마법사 main.py / 운행 대시보드 bussys.py 공용)
+#
+# 위젯은 자기 영역의 그림을 캐시해 두고, 속성이 바뀔 때만 다시 그린 뒤 그 영역을 화면에 알린다.
+# Screen 은 화면 전체 캔버스를 들고 있다가 무효화된 영역에 걸친 위젯만 z 순서대로 다시 붙인다.
+# 터치는 격자 공간 인덱스로 후보 위젯만 골라 검사 (stopindex 와 같은 방식).
+#
+#   scr = Screen()
+#   title = scr.add(Label((0, 0, 320, 30), "안내", FONT_MED, fg="#9ad0ff", bg="#111", pad=(10, 6)))
+#   scr.add(Button((282, 4, 313, 27), "X", FONT_MED, fg="#f66", name="exit"))
+#   title.set(text="다음 단계")      # 바뀐 경우에만 영역 무효화
+#   scr.present()                    # 바뀐 위젯만 캔버스에 반영 후 lcdsystem.DISPLAY 로 전송
+#   w = scr.hit(x, y)                # 터치 위치의 가장 위 위젯 (touchable 인 것만)
+#
+# 좌표: rect = (x0, y0, x1, y1), 끝은 미포함
+import threading
+from PIL import Image, ImageDraw
+
+def _intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+def _union(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+def _clip(a, b):
+    return max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])
+
+def _covers(a, b):
+    return a[0] <= b[0] and a[1] <= b[1] and a[2] >= b[2] and a[3] >= b[3]
+
+def _add_rect(rects, rect):
+    """겹치는 사각형이 있으면 합쳐서 (연쇄로) 목록을 짧게 유지"""
+    while True:
+        for i, r in enumerate(rects):
+            if _intersects(r, rect):
+                rect = _union(r, rect)
+                del rects[i]
+                break
+        else:
+            rects.append(rect)
+            return
+
+def text_size(font, text):
+    """PIL textbbox 기준 (가로, 세로) — 기존 화면 코드와 같은 가운데 정렬 계산용"""
+    if not text:
+        return 0, 0
+    x0, y0, x1, y1 = font.getbbox(text)
+    return x1 - x0, y1 - y0
+
+# ====== 위젯 ======
+def _local(rect, clip):
+    """clip(화면 좌표) 을 rect 기준 로컬 좌표로"""
+    return clip[0] - rect[0], clip[1] - rect[1], clip[2] - rect[0], clip[3] - rect[1]
+
+class Widget:
+    touchable = False
+    clippable = True                 # 영역 일부만 다시 붙일 수 있음 (False 면 늘 통째로)
+
+    def __init__(self, rect, name=None):
+        self.rect = tuple(rect)
+        self.name = name
+        self.visible = True
+        self.screen = None
+        self._cache = None               # 자기 영역 크기의 렌더 결과 (없으면 다음 paint 때 생성)
+
+    @property
+    def size(self):
+        return self.rect[2] - self.rect[0], self.rect[3] - self.rect[1]
+
+    def contains(self, x, y):
+        x0, y0, x1, y1 = self.rect
+        return x0 <= x < x1 and y0 <= y < y1
+
+    def invalidate(self):
+        """캐시를 버리고 영역을 화면에 알림"""
+        self._cache = None
+        if self.screen is not None:
+            self.screen.damage(self.rect)
+
+    def set(self, **props):
+        """속성 변경 — 실제로 달라진 게 있으면 무효화하고 True"""
+        changed = False
+        for k, v in props.items():
+            if getattr(self, k) != v:
+                setattr(self, k, v)
+                changed = True
+        if changed:
+            self.invalidate()
+        return changed
+
+    def show(self, visible=True):
+        if self.visible != visible:
+            self.visible = visible
+            if self.screen is not None:
+                self.screen.damage(self.rect)
+
+    def render(self):
+        """자기 영역 크기 RGB 이미지 (불투명 위젯)"""
+        raise NotImplementedError
+
+    def paint(self, canvas, clip):
+        """캔버스의 clip 영역(자기 영역 안쪽)에 자기 그림을 붙임 (필요하면 캐시부터 다시 그림)"""
+        if self._cache is None:
+            self._cache = self.render()
+        if clip == self.rect:
+            canvas.paste(self._cache, clip[:2])
+        else:
+            canvas.paste(self._cache.crop(_local(self.rect, clip)), clip[:2])
+
+class Box(Widget):
+    """채움/테두리 사각형 (상단 바, 구분선, 입력칸 테두리 등)"""
+    def __init__(self, rect, fill=None, outline=None, width=1, radius=0, name=None):
+        super().__init__(rect, name)
+        self.fill, self.outline, self.width, self.radius = fill, outline, width, radius
+        self.clippable = outline is None and not radius
+
+    def paint(self, canvas, clip):
+        # 캐시 없이 바로 그림 (사각형은 다시 그리는 비용이 붙여넣기와 비슷하고, 테두리만 있으면 안쪽이 투명)
+        if self.clippable:
+            if self.fill is not None:
+                canvas.paste(self.fill, clip)
+            return
+        x0, y0, x1, y1 = self.rect
+        d = ImageDraw.Draw(canvas)
+        box = (x0, y0, x1 - 1, y1 - 1)
+        if self.radius:
+            d.rounded_rectangle(box, radius=self.radius, fill=self.fill, outline=self.outline, width=self.width)
+        else:
+            d.rectangle(box, fill=self.fill, outline=self.outline, width=self.width)
+
+class Label(Widget):
+    """
+    한 줄 글자. 글자 모양은 8bit 마스크로 캐시하고 붙일 때 fg 로 칠함
+    bg=None 이면 투명 (아래 위젯 위에 글자만 얹음 — 상태 띠 위 시계 등)
+    align: "left" | "center" | "right",  valign: "top" | "middle" | "bottom",  pad: (가로, 세로) 여백
+    """
+    def __init__(self, rect, text="", font=None, fg="white", bg=None, align="left", valign="top",
+                 pad=(0, 0), name=None):
+        super().__init__(rect, name)
+        self.text, self.font, self.fg, self.bg = text, font, fg, bg
+        self.align, self.valign, self.pad = align, valign, pad
+
+    def set(self, **props):
+        # 색만 바뀌면 마스크는 그대로 두고 다시 붙이기만
+        if set(props) <= {"fg", "bg"}:
+            changed = any(getattr(self, k) != v for k, v in props.items())
+            for k, v in props.items():
+                setattr(self, k, v)
+            if changed and self.screen is not None:
+                self.screen.damage(self.rect)
+            return changed
+        return super().set(**props)
+
+    def origin(self, tw, th):
+        """영역 안 글자 좌상단 (로컬 좌표)"""
+        w, h = self.size
+        px, py = self.pad
+        x = {"left": px, "center": (w - tw) // 2, "right": w - px - tw}[self.align]
+        y = {"top": py, "middle": (h - th) // 2, "bottom": h - py - th}[self.valign]
+        return x, y
+
+    def render(self):
+        mask = Image.new("L", self.size, 0)
+        if self.text:
+            ImageDraw.Draw(mask).text(self.origin(*text_size(self.font, self.text)), self.text,
+                                      font=self.font, fill=255)
+        return mask
+
+    def paint(self, canvas, clip):
+        if self._cache is None:
+            self._cache = self.render()
+        if self.bg is not None:
+            canvas.paste(self.bg, clip)
+        mask = self._cache if clip == self.rect else self._cache.crop(_local(self.rect, clip))
+        canvas.paste(self.fg, clip, mask)
+
+class Button(Label):
+    """테두리 + 가운데 글자. pressed 상태면 색 반전. on_press(button) 는 Screen.tap 에서 호출"""
+    touchable = True
+    clippable = False
+
+    def __init__(self, rect, text="", font=None, fg="white", bg=None, outline=None, width=2, radius=0,
+                 pressed_fg="black", pressed_bg=None, on_press=None, name=None):
+        super().__init__(rect, text, font, fg=fg, bg=bg, align="center", valign="middle", name=name)
+        self.outline = fg if outline is None else outline
+        self.width, self.radius = width, radius
+        self.pressed = False
+        self.pressed_fg = pressed_fg
+        self.pressed_bg = pressed_bg or self.outline
+        self.on_press = on_press
+
+    def origin(self, tw, th):
+        # 기존 화면과 같은 계산: 가운데 - 글자 bbox 크기의 절반
+        w, h = self.size
+        return w // 2 - tw // 2, h // 2 - th // 2
+
+    def paint(self, canvas, clip):
+        if self._cache is None:
+            self._cache = self.render()
+        x0, y0, x1, y1 = self.rect
+        d = ImageDraw.Draw(canvas)
+        box = (x0, y0, x1 - 1, y1 - 1)
+        fill = self.pressed_bg if self.pressed else self.bg
+        if self.radius:
+            d.rounded_rectangle(box, radius=self.radius, fill=fill, outline=self.outline, width=self.width)
+        else:
+            d.rectangle(box, fill=fill, outline=self.outline, width=self.width)
+        canvas.paste(self.pressed_fg if self.pressed else self.fg, self.rect, self._cache)
+
+class KeypadGrid(Widget):
+    """
+    rows x cols 키 격자 (키 이름 "" 은 빈칸)
+    격자 전체를 평상시/눌림 두 장으로 한 번만 그려두고, 키를 누르면 그 칸만 눌림 장에서 잘라 붙인다.
+    key_at(x, y) → 키 이름 또는 None (미리 만든 픽셀→키 조회표), on_key(key) 는 Screen.tap 에서 호출
+    """
+    touchable = True
+
+    def __init__(self, rect, keys, font, fg="white", bg="black", gap=4, radius=10, on_key=None, name=None):
+        super().__init__(rect, name)
+        self.keys = keys
+        self.font, self.fg, self.bg = font, fg, bg
+        self.gap, self.radius = gap, radius
+        self.on_key = on_key
+        self.rows, self.cols = len(keys), len(keys[0])
+        w, h = self.size
+        self.cell_w, self.cell_h = w // self.cols, h // self.rows
+        self.pressed = None              # 눌린 칸 (r, c)
+        self._sheets = None              # (평상시, 눌림) 격자 이미지
+        # 조회표: 로컬 픽셀 → 칸 번호 (r * cols + c). 격자 끝 자투리는 마지막 칸으로
+        self._flat = [k for row in keys for k in row]
+        col_of = bytes(min(self.cols - 1, x // self.cell_w) for x in range(w))
+        self._lut = b"".join(bytes(min(self.rows - 1, y // self.cell_h) * self.cols + c for c in col_of)
+                             for y in range(h))
+
+    def cell_rect(self, r, c):
+        """키 한 칸의 로컬 사각형 (테두리 포함, 끝 미포함)"""
+        x0, y0 = c * self.cell_w, r * self.cell_h
+        return x0, y0, x0 + self.cell_w - self.gap + 1, y0 + self.cell_h - self.gap + 1
+
+    def draw_key(self, d, r, c, ox=0, oy=0, fg=None, fill=None):
+        x0, y0, x1, y1 = self.cell_rect(r, c)
+        d.rounded_rectangle((ox + x0, oy + y0, ox + x1 - 1, oy + y1 - 1), radius=self.radius,
+                            outline=self.fg, width=2, fill=fill)
+        label = self.keys[r][c]
+        if label:
+            tw, th = text_size(self.font, label)
+            d.text((ox + x0 + (self.cell_w - tw) // 2, oy + y0 + (self.cell_h - th) // 2),
+                   label, font=self.font, fill=fg or self.fg)
+
+    def render_sheets(self):
+        normal = Image.new("RGB", self.size, self.bg)
+        pressed = normal.copy()
+        dn, dp = ImageDraw.Draw(normal), ImageDraw.Draw(pressed)
+        for r in range(self.rows):
+            for c in range(self.cols):
+                self.draw_key(dn, r, c)
+                if self.keys[r][c]:
+                    self.draw_key(dp, r, c, fg=self.bg, fill=self.fg)
+                else:
+                    self.draw_key(dp, r, c)
+        return normal, pressed
+
+    def render(self):
+        if self._sheets is None:
+            self._sheets = self.render_sheets()
+        return self._sheets[0]
+
+    def invalidate(self):
+        self._sheets = None
+        super().invalidate()
+
+    def _cell_damage(self, rc):
+        if rc is not None and self.screen is not None:
+            x0, y0, x1, y1 = self.cell_rect(*rc)
+            self.screen.damage((self.rect[0] + x0, self.rect[1] + y0, self.rect[0] + x1, self.rect[1] + y1))
+
+    def press(self, key_or_rc):
+        """키를 눌림 모양으로 (그 칸만 무효화). key 이름 또는 (r, c)"""
+        rc = key_or_rc if isinstance(key_or_rc, tuple) else self.find(key_or_rc)
+        if rc == self.pressed:
+            return
+        self._cell_damage(self.pressed)
+        self.pressed = rc
+        self._cell_damage(rc)
+
+    def release(self):
+        self.press(None)
+
+    def find(self, key):
+        if key is None or key not in self._flat:
+            return None
+        return divmod(self._flat.index(key), self.cols)
+
+    def paint(self, canvas, clip):
+        super().paint(canvas, clip)
+        if self.pressed is None:
+            return
+        x0, y0, x1, y1 = self.cell_rect(*self.pressed)
+        cell = (self.rect[0] + x0, self.rect[1] + y0, self.rect[0] + x1, self.rect[1] + y1)
+        if _intersects(cell, clip):
+            part = _clip(cell, clip)
+            canvas.paste(self._sheets[1].crop(_local(self.rect, part)), part[:2])
+
+    def cell_at(self, x, y):
+        """(x, y) 의 칸 (r, c) 또는 None"""
+        if not self.contains(x, y):
+            return None
+        return divmod(self._lut[(y - self.rect[1]) * self.size[0] + (x - self.rect[0])], self.cols)
+
+    def key_at(self, x, y):
+        if not self.contains(x, y):
+            return None
+        return self._flat[self._lut[(y - self.rect[1]) * self.size[0] + (x - self.rect[0])]]
+
+class ConsoleBox(Widget):
+    """ConsoleView(증분 스크롤 콘솔) 를 테두리 안에 표시. poll() 로 새 줄/스크롤 반영"""
+    touchable = True
+
+    def __init__(self, rect, view, outline="#555", name=None):
+        super().__init__(rect, name)
+        self.view, self.outline = view, outline
+
+    def poll(self):
+        if self.view.update():
+            self.invalidate()
+
+    def scroll_tap(self, y):
+        """위쪽 절반 탭 = 과거로 한 페이지, 아래쪽 절반 = 최신 쪽으로"""
+        y0, y1 = self.rect[1], self.rect[3] - 1
+        self.view.scroll(+self.view.rows if y < (y0 + y1) // 2 else -self.view.rows)
+
+    def render(self):
+        img = Image.new("RGB", self.size, self.view.bg)
+        d = ImageDraw.Draw(img)
+        w, h = self.size
+        d.rectangle((0, 0, w - 1, h - 1), outline=self.outline, width=1)
+        img.paste(self.view.image, (2, 2))
+        return img
+
+class TextPanel(Widget):
+    """여러 줄 글자 상자 (계측 오버레이 등)"""
+    def __init__(self, rect, lines=(), font=None, fg="white", bg="black", outline=None, line_h=16,
+                 pad=(4, 3), name=None):
+        super().__init__(rect, name)
+        self.lines, self.font, self.fg, self.bg = tuple(lines), font, fg, bg
+        self.outline, self.line_h, self.pad = outline, line_h, pad
+
+    def render(self):
+        img = Image.new("RGB", self.size, self.bg)
+        d = ImageDraw.Draw(img)
+        w, h = self.size
+        if self.outline:
+            d.rectangle((0, 0, w - 1, h - 1), outline=self.outline, width=1)
+        y = self.pad[1]
+        for line in self.lines:
+            d.text((self.pad[0], y), line, font=self.font, fill=self.fg)
+            y += self.line_h
+        return img
+
+class StatusBand(Widget):
+    """
+    화면 아래 상태 띠: 큰 글자 한 줄(가운데) + 작은 글자 한 줄
+    frames: [(글자, 작은 글자, fg, bg)] — 경보 깜빡임처럼 번갈아 보일 모양을 모두 미리 그려두고
+    show_frame(i) 는 다시 그리지 않고 붙일 그림만 바꿈 (alertanim)
+    """
+    def __init__(self, rect, font, sub_font, frames=(("", "", "black", "white"),), top=10, name=None):
+        super().__init__(rect, name)
+        self.font, self.sub_font, self.top = font, sub_font, top
+        self.frames = tuple(frames)
+        self.frame = 0
+        self._sheets = None
+
+    def set_frames(self, frames):
+        frames = tuple(frames)
+        if frames == self.frames:
+            return False
+        self.frames = frames
+        self.frame = 0
+        self._sheets = None
+        self.invalidate()
+        return True
+
+    def show_frame(self, i):
+        i %= len(self.frames)
+        if i == self.frame:
+            return False
+        self.frame = i
+        self._cache = None
+        if self.screen is not None:
+            self.screen.damage(self.rect)
+        return True
+
+    def render_frame(self, text, sub, fg, bg):
+        img = Image.new("RGB", self.size, bg)
+        d = ImageDraw.Draw(img)
+        w = self.size[0]
+        tw, th = text_size(self.font, text)
+        d.text(((w - tw) // 2, self.top), text, font=self.font, fill=fg)
+        if sub:
+            tw2, _ = text_size(self.sub_font, sub)
+            d.text(((w - tw2) // 2, self.top + th + 6), sub, font=self.sub_font, fill=fg)
+        return img
+
+    def render(self):
+        if self._sheets is None:
+            self._sheets = [self.render_frame(*f) for f in self.frames]
+        return self._sheets[self.frame]
+
+class HitArea(Widget):
+    """그리지 않는 터치 영역 (상단 ID 영역 탭 → 오버레이 토글 등)"""
+    touchable = True
+    def paint(self, canvas, clip):
+        pass
+
+# ====== 공간 인덱스 ======
+class SpatialIndex:
+    """고정 크기 격자 칸 → 그 칸에 걸친 위젯 목록. 점 질의는 한 칸의 후보만 검사"""
+    def __init__(self, cell=40):
+        self.cell = cell
+        self.grid = {}
+
+    def _cells(self, rect):
+        c = self.cell
+        for gy in range(rect[1] // c, (rect[3] - 1) // c + 1):
+            for gx in range(rect[0] // c, (rect[2] - 1) // c + 1):
+                yield gx, gy
+
+    def insert(self, w):
+        for k in self._cells(w.rect):
+            self.grid.setdefault(k, []).append(w)
+
+    def remove(self, w):
+        for k in self._cells(w.rect):
+            lst = self.grid.get(k)
+            if lst and w in lst:
+                lst.remove(w)
+
+    def query(self, x, y):
+        """(x, y) 를 포함하는 위젯, 나중에 추가된(위에 있는) 것부터"""
+        lst = self.grid.get((x // self.cell, y // self.cell), ())
+        return [w for w in reversed(lst) if w.contains(x, y)]
+
+# ====== 화면 ======
+class Screen:
+    def __init__(self, size=(320, 240), bg="black"):
+        self.size = size
+        self.bg = bg
+        self.widgets = []
+        self.index = SpatialIndex()
+        self.canvas = Image.new("RGB", size, bg)
+        self.lock = threading.RLock()              # 여러 스레드가 고칠 때 (메인 루프 + alertanim 타이머)
+        self._damage = [(0, 0) + tuple(size)]     # 처음에는 전체
+        self.repaints = 0                          # 통계: 다시 붙인 위젯 수
+
+    def add(self, w):
+        w.screen = self
+        self.widgets.append(w)
+        if w.touchable:
+            self.index.insert(w)
+        self.damage(w.rect)
+        return w
+
+    def damage(self, rect):
+        x0, y0, x1, y1 = rect
+        W, H = self.size
+        rect = (max(0, x0), max(0, y0), min(W, x1), min(H, y1))
+        if rect[0] < rect[2] and rect[1] < rect[3]:
+            _add_rect(self._damage, rect)
+
+    def invalidate_all(self):
+        self._damage = [(0, 0) + tuple(self.size)]
+        for w in self.widgets:
+            w._cache = None
+
+    @property
+    def dirty(self):
+        return bool(self._damage)
+
+    def render(self):
+        """무효화된 영역을 캔버스에 다시 그림 → 다시 그린 사각형 목록"""
+        rects, self._damage = self._damage, []
+        if not rects:
+            return rects
+        # 캐시 이미지/마스크 위젯은 겹친 부분만 다시 붙임. 테두리처럼 잘라 그릴 수 없는 위젯이 걸치면
+        # 그 위젯 영역 전체가 들어갈 때까지 넓힘 (사각형들은 합쳐지므로 항상 서로 겹치지 않음)
+        vis = [w for w in self.widgets if w.visible]
+        grew = True
+        while grew:
+            grew = False
+            for w in vis:
+                if not w.clippable and any(_intersects(w.rect, r) for r in rects) \
+                        and not any(_covers(r, w.rect) for r in rects):
+                    _add_rect(rects, w.rect)
+                    grew = True
+        for r in rects:
+            self.canvas.paste(self.bg, r)
+            for w in vis:
+                if _intersects(w.rect, r):
+                    w.paint(self.canvas, _clip(w.rect, r))
+                    self.repaints += 1
+        return rects
+
+    def present(self, on_flushed=None, force=False):
+        """바뀐 게 있으면 캔버스를 갱신해 lcdsystem.DISPLAY 로 보냄 → 보냈으면 True"""
+        from lcdsystem import DISPLAY
+        if DISPLAY.owner is not self:
+            # 그 사이 다른 화면(draw_status 등)이 나갔으면 캔버스는 그대로여도 다시 보내야 함
+            force = True
+        if not self._damage and not force:
+            return False
+        self.render()
+        img = DISPLAY.acquire()
+        img.paste(self.canvas)
+        DISPLAY.submit(img, on_flushed, owner=self)
+        return True
+
+    def tick(self, now):
+        """시간 기반 위젯 갱신 (alertanim.AnimationTimer 가 호출) → 다음 갱신 시각 또는 None"""
+        return None
+
+    def hit(self, x, y):
+        """터치 가능한 위젯 중 (x, y) 에 있는 가장 위 위젯"""
+        for w in self.index.query(x, y):
+            if w.visible:
+                return w
+        return None
+
+    def tap(self, x, y):
+        """위젯 기본 동작 실행 (버튼 on_press / 키패드 on_key) → 눌린 위젯"""
+        w = self.hit(x, y)
+        if isinstance(w, KeypadGrid):
+            k = w.key_at(x, y)
+            if k is not None and w.on_key:
+                w.on_key(k)
+        elif isinstance(w, Button) and w.on_press:
+            w.on_press(w)
+        return w